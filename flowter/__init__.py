@@ -1,14 +1,29 @@
+import asyncio
 import inspect
+import itertools
+import os
+import sys
+import threading
 import time
 import uuid
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from functools import wraps
+from types import MappingProxyType
 from typing import (
+    Any,
     Callable,
     Dict,
+    FrozenSet,
     Generic,
+    Hashable,
+    Iterable,
+    Iterator,
     List,
     Optional,
+    Set,
     Text,
+    Tuple,
     Type,
     TypedDict,
     TypeVar,
@@ -18,7 +33,51 @@ from typing import (
 import rich
 from typing_extensions import ParamSpec
 
-from .helper import able_to_dict, collect_params, rand_str, str_or_none, validate_name
+from .batching import MicroBatcher
+from .cache import CacheBackend, make_cache_key, persistent_func_id
+from .checkpoint import CheckpointStore
+from .dataflow import DataflowPlan
+from .deadlines import (
+    DeadlineExceeded,
+    Retry,
+    acall_guarded,
+    budget,
+    call_guarded,
+    current_deadline,
+    remaining,
+    validate_seconds,
+)
+from .executors import (
+    ExecutorSpec,
+    discard_broken_process_pool,
+    explain_process_error,
+    resolve_executor,
+    validate_executor,
+)
+from .graph import Graph
+from .helper import (
+    noop,
+    rand_str,
+    signature_of,
+    str_or_none,
+    validate_name,
+    validate_name_prefix,
+)
+from .payloads import PayloadStore, call_with_payloads, has_payloads
+from .plan import (
+    STEP_CONDITION,
+    STEP_FORK,
+    STEP_MERGE,
+    STEP_NODE,
+    STEP_SUBFLOW,
+    STEP_SWITCH,
+    FlowPlan,
+    is_boundary,
+)
+from .profiling import SpanRecorder
+from .resources import ResourcePool
+from .streaming import stream_plan
+from .tracing import LEVELS, SPAN_CALL, Hook, validate_level
 from .version import VERSION
 
 __version__ = VERSION
@@ -31,22 +90,71 @@ console = rich.get_console()
 
 
 class flow:
-    def __init__(self, *args, **kwargs):
-        pass
+    def __init__(self, *args, recorder: Optional[SpanRecorder] = None, **kwargs):
+        # With a recorder the call becomes a span instead of a printed line.
+        self.recorder = recorder
 
     def __call__(self, func: Callable[P, T]) -> Callable[P, T]:
+        recorder = self.recorder
+
         @wraps(func)
         def wrapper(*inner_args: P.args, **inner_kwargs: P.kwargs) -> T:
-            start = time.time()
-            result = func(*inner_args, **inner_kwargs)
-            end = time.time()
-            print(f"{func.__name__} took {end-start:.2f} seconds to run.")
+            if recorder is not None and not recorder.sample():
+                return func(*inner_args, **inner_kwargs)
+            start = time.perf_counter_ns()
+            failed = True
+            try:
+                result = func(*inner_args, **inner_kwargs)
+                failed = False
+            finally:
+                end = time.perf_counter_ns()
+                if recorder is not None:
+                    recorder.record(func.__name__, SPAN_CALL, start, end, failed=failed)
+            if recorder is None:
+                print(f"{func.__name__} took {(end - start) / 1e9:.2f} seconds to run.")
             return result
 
         return wrapper
 
 
+_node_serials = itertools.count(1)
+_node_id_prefix = uuid.uuid4().hex[:8]
+
+
+def _reset_node_id_prefix():
+    # Forked children must not hand out the same ids as their parent.
+    global _node_id_prefix
+    _node_id_prefix = uuid.uuid4().hex[:8]
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_node_id_prefix)
+
+
 class Node(Generic[P, T]):
+    __slots__ = (
+        "func",
+        "name",
+        "next_",
+        "_next_ids",
+        "return_envelope",
+        "executor",
+        "cache",
+        "cache_exclude",
+        "timeout",
+        "retry",
+        "hedge_after",
+        "id",
+        "_signature",
+        "_version",
+        "__weakref__",
+    )
+
+    # Bumped on every edge change anywhere. It only tells a plan that it has to
+    # look; each node's own _version says whether its edges really changed.
+    _topology_version: int = 0
+    step_kind: Text = STEP_NODE
+
     def __init__(
         self,
         func: Callable[P, T],
@@ -54,19 +162,78 @@ class Node(Generic[P, T]):
         name: Optional[Text] = None,
         next_: Optional[Union["Node", List["Node"]]] = None,
         return_envelope: Optional[Union[bool, Text]] = None,
+        executor: Optional[ExecutorSpec] = None,
+        cache: Optional[CacheBackend] = None,
+        cache_exclude: Optional[Iterable[Text]] = None,
+        timeout: Optional[float] = None,
+        retry: Optional[Retry] = None,
+        hedge_after: Optional[float] = None,
         **kwargs,
     ):
+        serial = next(_node_serials)
         self.func = func
-        self.func_signature = inspect.signature(self.func)
+        self._signature: Optional[inspect.Signature] = None
         if isinstance(next_, Node):
             next_ = [next_]
-        self.name = validate_name(
-            str_or_none(name) or f"{self.func.__name__}:{rand_str()}"
+        name = str_or_none(name)
+        self.name = (
+            validate_name(name)
+            if name
+            else f"{validate_name_prefix(self.func.__name__)}:{serial}"
         )
         self.next_: Optional[List[Node]] = next_ or None
+        self._next_ids: Optional[Set[Text]] = {n.id for n in next_} if next_ else None
         self.return_envelope = return_envelope
+        self.executor = validate_executor(executor)
+        self.cache = cache
+        if cache is not None and cache.persistent:
+            persistent_func_id(self.func)
+        self.cache_exclude = frozenset(cache_exclude or ())
+        if self.cache_exclude:
+            unknown = self.cache_exclude - set(self.func_signature.parameters)
+            if unknown and not any(
+                p.kind == inspect.Parameter.VAR_KEYWORD
+                for p in self.func_signature.parameters.values()
+            ):
+                raise ValueError(
+                    f"Cannot exclude unknown parameters {sorted(unknown)} from "
+                    + f"the cache key of node '{self.name}'."
+                )
+        self.timeout = validate_seconds(timeout, "timeout")
+        if retry is not None and not isinstance(retry, Retry):
+            raise ValueError(f"retry must be a flowter.Retry, got: {type(retry)}")
+        self.retry = retry
+        self.hedge_after = validate_seconds(hedge_after, "hedge_after")
+
+        self.id = sys.intern(f"{_node_id_prefix}-{serial:x}")
+        self._version = 0
 
-        self.id = str(uuid.uuid4())
+    @classmethod
+    def _restore(
+        cls: Type[NodeType],
+        func: Callable,
+        name: Text,
+        return_envelope: Optional[Union[bool, Text]] = None,
+        executor: Optional[ExecutorSpec] = None,
+        **options,
+    ) -> NodeType:
+        # Trusted constructor for definitions that were validated when saved.
+        node = cls.__new__(cls)
+        node.func = func
+        node._signature = None
+        node.name = name
+        node.next_ = None
+        node._next_ids = None
+        node.return_envelope = return_envelope
+        node.executor = executor
+        node.cache = None
+        node.cache_exclude = frozenset()
+        node.timeout = options.get("timeout")
+        node.retry = options.get("retry")
+        node.hedge_after = options.get("hedge_after")
+        node.id = sys.intern(f"{_node_id_prefix}-{next(_node_serials):x}")
+        node._version = 0
+        return node
 
     def __eq__(self, __value: object) -> bool:
         if isinstance(__value, Node):
@@ -74,6 +241,9 @@ class Node(Generic[P, T]):
         else:
             return False
 
+    def __hash__(self) -> int:
+        return hash(self.id)
+
     def __call__(self, *args: P.args, **kwargs: P.kwargs) -> T:
         return self.func(*args, **kwargs)
 
@@ -83,18 +253,133 @@ class Node(Generic[P, T]):
     def __str__(self) -> Text:
         return self.__repr__()
 
+    @property
+    def func_signature(self) -> inspect.Signature:
+        signature = self._signature
+        if signature is None:
+            signature = self._signature = signature_of(self.func)
+        return signature
+
     @property
     def func_params(self):
         return self.func_signature.parameters
 
     def run(self, *args: P.args, **kwargs: P.kwargs) -> T:
-        return self(*args, **kwargs)
+        if self.cache is None:
+            return self._run(args, kwargs)
+        key = self.cache_key(args, kwargs)
+        if key is None:
+            self.cache.count_bypass()
+            return self._run(args, kwargs)
+        hit, value = self.cache.lookup(key)
+        if not hit:
+            value = self._run(args, kwargs)
+            if not inspect.isawaitable(value):
+                self.cache.set(key, value)
+        return value
+
+    async def arun(self, *args: P.args, **kwargs: P.kwargs) -> T:
+        if self.cache is None:
+            return await self._arun(args, kwargs)
+        key = self.cache_key(args, kwargs)
+        if key is None:
+            self.cache.count_bypass()
+            return await self._arun(args, kwargs)
+        hit, value = self.cache.lookup(key)
+        if not hit:
+            value = await self._arun(args, kwargs)
+            self.cache.set(key, value)
+        return value
+
+    def cache_key(self, args, kwargs) -> Optional[Hashable]:
+        return make_cache_key(
+            self.func,
+            args,
+            kwargs,
+            exclude=self.cache_exclude,
+            signature=self.func_signature,
+            persistent=self.cache.persistent,
+        )
+
+    def _run(self, args, kwargs) -> T:
+        if (
+            self.timeout is None
+            and self.retry is None
+            and self.hedge_after is None
+            and current_deadline() is None
+        ):
+            return self._call(args, kwargs)
+        return call_guarded(self, args, kwargs)
+
+    async def _arun(self, args, kwargs) -> T:
+        if (
+            self.timeout is None
+            and self.retry is None
+            and self.hedge_after is None
+            and current_deadline() is None
+        ):
+            return await self._acall(args, kwargs)
+        return await acall_guarded(self, args, kwargs)
+
+    def _call(self, args, kwargs) -> T:
+        if self.executor is None:
+            return self(*args, **kwargs)
+        executor = resolve_executor(self.executor)
+        try:
+            return self._submit(executor, args, kwargs).result()
+        except Exception as e:
+            self._raise_executor_error(executor, e, args, kwargs)
+            raise
+
+    async def _acall(self, args, kwargs) -> T:
+        if self.executor is None:
+            value = self(*args, **kwargs)
+        else:
+            executor = resolve_executor(self.executor)
+            try:
+                value = await asyncio.wrap_future(self._submit(executor, args, kwargs))
+            except Exception as e:
+                self._raise_executor_error(executor, e, args, kwargs)
+                raise
+        if inspect.isawaitable(value):
+            value = await value
+        return value
+
+    def _submit(self, executor: Executor, args, kwargs) -> Future:
+        # Only the bare function travels to worker processes, not the node.
+        if isinstance(executor, ProcessPoolExecutor):
+            if has_payloads(args, kwargs):
+                return executor.submit(call_with_payloads, self.func, args, kwargs)
+            return executor.submit(self.func, *args, **kwargs)
+        return executor.submit(self, *args, **kwargs)
+
+    def _raise_executor_error(self, executor: Executor, exc: Exception, args, kwargs):
+        if not isinstance(executor, ProcessPoolExecutor):
+            return
+        if isinstance(exc, BrokenProcessPool):
+            discard_broken_process_pool(executor)
+        error = explain_process_error(exc, self.name, self.func, args, kwargs)
+        if error is not None:
+            raise error from exc
 
     def add_next(self, next_: Union["Node", List["Node"]]):
-        self.next_ = self.next_ or []
         for n in self.validate_nodes(next_):
-            if n not in self.next_:
-                self.next_.append(n)
+            self._link(n)
+        Node._topology_version += 1
+
+    def _link(self, n: "Node"):
+        # Callers bump Node._topology_version once they are done linking.
+        if self.next_ is None:
+            self.next_ = []
+        ids = self._next_ids
+        if ids is None or len(ids) != len(self.next_):
+            # next_ was assigned directly, so the index has to catch up.
+            ids = self._next_ids = {n.id for n in self.next_}
+            self._version += 1
+        if n.id not in ids:
+            ids.add(n.id)
+            self.next_.append(n)
+            self._version += 1
 
     @classmethod
     def validate_node(
@@ -138,15 +423,238 @@ class Node(Generic[P, T]):
 
 
 class Condition(Node[P, T]):
-    pass
+    __slots__ = ()
+    step_kind = STEP_CONDITION
 
 
 class Fork(Node[P, T]):
-    pass
+    __slots__ = ("max_workers", "_pool", "_pool_lock")
+    step_kind = STEP_FORK
+
+    def __init__(
+        self,
+        func: Callable[P, T],
+        *args,
+        max_workers: Optional[int] = None,
+        pool: Optional[Executor] = None,
+        **kwargs,
+    ):
+        super().__init__(func, *args, **kwargs)
+        self.max_workers = max_workers
+        self._pool = pool
+        self._pool_lock = threading.Lock()
+
+    @classmethod
+    def _restore(cls, func, name, return_envelope=None, executor=None, **options):
+        node = super()._restore(func, name, return_envelope, executor, **options)
+        node.max_workers = options.get("max_workers")
+        node._pool = None
+        node._pool_lock = threading.Lock()
+        return node
+
+    @property
+    def pool(self) -> Executor:
+        if self._pool is None:
+            with self._pool_lock:
+                if self._pool is None:
+                    self._pool = ThreadPoolExecutor(
+                        max_workers=self.max_workers,
+                        thread_name_prefix=f"flowter-{self.name}",
+                    )
+        return self._pool
 
 
 class Merge(Node[P, T]):
-    pass
+    __slots__ = ()
+    step_kind = STEP_MERGE
+
+
+class Switch(Node[P, T]):
+    __slots__ = ("cases", "default")
+    step_kind = STEP_SWITCH
+
+    def __init__(
+        self,
+        func: Callable[P, T],
+        *args,
+        cases: Optional[Dict[Hashable, Node]] = None,
+        default: Optional[Node] = None,
+        **kwargs,
+    ):
+        super().__init__(func, *args, **kwargs)
+        self.cases: Dict[Hashable, Node] = {}
+        self.default: Optional[Node] = None
+        for key, node in (cases or {}).items():
+            self.add_case(key, node)
+        if default is not None:
+            self.set_default(default)
+
+    @classmethod
+    def _restore(cls, func, name, return_envelope=None, executor=None, **options):
+        node = super()._restore(func, name, return_envelope, executor, **options)
+        node.cases = {}
+        node.default = None
+        return node
+
+    def add_case(self, key: Hashable, node: Callable) -> Node:
+        node = Node.from_callable(node)
+        replaced = self.cases.get(key)
+        self.cases[key] = node
+        self._relink(node, replaced)
+        return node
+
+    def set_default(self, node: Callable) -> Node:
+        node = Node.from_callable(node)
+        replaced = self.default
+        self.default = node
+        self._relink(node, replaced)
+        return node
+
+    def _relink(self, node: Node, replaced: Optional[Node]):
+        self._link(node)
+        # A replaced target no longer reachable through the table loses its edge.
+        if (
+            replaced is not None
+            and replaced is not self.default
+            and replaced not in self.cases.values()
+        ):
+            self.next_ = [n for n in self.next_ if n.id != replaced.id]
+            self._next_ids = {n.id for n in self.next_}
+        self._version += 1
+        Node._topology_version += 1
+
+
+class BatchNode(Node[P, T]):
+    __slots__ = ("batcher",)
+
+    def __init__(
+        self,
+        func: Callable[[List], List],
+        *args,
+        max_batch_size: int = 32,
+        max_wait: float = 0.005,
+        **kwargs,
+    ):
+        super().__init__(func, *args, **kwargs)
+        if self.executor is not None:
+            raise ValueError(
+                f"Batch node '{self.name}' runs on its own batcher thread and "
+                + "does not take an executor."
+            )
+        params = list(self.func_signature.parameters.values())
+        if not params or params[0].kind not in (
+            inspect.Parameter.POSITIONAL_ONLY,
+            inspect.Parameter.POSITIONAL_OR_KEYWORD,
+        ):
+            raise TypeError(
+                f"Batch node '{self.name}' needs a function whose first "
+                + "positional parameter receives the list of inputs."
+            )
+        self.batcher = MicroBatcher(
+            self.func,
+            max_batch_size=max_batch_size,
+            max_wait=max_wait,
+            name=self.name,
+        )
+
+    @classmethod
+    def _restore(cls, func, name, return_envelope=None, executor=None, **options):
+        # The batcher owns a thread, so this goes through full construction.
+        return cls(
+            func,
+            name=name,
+            return_envelope=return_envelope,
+            executor=executor,
+            **options,
+        )
+
+    @property
+    def func_params(self):
+        # Each run binds a single item to the batched parameter.
+        first = next(iter(self.func_signature.parameters.values()))
+        return MappingProxyType({first.name: first})
+
+    def __call__(self, *args, **kwargs) -> T:
+        # Node.run wraps this with the cache, deadlines, retries and hedging.
+        return self.batcher.submit(_batch_item(args, kwargs)).result()
+
+    async def _acall(self, args, kwargs) -> T:
+        return await asyncio.wrap_future(self.batcher.submit(_batch_item(args, kwargs)))
+
+
+def _batch_item(args, kwargs) -> Any:
+    return args[0] if args else next(iter(kwargs.values()))
+
+
+class SubflowCall:
+    __slots__ = ("flow",)
+
+    def __init__(self, flow: "Flow"):
+        self.flow = flow
+
+    def __repr__(self) -> Text:
+        return f"<SubflowCall flow={self.flow.name}>"
+
+    # Positional run arguments are passed on, as inlined subflow nodes bind
+    # them from the parent run too.
+    def __call__(self, *args, **kwargs) -> Dict[Text, Any]:
+        result = self.flow.run(*args, **kwargs)
+        return self._trim(result)
+
+    async def acall(self, *args, **kwargs) -> Dict[Text, Any]:
+        return self._trim(await self.flow.arun(*args, **kwargs))
+
+    def _trim(self, result: Dict[Text, Any]) -> Dict[Text, Any]:
+        # Boundary keys would shadow the parent's own start and end entries.
+        for node in (self.flow.start_node, self.flow.end_node):
+            if is_boundary(node):
+                key = node.return_envelope
+                result.pop(key if isinstance(key, str) else node.name, None)
+        return result
+
+
+class Subflow(Node[P, T]):
+    __slots__ = ("flow", "inline")
+    step_kind = STEP_SUBFLOW
+
+    def __init__(
+        self,
+        flow: "Flow",
+        *args,
+        name: Optional[Text] = None,
+        inline: bool = True,
+        **kwargs,
+    ):
+        if not isinstance(flow, Flow):
+            raise ValueError(f"Subflow needs a Flow, got: {type(flow)}")
+        super().__init__(SubflowCall(flow), *args, name=name or flow.name, **kwargs)
+        self.flow = flow
+        self.inline = inline
+
+    @classmethod
+    def _restore(cls, func, name, return_envelope=None, executor=None, **options):
+        flow = options["flow"]
+        node = super()._restore(
+            SubflowCall(flow), name, return_envelope, executor, **options
+        )
+        node.flow = flow
+        node.inline = options.get("inline", True)
+        return node
+
+    async def _acall(self, args, kwargs) -> T:
+        if self.executor is None:
+            return await self.func.acall(*args, **kwargs)
+        return await super()._acall(args, kwargs)
+
+
+# A built Flow is safe to run from many threads at once: each run gets its own
+# RunState and result dict, the compiled plan is immutable and compiled under
+# a lock, and shared pieces (caches, fork pools, batchers, tracers, checkpoint
+# and payload stores) synchronise internally. Adding nodes or edges while runs
+# are in flight is not supported. See flowter.runner.FlowRunner for a bounded
+# scheduler on top of this.
+def _changed(watched: Iterable[Tuple[Node, int]]) -> bool:
+    return any(node._version != seen for node, seen in watched)
 
 
 class Flow:
@@ -159,76 +667,144 @@ class Flow:
         start_node: Optional[Node] = None,
         end_node: Optional[Node] = None,
         name: Optional[Text] = None,
+        stream_buffer_size: int = 16,
+        checkpoint_store: Optional[CheckpointStore] = None,
+        hooks: Optional[List[Hook]] = None,
+        log_level: Text = "warning",
+        liveness: bool = False,
+        keep_keys: Optional[Iterable[Text]] = None,
+        payload_store: Optional[PayloadStore] = None,
+        timeout: Optional[float] = None,
+        dataflow: bool = False,
+        dataflow_workers: Optional[int] = None,
         **kwargs,
     ):
         self.start_node: Node = (
             start_node
             if isinstance(start_node, Node)
-            else Node(lambda *args, **kwargs: None, name="start")
+            else Node(noop, name="start")
             if start_node is None
             else Node(start_node, name="start")
         )
         self.end_node: Node = (
             end_node
             if isinstance(end_node, Node)
-            else Node(lambda *args, **kwargs: None, name="end")
+            else Node(noop, name="end")
             if end_node is None
             else Node(end_node, name="end")
         )
         self.name = validate_name(name) if name else f"flow:{rand_str()}"
+        self.stream_buffer_size = stream_buffer_size
+        self.checkpoint_store = checkpoint_store
+        self.hooks: Tuple[Hook, ...] = tuple(hooks or ())
+        self.log_level = validate_level(log_level)
+        self.liveness = liveness
+        self.keep_keys: FrozenSet[Text] = frozenset(keep_keys or ())
+        self.payload_store = payload_store
+        self.timeout = validate_seconds(timeout, "timeout")
+        self.dataflow = dataflow
+        self.dataflow_workers = dataflow_workers
+        self.resources: Dict[Text, ResourcePool] = {}
 
         self.node_pool: Dict[Text, Node] = {
             self.start_node.id: self.start_node,
             self.end_node.id: self.end_node,
         }
+        self._plan: Optional[FlowPlan] = None
+        self._compile_lock = threading.Lock()
+        self._graph: Optional[Graph] = None
+        self._graph_key: Tuple[int, Text] = (-1, "")
+        self._graph_version = -1
+
+    @property
+    def graph(self) -> Graph:
+        graph = self._graph
+        key = (len(self.node_pool), self.start_node.id)
+        if graph is None or self._graph_key != key or self._graph_changed(graph):
+            version = Node._topology_version
+            graph = Graph(self)
+            self._graph, self._graph_key, self._graph_version = graph, key, version
+        return graph
+
+    def _graph_changed(self, graph: Graph) -> bool:
+        version = Node._topology_version
+        if self._graph_version == version:
+            return False
+        if _changed(graph.watched):
+            return True
+        self._graph_version = version
+        return False
+
+    def compile(self) -> FlowPlan:
+        plan = self._plan
+        if plan is None or self._is_stale(plan):
+            with self._compile_lock:
+                plan = self._plan
+                if plan is None or self._is_stale(plan):
+                    # Versions are read before building, so an edge added
+                    # meanwhile leaves the new plan stale rather than wrong.
+                    version, watched = self._versions()
+                    plan_cls = DataflowPlan if self.dataflow else FlowPlan
+                    plan = plan_cls.from_flow(self)
+                    plan.version, plan.watched = version, watched
+                    self._plan = plan
+        return plan
+
+    def _is_stale(self, plan: FlowPlan) -> bool:
+        if (
+            plan.entry.node is not self.start_node
+            or plan.liveness != self.liveness
+            or plan.keep_keys != self.keep_keys
+            or plan.payloads is not self.payload_store
+            or plan.dataflow != self.dataflow
+        ):
+            return True
+        version = Node._topology_version
+        if plan.version == version:
+            return False
+        # Some flow changed; this plan is only stale if one of its own nodes did.
+        if _changed(plan.watched):
+            return True
+        plan.version = version
+        return False
+
+    def _versions(self) -> Tuple[int, Tuple[Tuple[Node, int], ...]]:
+        version = Node._topology_version
+        watched = list(self.graph.watched)
+        flows = {id(self)}
+        # Inlined subflows put their own nodes into the plan.
+        for node, _ in watched:
+            if isinstance(node, Subflow) and id(node.flow) not in flows:
+                flows.add(id(node.flow))
+                watched.extend(node.flow.graph.watched)
+        return (version, tuple(watched))
 
     def run(self, *args, **kwargs) -> "FlowRunResult":
-        result = {}
-        node = self.start_node
-        while node:
-            collected_params = collect_params(
-                node.func_params, *args, kwargs=result, **kwargs
+        if self.timeout is None:
+            return self.compile().run(*args, **kwargs)
+        with budget(self.timeout):
+            return self.compile().run(*args, **kwargs)
+
+    async def arun(self, *args, **kwargs) -> "FlowRunResult":
+        if self.timeout is None:
+            return await self.compile().arun(*args, **kwargs)
+        with budget(self.timeout):
+            return await self.compile().arun(*args, **kwargs)
+
+    def resume(self, run_id: Text) -> "FlowRunResult":
+        with budget(self.timeout):
+            return self.compile().resume(run_id)
+
+    async def aresume(self, run_id: Text) -> "FlowRunResult":
+        with budget(self.timeout):
+            return await self.compile().aresume(run_id)
+
+    def stream(self, *args, **kwargs) -> Iterator["FlowRunResult"]:
+        if self.dataflow:
+            raise ValueError(
+                f"Flow '{self.name}' runs in dataflow mode, which cannot stream."
             )
-            self.log(
-                f"Running node '{node.name}' with args: {collected_params[0]}, "
-                + f"kwargs: {collected_params[1]}",
-                level="debug",
-            )
-
-            _node_result = node.run(*collected_params[0], **collected_params[1])
-            if isinstance(node.return_envelope, Text):
-                result[node.return_envelope] = _node_result
-            elif node.return_envelope is False:
-                if able_to_dict(_node_result):
-                    result.update(dict(_node_result))
-                else:
-                    self.log(
-                        f"Node '{node.name}' returned a non-dict object: {_node_result} "
-                        + "but set to return_envelope=False.",
-                        level="warning",
-                    )
-            else:
-                result[node.name] = _node_result
-
-            # Check if node has next
-            if not node.next_:
-                node = None
-                continue
-
-            # Check condition
-            for next_node in node.next_:
-                if isinstance(next_node, Condition):
-                    if next_node(_node_result):
-                        node = next_node
-                        break
-                else:
-                    node = next_node
-                    break
-            else:
-                node = None
-                continue
-
-        return result
+        return stream_plan(self.compile(), args, kwargs, self.stream_buffer_size)
 
     def add_node(
         self,
@@ -248,7 +824,8 @@ class Flow:
         dst_condition_node = (
             Condition.from_callable(dst_condition_node) if dst_condition_node else None
         )
-        node = Node.from_callable(n)
+        node = Subflow(n) if isinstance(n, Flow) else Node.from_callable(n)
+        self._plan = None
         self.node_pool.setdefault(node.id, node)
         if src and src_condition_node:
             src.add_next(src_condition_node)
@@ -268,7 +845,68 @@ class Flow:
             self.node_pool.setdefault(dst.id, dst)
         return node
 
+    def add_nodes(
+        self,
+        nodes: Iterable[Callable],
+        src: Optional[Node] = None,
+        dst: Optional[Node] = None,
+        chain: bool = False,
+    ) -> List[Node]:
+        src = Node.validate_node(src, none_allowed=True)
+        dst = Node.validate_node(dst, none_allowed=True)
+        added = [
+            Subflow(n) if isinstance(n, Flow) else Node.from_callable(n) for n in nodes
+        ]
+        pool = self.node_pool
+        for node in added:
+            pool.setdefault(node.id, node)
+        for node in (src, dst):
+            if node is not None:
+                pool.setdefault(node.id, node)
+
+        if chain:
+            prev = src
+            for node in added:
+                if prev is not None:
+                    prev._link(node)
+                prev = node
+            if dst is not None and prev is not None:
+                prev._link(dst)
+        else:
+            for node in added:
+                if src is not None:
+                    src._link(node)
+                if dst is not None:
+                    node._link(dst)
+        Node._topology_version += 1
+        self._plan = None
+        return added
+
+    def add_resource(
+        self,
+        resource: Union[Text, ResourcePool],
+        factory: Optional[Callable[[], object]] = None,
+        **options,
+    ) -> ResourcePool:
+        # Pools may be shared between flows by passing the same ResourcePool.
+        if not isinstance(resource, ResourcePool):
+            if factory is None:
+                raise ValueError(f"Resource '{resource}' needs a factory.")
+            resource = ResourcePool(resource, factory, **options)
+        self.resources = {**self.resources, resource.name: resource}
+        self._plan = None
+        return resource
+
+    def close_resources(self):
+        for resource in self.resources.values():
+            resource.close()
+
+    def add_hook(self, hook: Hook):
+        self.hooks = self.hooks + (hook,)
+
     def log(self, msg: Text, level: Text = "debug"):
+        if LEVELS.get(level, 0) < self.log_level:
+            return
         try:
             console.print(msg[:512])
         except Exception:
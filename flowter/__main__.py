@@ -0,0 +1,66 @@
+import argparse
+import sys
+import typing
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="python -m flowter")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    bench = subparsers.add_parser("bench", help="Benchmark the flow engine.")
+    bench.add_argument(
+        "--scenario",
+        action="append",
+        help="Scenario to run, may be repeated. Defaults to all scenarios.",
+    )
+    bench.add_argument("--iterations", type=int, default=1000)
+    bench.add_argument("--warmup", type=int, default=50)
+    bench.add_argument("--output", help="Write the JSON report to this path.")
+    bench.add_argument("--baseline", help="Compare against a saved JSON report.")
+    bench.add_argument(
+        "--threshold",
+        type=float,
+        default=0.1,
+        help="Relative slowdown reported as a regression (default: 0.1).",
+    )
+
+    worker = subparsers.add_parser(
+        "worker", help="Run queued flows from a broker until stopped."
+    )
+    worker.add_argument("--broker", required=True, help="Path of the SQLite broker.")
+    worker.add_argument(
+        "--flow",
+        action="append",
+        required=True,
+        help="Flow to serve as 'module:attr' or a saved definition file, "
+        + "may be repeated.",
+    )
+    worker.add_argument("--concurrency", type=int, default=1)
+    worker.add_argument(
+        "--lease",
+        type=float,
+        default=30.0,
+        help="Seconds before an unacknowledged task is handed to another worker.",
+    )
+    worker.add_argument("--poll-interval", type=float, default=0.1)
+    worker.add_argument("--max-tasks", type=int, help="Exit after this many tasks.")
+    worker.add_argument("--worker-id")
+
+    return parser
+
+
+def main(argv: typing.Optional[typing.List[typing.Text]] = None) -> int:
+    args = build_parser().parse_args(argv)
+    if args.command == "bench":
+        from flowter.bench import main as bench_main
+
+        return bench_main(args)
+    if args.command == "worker":
+        from flowter.broker import main as worker_main
+
+        return worker_main(args)
+    return 2
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,92 @@
+import queue
+import threading
+import time
+import typing
+from concurrent.futures import Future, InvalidStateError
+
+
+class MicroBatcher:
+    def __init__(
+        self,
+        func: typing.Callable[[typing.List[typing.Any]], typing.Iterable[typing.Any]],
+        max_batch_size: int = 32,
+        max_wait: float = 0.005,
+        name: typing.Text = "batcher",
+    ):
+        if max_batch_size < 1:
+            raise ValueError(f"max_batch_size must be positive, got: {max_batch_size}")
+        if max_wait < 0:
+            raise ValueError(f"max_wait must not be negative, got: {max_wait}")
+        self.func = func
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.name = name
+        self.batch_count = 0
+        self.item_count = 0
+
+        self._queue: "queue.SimpleQueue[typing.Tuple[typing.Any, Future]]" = (
+            queue.SimpleQueue()
+        )
+        self._worker: typing.Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def submit(self, item: typing.Any) -> Future:
+        future: Future = Future()
+        self._queue.put((item, future))
+        if self._worker is None:
+            with self._lock:
+                if self._worker is None:
+                    self._worker = threading.Thread(
+                        target=self._loop, name=f"flowter-{self.name}", daemon=True
+                    )
+                    self._worker.start()
+        return future
+
+    def _loop(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                try:
+                    if remaining > 0:
+                        batch.append(self._queue.get(timeout=remaining))
+                    else:
+                        batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            self._dispatch(batch)
+
+    def _dispatch(self, batch: typing.List[typing.Tuple[typing.Any, Future]]):
+        # Callers that gave up while queued are dropped; the rest can no longer
+        # be cancelled once they are marked running.
+        batch = [
+            (item, future)
+            for item, future in batch
+            if not future.done() and future.set_running_or_notify_cancel()
+        ]
+        if not batch:
+            return
+        self.batch_count += 1
+        self.item_count += len(batch)
+        try:
+            outputs = list(self.func([item for item, _ in batch]))
+            if len(outputs) != len(batch):
+                raise ValueError(
+                    f"Batch function of '{self.name}' returned {len(outputs)} "
+                    + f"results for {len(batch)} inputs."
+                )
+        except BaseException as e:
+            for _, future in batch:
+                _settle(future.set_exception, e)
+            return
+        for (_, future), output in zip(batch, outputs):
+            _settle(future.set_result, output)
+
+
+def _settle(setter: typing.Callable[[typing.Any], None], value: typing.Any):
+    # The batcher thread serves every later call, so it must never die here.
+    try:
+        setter(value)
+    except InvalidStateError:
+        pass
@@ -0,0 +1,342 @@
+import json
+import platform
+import statistics
+import time
+import tracemalloc
+import typing
+
+from flowter import Condition, Flow, Fork, Merge, Node, Switch
+
+from .version import VERSION
+
+Scenario = typing.Tuple[Flow, typing.Dict[typing.Text, typing.Any], int]
+
+
+def _identity(value: int) -> int:
+    return value
+
+
+def _increment(value: int) -> int:
+    return value + 1
+
+
+def build_chain(length: int = 50) -> Scenario:
+    flow = Flow(name="bench-chain")
+    src = flow.start_node
+    for i in range(length):
+        src = flow.add_node(
+            Node(_increment, name=f"step-{i}", return_envelope="value"), src=src
+        )
+    flow.add_node(flow.end_node, src=src)
+    return (flow, {"value": 0}, length + 2)
+
+
+def build_condition_fan(width: int = 50) -> Scenario:
+    flow = Flow(name="bench-fan")
+    router = flow.add_node(
+        Node(_identity, name="router", return_envelope="value"), src=flow.start_node
+    )
+    # Only the last branch matches, which is the worst case for routing.
+    for i in range(width):
+        flow.add_node(
+            Node(_identity, name=f"branch-{i}", return_envelope="value"),
+            src=router,
+            src_condition_node=Condition(_equals(i), name=f"is-{i}"),
+            dst=flow.end_node,
+        )
+    return (flow, {"value": width - 1}, 5)
+
+
+def build_switch_fan(width: int = 50) -> Scenario:
+    flow = Flow(name="bench-switch")
+    router = flow.add_node(
+        Switch(_identity, name="router", return_envelope="value"), src=flow.start_node
+    )
+    for i in range(width):
+        router.add_case(
+            i,
+            flow.add_node(
+                Node(_identity, name=f"branch-{i}", return_envelope="value"),
+                dst=flow.end_node,
+            ),
+        )
+    return (flow, {"value": width - 1}, 4)
+
+
+def build_nested_forks(depth: int = 4) -> Scenario:
+    flow = Flow(name="bench-nested")
+
+    def nest(src: Node, level: int) -> Node:
+        fork = flow.add_node(
+            Fork(_identity, name=f"fork-{level}", return_envelope="value"), src=src
+        )
+        merge = Merge(_identity, name=f"merge-{level}", return_envelope="value")
+        flow.add_node(
+            Node(_increment, name=f"left-{level}", return_envelope=f"left-{level}"),
+            src=fork,
+            dst=merge,
+        )
+        inner = nest(fork, level + 1) if level + 1 < depth else fork
+        flow.add_node(merge, src=inner)
+        return merge
+
+    flow.add_node(flow.end_node, src=nest(flow.start_node, 0))
+    return (flow, {"value": 0}, 2 + 3 * depth)
+
+
+def build_large_payload(size: int = 1 << 20, length: int = 10) -> Scenario:
+    flow = Flow(name="bench-payload")
+    src = flow.add_node(
+        Node(_make_payload, name="make_payload", return_envelope="payload"),
+        src=flow.start_node,
+    )
+    for i in range(length):
+        src = flow.add_node(
+            Node(_touch_payload, name=f"touch-{i}", return_envelope="value"), src=src
+        )
+    flow.add_node(flow.end_node, src=src)
+    return (flow, {"value": 0, "size": size}, length + 3)
+
+
+def build_dataflow_fan(width: int = 8) -> Scenario:
+    # Independent nodes feeding one reader, scheduled from inferred dependencies.
+    flow = Flow(name="bench-dataflow", dataflow=True)
+    for i in range(width):
+        flow.add_node(Node(_increment, name=f"fetch-{i}", return_envelope=f"v{i}"))
+    flow.add_node(Node(_total, name="total", return_envelope="total"))
+    return (flow, {"value": 0}, width + 3)
+
+
+def _total(**values: int) -> int:
+    return sum(v for v in values.values() if isinstance(v, int))
+
+
+def _make_payload(size: int) -> bytes:
+    return bytes(size)
+
+
+def _touch_payload(payload: bytes, value: int) -> int:
+    return value + payload[value % len(payload)] + 1
+
+
+def _equals(expected: int) -> typing.Callable[[int], bool]:
+    def equals(value: int) -> bool:
+        return value == expected
+
+    return equals
+
+
+SCENARIOS: typing.Dict[typing.Text, typing.Callable[[], Scenario]] = {
+    "chain": build_chain,
+    "condition_fan": build_condition_fan,
+    "switch_fan": build_switch_fan,
+    "nested_forks": build_nested_forks,
+    "large_payload": build_large_payload,
+    "dataflow_fan": build_dataflow_fan,
+}
+
+
+def percentile(values: typing.Sequence[float], q: float) -> float:
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, max(0, int(round(q * (len(ordered) - 1)))))
+    return ordered[index]
+
+
+def measure(
+    flow: Flow,
+    kwargs: typing.Dict[typing.Text, typing.Any],
+    nodes_per_run: int,
+    iterations: int = 1000,
+    warmup: int = 50,
+) -> typing.Dict[typing.Text, float]:
+    for _ in range(warmup):
+        flow.run(**kwargs)
+
+    latencies = []
+    perf_counter_ns = time.perf_counter_ns
+    started = perf_counter_ns()
+    for _ in range(iterations):
+        start = perf_counter_ns()
+        flow.run(**kwargs)
+        latencies.append((perf_counter_ns() - start) / 1e3)
+    total_s = (perf_counter_ns() - started) / 1e9
+
+    mean_us = statistics.fmean(latencies)
+    return {
+        "iterations": iterations,
+        "throughput_rps": iterations / total_s if total_s else 0.0,
+        "mean_us": mean_us,
+        "p50_us": percentile(latencies, 0.50),
+        "p95_us": percentile(latencies, 0.95),
+        "p99_us": percentile(latencies, 0.99),
+        "per_node_us": mean_us / nodes_per_run,
+    }
+
+
+def measure_add_node(count: int = 2000) -> typing.Dict[typing.Text, float]:
+    start = time.perf_counter_ns()
+    flow = Flow(name="bench-build")
+    src = flow.start_node
+    for i in range(count):
+        src = flow.add_node(Node(_increment, name=f"step-{i}"), src=src)
+    build_us = (time.perf_counter_ns() - start) / 1e3
+
+    start = time.perf_counter_ns()
+    flow.compile()
+    compile_us = (time.perf_counter_ns() - start) / 1e3
+    return {
+        "nodes": count,
+        "add_node_us": build_us / count,
+        "compile_us": compile_us,
+    }
+
+
+def measure_node_creation(count: int = 10000) -> typing.Dict[typing.Text, float]:
+    start = time.perf_counter_ns()
+    nodes = [Node(_increment) for _ in range(count)]
+    create_us = (time.perf_counter_ns() - start) / 1e3
+    del nodes
+
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        nodes = [Node(_increment) for _ in range(count)]
+        allocated = tracemalloc.get_traced_memory()[0] - before
+    finally:
+        tracemalloc.stop()
+    del nodes
+
+    start = time.perf_counter_ns()
+    flow = Flow(name="bench-bulk")
+    flow.add_nodes(
+        [_increment] * count, src=flow.start_node, dst=flow.end_node, chain=True
+    )
+    add_nodes_us = (time.perf_counter_ns() - start) / 1e3
+    return {
+        "nodes": count,
+        "create_us": create_us / count,
+        "bytes_per_node": allocated / count,
+        "add_nodes_us": add_nodes_us / count,
+    }
+
+
+def measure_load(count: int = 2000) -> typing.Dict[typing.Text, float]:
+    from flowter.serialize import dumps, loads
+
+    flow = Flow(name="bench-load")
+    flow.add_nodes(
+        [Node(_increment, name=f"step-{i}") for i in range(count)],
+        src=flow.start_node,
+        dst=flow.end_node,
+        chain=True,
+    )
+    results: typing.Dict[typing.Text, float] = {"nodes": count}
+    for label, binary, include_plan in (
+        ("load_json_us", False, False),
+        ("load_binary_us", True, False),
+        ("load_binary_plan_us", True, True),
+    ):
+        data = dumps(flow, binary=binary, include_plan=include_plan)
+        start = time.perf_counter_ns()
+        loads(data).compile()
+        results[label] = (time.perf_counter_ns() - start) / 1e3
+    return results
+
+
+def run_benchmarks(
+    scenarios: typing.Optional[typing.Iterable[typing.Text]] = None,
+    iterations: int = 1000,
+    warmup: int = 50,
+) -> typing.Dict[typing.Text, typing.Any]:
+    results: typing.Dict[typing.Text, typing.Any] = {}
+    for name in scenarios or SCENARIOS:
+        if name not in SCENARIOS:
+            raise ValueError(
+                f"Unknown scenario: '{name}'. Available: {list(SCENARIOS)}."
+            )
+        flow, kwargs, nodes_per_run = SCENARIOS[name]()
+        results[name] = measure(
+            flow, kwargs, nodes_per_run, iterations=iterations, warmup=warmup
+        )
+    results["build"] = measure_add_node()
+    results["nodes"] = measure_node_creation()
+    results["load"] = measure_load()
+    return {
+        "version": VERSION,
+        "python": platform.python_version(),
+        "timestamp": time.time(),
+        "results": results,
+    }
+
+
+# Metrics where a larger number is a regression; throughput is the inverse.
+_LOWER_IS_BETTER = (
+    "mean_us",
+    "p50_us",
+    "p95_us",
+    "p99_us",
+    "per_node_us",
+    "add_node_us",
+    "compile_us",
+    "create_us",
+    "bytes_per_node",
+    "add_nodes_us",
+    "load_json_us",
+    "load_binary_us",
+    "load_binary_plan_us",
+)
+
+
+def compare(
+    report: typing.Dict[typing.Text, typing.Any],
+    baseline: typing.Dict[typing.Text, typing.Any],
+    threshold: float = 0.1,
+) -> typing.List[typing.Text]:
+    regressions = []
+    for name, metrics in report["results"].items():
+        base = baseline.get("results", {}).get(name)
+        if not base:
+            continue
+        for metric, value in metrics.items():
+            base_value = base.get(metric)
+            if not base_value:
+                continue
+            if metric in _LOWER_IS_BETTER:
+                change = (value - base_value) / base_value
+            elif metric == "throughput_rps":
+                change = (base_value - value) / base_value
+            else:
+                continue
+            if change > threshold:
+                regressions.append(
+                    f"{name}.{metric}: {base_value:.2f} -> {value:.2f} "
+                    + f"({change:+.1%})"
+                )
+    return regressions
+
+
+def format_report(report: typing.Dict[typing.Text, typing.Any]) -> typing.Text:
+    lines = [f"flowter {report['version']} on Python {report['python']}"]
+    for name, metrics in report["results"].items():
+        values = ", ".join(f"{k}={v:.2f}" for k, v in metrics.items())
+        lines.append(f"{name}: {values}")
+    return "\n".join(lines)
+
+
+def main(args) -> int:
+    report = run_benchmarks(
+        scenarios=args.scenario, iterations=args.iterations, warmup=args.warmup
+    )
+    print(format_report(report))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            regressions = compare(report, json.load(f), threshold=args.threshold)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        return 1 if regressions else 0
+    return 0
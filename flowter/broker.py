@@ -0,0 +1,345 @@
+import importlib
+import os
+import pickle
+import socket
+import sqlite3
+import threading
+import time
+import traceback
+import typing
+import uuid
+
+from .helper import local_connection
+
+if typing.TYPE_CHECKING:
+    from flowter import Flow
+
+TASK_QUEUED = "queued"
+TASK_RUNNING = "running"
+TASK_DONE = "done"
+TASK_FAILED = "failed"
+
+
+class TaskFailedError(RuntimeError):
+    def __init__(self, task_id: int, error: typing.Text):
+        super().__init__(f"Task {task_id} failed: {error}")
+        self.task_id = task_id
+        self.error = error
+
+
+class Task(typing.NamedTuple):
+    id: int
+    flow: typing.Text
+    args: typing.Tuple[typing.Any, ...]
+    kwargs: typing.Dict[typing.Text, typing.Any]
+    attempts: int
+
+
+class Broker:
+    def enqueue(
+        self,
+        flow: typing.Text,
+        args: typing.Tuple[typing.Any, ...] = (),
+        kwargs: typing.Optional[typing.Dict[typing.Text, typing.Any]] = None,
+        max_attempts: int = 3,
+    ) -> int:
+        raise NotImplementedError
+
+    def claim(
+        self, flows: typing.Iterable[typing.Text], worker_id: typing.Text, lease: float
+    ) -> typing.Optional[Task]:
+        raise NotImplementedError
+
+    def heartbeat(self, task_id: int, worker_id: typing.Text, lease: float) -> bool:
+        raise NotImplementedError
+
+    def complete(self, task_id: int, worker_id: typing.Text, result: typing.Any):
+        raise NotImplementedError
+
+    def fail(self, task_id: int, worker_id: typing.Text, error: typing.Text):
+        raise NotImplementedError
+
+    def status(self, task_id: int) -> typing.Optional[typing.Text]:
+        raise NotImplementedError
+
+    def result(self, task_id: int) -> typing.Any:
+        raise NotImplementedError
+
+    def wait(
+        self,
+        task_id: int,
+        timeout: typing.Optional[float] = None,
+        poll_interval: float = 0.05,
+    ) -> typing.Any:
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            status = self.status(task_id)
+            if status is None:
+                raise KeyError(f"Unknown task: {task_id}")
+            if status in (TASK_DONE, TASK_FAILED):
+                return self.result(task_id)
+            if deadline is not None and time.monotonic() >= deadline:
+                raise TimeoutError(f"Task {task_id} did not finish in {timeout}s.")
+            time.sleep(poll_interval)
+
+
+class SQLiteBroker(Broker):
+    def __init__(self, path: typing.Text, timeout: float = 30.0):
+        self.path = path
+        self.timeout = timeout
+        self._local = threading.local()
+        conn = self._connection()
+        conn.execute("PRAGMA journal_mode=WAL")
+        with conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS tasks ("
+                + "id INTEGER PRIMARY KEY AUTOINCREMENT, flow TEXT NOT NULL, "
+                + "payload BLOB NOT NULL, status TEXT NOT NULL, "
+                + "attempts INTEGER NOT NULL DEFAULT 0, max_attempts INTEGER NOT NULL, "
+                + "worker TEXT, lease_expires REAL, result BLOB, error TEXT, "
+                + "created_at REAL NOT NULL, updated_at REAL NOT NULL)"
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS tasks_claim ON tasks (status, flow, id)"
+            )
+
+    def enqueue(self, flow, args=(), kwargs=None, max_attempts=3) -> int:
+        payload = pickle.dumps((tuple(args), dict(kwargs or {})))
+        now = time.time()
+        with self._connection() as conn:
+            cursor = conn.execute(
+                "INSERT INTO tasks (flow, payload, status, max_attempts, created_at, "
+                + "updated_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (flow, payload, TASK_QUEUED, max_attempts, now, now),
+            )
+        return cursor.lastrowid
+
+    def claim(self, flows, worker_id, lease) -> typing.Optional[Task]:
+        flows = list(flows)
+        if not flows:
+            return None
+        placeholders = ", ".join("?" for _ in flows)
+        now = time.time()
+        conn = self._connection()
+        # IMMEDIATE takes the write lock up front so two workers cannot both
+        # select the same row before either updates it.
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # Leases that ran out belong to workers that died or hung.
+            conn.execute(
+                "UPDATE tasks SET status = ?, error = ?, updated_at = ? "
+                + "WHERE status = ? AND lease_expires < ? AND attempts >= max_attempts",
+                (TASK_FAILED, "worker lost", now, TASK_RUNNING, now),
+            )
+            row = conn.execute(
+                "SELECT id, flow, payload, attempts FROM tasks "
+                + f"WHERE flow IN ({placeholders}) AND (status = ? "
+                + "OR (status = ? AND lease_expires < ?)) ORDER BY id LIMIT 1",
+                (*flows, TASK_QUEUED, TASK_RUNNING, now),
+            ).fetchone()
+            if row is None:
+                conn.execute("COMMIT")
+                return None
+            conn.execute(
+                "UPDATE tasks SET status = ?, worker = ?, attempts = attempts + 1, "
+                + "lease_expires = ?, updated_at = ? WHERE id = ?",
+                (TASK_RUNNING, worker_id, now + lease, now, row[0]),
+            )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        args, kwargs = pickle.loads(row[2])
+        return Task(row[0], row[1], args, kwargs, row[3] + 1)
+
+    def heartbeat(self, task_id, worker_id, lease) -> bool:
+        with self._connection() as conn:
+            cursor = conn.execute(
+                "UPDATE tasks SET lease_expires = ? "
+                + "WHERE id = ? AND worker = ? AND status = ?",
+                (time.time() + lease, task_id, worker_id, TASK_RUNNING),
+            )
+        return cursor.rowcount == 1
+
+    def complete(self, task_id, worker_id, result):
+        self._finish(task_id, worker_id, TASK_DONE, pickle.dumps(result), None)
+
+    def fail(self, task_id, worker_id, error):
+        self._finish(task_id, worker_id, TASK_FAILED, None, error)
+
+    def status(self, task_id) -> typing.Optional[typing.Text]:
+        row = (
+            self._connection()
+            .execute("SELECT status FROM tasks WHERE id = ?", (task_id,))
+            .fetchone()
+        )
+        return row[0] if row else None
+
+    def result(self, task_id) -> typing.Any:
+        row = (
+            self._connection()
+            .execute("SELECT status, result, error FROM tasks WHERE id = ?", (task_id,))
+            .fetchone()
+        )
+        if row is None:
+            raise KeyError(f"Unknown task: {task_id}")
+        status, result, error = row
+        if status == TASK_FAILED:
+            raise TaskFailedError(task_id, error)
+        if status != TASK_DONE:
+            raise LookupError(f"Task {task_id} is still {status}.")
+        return pickle.loads(result)
+
+    def counts(self) -> typing.Dict[typing.Text, int]:
+        rows = self._connection().execute(
+            "SELECT status, COUNT(*) FROM tasks GROUP BY status"
+        )
+        return dict(rows)
+
+    def _finish(self, task_id, worker_id, status, result, error):
+        # Only the current lease holder may acknowledge; a worker whose lease
+        # expired and was re-claimed elsewhere is ignored.
+        with self._connection() as conn:
+            conn.execute(
+                "UPDATE tasks SET status = ?, result = ?, error = ?, "
+                + "lease_expires = NULL, updated_at = ? "
+                + "WHERE id = ? AND worker = ? AND status = ?",
+                (status, result, error, time.time(), task_id, worker_id, TASK_RUNNING),
+            )
+
+    def _connection(self) -> sqlite3.Connection:
+        return local_connection(
+            self._local, self.path, timeout=self.timeout, isolation_level=None
+        )
+
+
+class Worker:
+    def __init__(
+        self,
+        broker: Broker,
+        flows: typing.Iterable["Flow"],
+        worker_id: typing.Optional[typing.Text] = None,
+        lease: float = 30.0,
+        poll_interval: float = 0.1,
+    ):
+        self.broker = broker
+        self.flows: typing.Dict[typing.Text, "Flow"] = {f.name: f for f in flows}
+        self.worker_id = (
+            worker_id or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+        )
+        self.lease = lease
+        self.poll_interval = poll_interval
+        self.processed = 0
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+
+    def __repr__(self) -> typing.Text:
+        return f"<Worker id={self.worker_id}, flows={list(self.flows)}>"
+
+    def stop(self):
+        self._stop.set()
+
+    def run(self, max_tasks: typing.Optional[int] = None, concurrency: int = 1) -> int:
+        for flow in self.flows.values():
+            flow.compile()
+        threads = [
+            threading.Thread(
+                target=self._loop,
+                args=(max_tasks,),
+                name=f"flowter-worker-{i}",
+                daemon=True,
+            )
+            for i in range(concurrency - 1)
+        ]
+        for thread in threads:
+            thread.start()
+        self._loop(max_tasks)
+        for thread in threads:
+            thread.join()
+        return self.processed
+
+    def run_one(self) -> bool:
+        task = self.broker.claim(self.flows, self.worker_id, self.lease)
+        if task is None:
+            return False
+        beat_stop = threading.Event()
+        beat = threading.Thread(
+            target=self._heartbeat, args=(task.id, beat_stop), daemon=True
+        )
+        beat.start()
+        try:
+            result = self.flows[task.flow].run(*task.args, **task.kwargs)
+        except Exception as e:
+            self.broker.fail(task.id, self.worker_id, _describe(e))
+        else:
+            try:
+                self.broker.complete(task.id, self.worker_id, result)
+            except (pickle.PicklingError, TypeError, AttributeError) as e:
+                # Left running, the task would be re-claimed after its lease
+                # and fail the same way on the next worker.
+                self.broker.fail(
+                    task.id, self.worker_id, f"Cannot store result: {_describe(e)}"
+                )
+        finally:
+            beat_stop.set()
+            beat.join()
+        return True
+
+    def _loop(self, max_tasks: typing.Optional[int]):
+        while not self._stop.is_set():
+            with self._lock:
+                if max_tasks is not None and self.processed >= max_tasks:
+                    return
+                self.processed += 1
+            if not self.run_one():
+                with self._lock:
+                    self.processed -= 1
+                self._stop.wait(self.poll_interval)
+
+    def _heartbeat(self, task_id: int, stop: threading.Event):
+        while not stop.wait(self.lease / 3):
+            if not self.broker.heartbeat(task_id, self.worker_id, self.lease):
+                return
+
+
+def _describe(exc: BaseException) -> typing.Text:
+    return "".join(traceback.format_exception_only(type(exc), exc)).strip()
+
+
+def load_flow(ref: typing.Text) -> "Flow":
+    from flowter import Flow
+
+    if os.path.isfile(ref):
+        # A definition saved with flowter.serialize.dump.
+        from flowter.serialize import load
+
+        return load(ref)
+    module_name, _, attr = ref.partition(":")
+    if not module_name or not attr:
+        raise ValueError(f"Invalid flow reference: '{ref}'. Expected 'module:attr'.")
+    target = importlib.import_module(module_name)
+    for part in attr.split("."):
+        target = getattr(target, part)
+    if not isinstance(target, Flow) and callable(target):
+        # Factories let workers build flows that are not module globals.
+        target = target()
+    if not isinstance(target, Flow):
+        raise TypeError(f"'{ref}' is not a Flow, got: {type(target).__name__}")
+    return target
+
+
+def main(args) -> int:
+    broker = SQLiteBroker(args.broker)
+    worker = Worker(
+        broker,
+        [load_flow(ref) for ref in args.flow],
+        worker_id=args.worker_id,
+        lease=args.lease,
+        poll_interval=args.poll_interval,
+    )
+    print(f"{worker!r} serving {args.broker}", flush=True)
+    try:
+        worker.run(max_tasks=args.max_tasks, concurrency=args.concurrency)
+    except KeyboardInterrupt:
+        worker.stop()
+    return 0
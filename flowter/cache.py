@@ -0,0 +1,215 @@
+import contextlib
+import hashlib
+import inspect
+import os
+import pickle
+import tempfile
+import threading
+import time
+import typing
+from collections import OrderedDict
+
+_MISSING = object()
+
+
+class CacheBackend:
+    # Persistent backends outlive the process, so their keys name functions
+    # instead of holding them, see persistent_func_id.
+    persistent = False
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.bypasses = 0
+        # Counters are shared by concurrent runs, += alone would lose updates.
+        self._stats_lock = threading.Lock()
+
+    def __repr__(self) -> typing.Text:
+        return (
+            f"<{self.__class__.__name__} hits={self.hits}, misses={self.misses}, "
+            + f"bypasses={self.bypasses}>"
+        )
+
+    @property
+    def stats(self) -> typing.Dict[typing.Text, int]:
+        return {"hits": self.hits, "misses": self.misses, "bypasses": self.bypasses}
+
+    def lookup(self, key: typing.Hashable) -> typing.Tuple[bool, typing.Any]:
+        value = self.get(key)
+        if value is _MISSING:
+            with self._stats_lock:
+                self.misses += 1
+            return (False, None)
+        with self._stats_lock:
+            self.hits += 1
+        return (True, value)
+
+    def count_bypass(self):
+        with self._stats_lock:
+            self.bypasses += 1
+
+    def get(self, key: typing.Hashable) -> typing.Any:
+        raise NotImplementedError
+
+    def set(self, key: typing.Hashable, value: typing.Any):
+        raise NotImplementedError
+
+    def clear(self):
+        raise NotImplementedError
+
+
+class LRUCache(CacheBackend):
+    def __init__(self, maxsize: int = 1024, ttl: typing.Optional[float] = None):
+        super().__init__()
+        if maxsize < 1:
+            raise ValueError(f"maxsize must be positive, got: {maxsize}")
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[typing.Hashable, typing.Tuple[float, typing.Any]]" = (
+            OrderedDict()
+        )
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: typing.Hashable) -> typing.Any:
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is _MISSING:
+                return _MISSING
+            expires_at, value = entry
+            if expires_at and expires_at < time.monotonic():
+                del self._data[key]
+                return _MISSING
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: typing.Hashable, value: typing.Any):
+        expires_at = time.monotonic() + self.ttl if self.ttl else 0.0
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class DiskCache(CacheBackend):
+    persistent = True
+
+    def __init__(self, directory: typing.Text, ttl: typing.Optional[float] = None):
+        super().__init__()
+        self.directory = directory
+        self.ttl = ttl
+        self.write_errors = 0
+        os.makedirs(directory, exist_ok=True)
+
+    @property
+    def stats(self) -> typing.Dict[typing.Text, int]:
+        return {**super().stats, "write_errors": self.write_errors}
+
+    def get(self, key: typing.Hashable) -> typing.Any:
+        try:
+            path = self._path(key)
+            if self.ttl and os.path.getmtime(path) + self.ttl < time.time():
+                os.remove(path)
+                return _MISSING
+            with open(path, "rb") as f:
+                return pickle.load(f)
+        except (OSError, EOFError, pickle.PickleError, TypeError, AttributeError):
+            return _MISSING
+
+    def set(self, key: typing.Hashable, value: typing.Any):
+        try:
+            path = self._path(key)
+        except (pickle.PickleError, TypeError, AttributeError):
+            return
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, path)
+        except BaseException as e:
+            with contextlib.suppress(OSError):
+                os.remove(tmp_path)
+            if not isinstance(e, Exception):
+                raise
+            # The value was computed fine; failing to cache it must not fail
+            # the node, e.g. when it holds a lock and cannot be pickled.
+            with self._stats_lock:
+                self.write_errors += 1
+
+    def clear(self):
+        for filename in os.listdir(self.directory):
+            if filename.endswith(".pkl"):
+                os.remove(os.path.join(self.directory, filename))
+
+    def _path(self, key: typing.Hashable) -> typing.Text:
+        digest = hashlib.sha256(pickle.dumps(key, protocol=4)).hexdigest()
+        return os.path.join(self.directory, f"{digest}.pkl")
+
+
+def persistent_func_id(func: typing.Callable) -> typing.Text:
+    # Lambdas, closures from one factory and partials share a qualified name,
+    # and bound methods share it across instances, so none of them can be told
+    # apart by a key that has to survive the process.
+    module = getattr(func, "__module__", None)
+    qualname = getattr(func, "__qualname__", None)
+    if (
+        not module
+        or not qualname
+        or "<lambda>" in qualname
+        or "<locals>" in qualname
+        or (inspect.ismethod(func) and not inspect.isclass(func.__self__))
+    ):
+        raise ValueError(
+            f"Cannot use {func!r} with a persistent cache: only module-level "
+            + "functions and classmethods have a name that identifies them."
+        )
+    return f"{module}.{qualname}"
+
+
+def make_cache_key(
+    func: typing.Callable,
+    args: typing.Tuple[typing.Any, ...],
+    kwargs: typing.Dict[typing.Text, typing.Any],
+    exclude: typing.Optional[typing.FrozenSet[typing.Text]] = None,
+    signature: typing.Optional[inspect.Signature] = None,
+    persistent: bool = False,
+) -> typing.Optional[typing.Hashable]:
+    # In memory the function itself is the key, so two functions sharing a
+    # backend never share entries.
+    func_id = persistent_func_id(func) if persistent else func
+    if exclude and signature is not None:
+        bound = signature.bind_partial(*args, **kwargs).arguments
+        parameters = signature.parameters
+        key = (
+            func_id,
+            tuple(
+                (
+                    name,
+                    _without(value, exclude)
+                    if parameters[name].kind == inspect.Parameter.VAR_KEYWORD
+                    else value,
+                )
+                for name, value in bound.items()
+                if name not in exclude
+            ),
+        )
+    else:
+        key = (func_id, args, tuple(sorted(kwargs.items())))
+    try:
+        hash(key)
+    except TypeError:
+        return None
+    return key
+
+
+def _without(
+    values: typing.Dict[typing.Text, typing.Any], exclude: typing.FrozenSet[typing.Text]
+) -> typing.Tuple[typing.Tuple[typing.Text, typing.Any], ...]:
+    return tuple(sorted((k, v) for k, v in values.items() if k not in exclude))
@@ -0,0 +1,185 @@
+import os
+import pickle
+import sqlite3
+import tempfile
+import threading
+import time
+import typing
+import uuid
+
+from .helper import local_connection
+
+if typing.TYPE_CHECKING:
+    from flowter import Node
+
+STATUS_RUNNING = "running"
+STATUS_FAILED = "failed"
+STATUS_COMPLETED = "completed"
+
+
+class CheckpointedRunError(RuntimeError):
+    def __init__(self, run_id: typing.Text, node_name: typing.Text, exc: Exception):
+        super().__init__(
+            f"Run '{run_id}' failed at node '{node_name}': {exc!r}. "
+            + f"Resume it with Flow.resume('{run_id}')."
+        )
+        self.run_id = run_id
+        self.node_name = node_name
+
+
+class CheckpointStore:
+    def save(self, run_id: typing.Text, record: typing.Dict[typing.Text, typing.Any]):
+        raise NotImplementedError
+
+    def load(
+        self, run_id: typing.Text
+    ) -> typing.Optional[typing.Dict[typing.Text, typing.Any]]:
+        raise NotImplementedError
+
+    def delete(self, run_id: typing.Text):
+        raise NotImplementedError
+
+    def list_runs(
+        self, status: typing.Optional[typing.Text] = None
+    ) -> typing.List[typing.Text]:
+        raise NotImplementedError
+
+
+class FileCheckpointStore(CheckpointStore):
+    def __init__(self, directory: typing.Text):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def save(self, run_id: typing.Text, record: typing.Dict[typing.Text, typing.Any]):
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                pickle.dump(record, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, self._path(run_id))
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+
+    def load(
+        self, run_id: typing.Text
+    ) -> typing.Optional[typing.Dict[typing.Text, typing.Any]]:
+        try:
+            with open(self._path(run_id), "rb") as f:
+                return pickle.load(f)
+        except FileNotFoundError:
+            return None
+
+    def delete(self, run_id: typing.Text):
+        try:
+            os.remove(self._path(run_id))
+        except FileNotFoundError:
+            pass
+
+    def list_runs(
+        self, status: typing.Optional[typing.Text] = None
+    ) -> typing.List[typing.Text]:
+        run_ids = [
+            filename[: -len(".ckpt")]
+            for filename in sorted(os.listdir(self.directory))
+            if filename.endswith(".ckpt")
+        ]
+        if status is None:
+            return run_ids
+        return [
+            run_id
+            for run_id in run_ids
+            if (self.load(run_id) or {}).get("status") == status
+        ]
+
+    def _path(self, run_id: typing.Text) -> typing.Text:
+        return os.path.join(self.directory, f"{run_id}.ckpt")
+
+
+class SQLiteCheckpointStore(CheckpointStore):
+    def __init__(self, path: typing.Text):
+        self.path = path
+        self._local = threading.local()
+        with self._connection() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS checkpoints ("
+                + "run_id TEXT PRIMARY KEY, status TEXT NOT NULL, "
+                + "updated_at REAL NOT NULL, record BLOB NOT NULL)"
+            )
+
+    def save(self, run_id: typing.Text, record: typing.Dict[typing.Text, typing.Any]):
+        with self._connection() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO checkpoints VALUES (?, ?, ?, ?)",
+                (
+                    run_id,
+                    record["status"],
+                    time.time(),
+                    pickle.dumps(record, protocol=pickle.HIGHEST_PROTOCOL),
+                ),
+            )
+
+    def load(
+        self, run_id: typing.Text
+    ) -> typing.Optional[typing.Dict[typing.Text, typing.Any]]:
+        row = (
+            self._connection()
+            .execute("SELECT record FROM checkpoints WHERE run_id = ?", (run_id,))
+            .fetchone()
+        )
+        return pickle.loads(row[0]) if row else None
+
+    def delete(self, run_id: typing.Text):
+        with self._connection() as conn:
+            conn.execute("DELETE FROM checkpoints WHERE run_id = ?", (run_id,))
+
+    def list_runs(
+        self, status: typing.Optional[typing.Text] = None
+    ) -> typing.List[typing.Text]:
+        if status is None:
+            rows = self._connection().execute(
+                "SELECT run_id FROM checkpoints ORDER BY updated_at"
+            )
+        else:
+            rows = self._connection().execute(
+                "SELECT run_id FROM checkpoints WHERE status = ? ORDER BY updated_at",
+                (status,),
+            )
+        return [row[0] for row in rows]
+
+    def _connection(self) -> sqlite3.Connection:
+        return local_connection(self._local, self.path)
+
+
+class RunCheckpoint:
+    def __init__(
+        self,
+        store: CheckpointStore,
+        flow_name: typing.Text,
+        args: typing.Tuple[typing.Any, ...],
+        kwargs: typing.Dict[typing.Text, typing.Any],
+        run_id: typing.Optional[typing.Text] = None,
+    ):
+        self.store = store
+        self.flow_name = flow_name
+        self.args = args
+        self.kwargs = kwargs
+        self.run_id = run_id or uuid.uuid4().hex
+
+    def save(
+        self,
+        node: typing.Optional["Node"],
+        result: typing.Dict[typing.Text, typing.Any],
+        status: typing.Text = STATUS_RUNNING,
+    ):
+        self.store.save(
+            self.run_id,
+            {
+                "flow": self.flow_name,
+                "status": status,
+                "node": node.id if node is not None else None,
+                "node_name": node.name if node is not None else None,
+                "result": result,
+                "args": self.args,
+                "kwargs": self.kwargs,
+            },
+        )
@@ -0,0 +1,408 @@
+import asyncio
+import contextvars
+import inspect
+import threading
+import typing
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+
+from .plan import (
+    STEP_CONDITION,
+    STEP_SUBFLOW,
+    STEP_SWITCH,
+    FlowPlan,
+    NodeStep,
+    RunState,
+    _link_steps,
+    is_boundary,
+)
+
+if typing.TYPE_CHECKING:
+    from flowter import Flow
+
+
+def infer_dependencies(
+    steps: typing.List[NodeStep], start: NodeStep, end: NodeStep
+) -> typing.Tuple[
+    typing.List[typing.Tuple[int, ...]], typing.List[typing.Tuple[int, ...]]
+]:
+    # Returns, per step index, the steps it waits for and the producers whose
+    # keys it reads. A parameter named after another node's result key is a
+    # data dependency, any other parameter comes from the run inputs.
+    index = {id(step): i for i, step in enumerate(steps)}
+    # Explicit edges still order nodes, e.g. for side effects.
+    linked: typing.List[typing.Set[int]] = [set() for _ in steps]
+    for i, step in enumerate(steps):
+        if step is not end:
+            for next_step in step.routes:
+                linked[index[id(next_step)]].add(i)
+    producers: typing.Dict[typing.Text, int] = {}
+    for i, step in enumerate(steps):
+        if step.kind in (STEP_CONDITION, STEP_SWITCH):
+            raise ValueError(
+                f"Node '{step.node.name}' routes on its value, which dataflow "
+                + "mode cannot express; use a sequential flow instead."
+            )
+        if step.merge:
+            raise ValueError(
+                f"Node '{step.node.name}' merges a dict into the result, so its "
+                + "keys are unknown before it runs; give it a return_envelope "
+                + "key to use it in dataflow mode."
+            )
+        if step.key in producers:
+            raise ValueError(
+                f"Result key '{step.key}' is written by both "
+                + f"'{steps[producers[step.key]].node.name}' and "
+                + f"'{step.node.name}', so readers of it are ambiguous."
+            )
+        producers[step.key] = i
+
+    end_index = index[id(end)]
+    after: typing.List[typing.Set[int]] = []
+    read: typing.List[typing.Set[int]] = []
+    kwargs_readers: typing.List[int] = []
+    for i, step in enumerate(steps):
+        if step is start:
+            after.append(set())
+            read.append(set())
+            continue
+        if step is end:
+            after.append({j for j in range(len(steps)) if j != i})
+            read.append(set())
+            continue
+        params = step.node.func_params.values()
+        if any(p.kind == inspect.Parameter.VAR_KEYWORD for p in params):
+            # Reads every key; resolved below, once the other edges are known.
+            kwargs_readers.append(i)
+            reads_i: typing.Set[int] = set()
+        else:
+            reads_i = {
+                producers[p.name]
+                for p in params
+                if p.kind
+                in (
+                    inspect.Parameter.POSITIONAL_OR_KEYWORD,
+                    inspect.Parameter.KEYWORD_ONLY,
+                )
+                and p.name in producers
+            }
+        reads_i.discard(i)
+        reads_i.discard(end_index)
+        after_i = reads_i | linked[i]
+        after_i.add(index[id(start)])
+        after_i.discard(i)
+        after.append(after_i)
+        read.append(reads_i)
+
+    # A **kwargs reader sees the keys of every producer that does not itself
+    # depend on it. Other **kwargs readers count only when they are already
+    # upstream, so two unrelated ones stay concurrent instead of deadlocking.
+    kwargs_set = set(kwargs_readers)
+    for i in kwargs_readers:
+        upstream = _closure(i, after)
+        downstream = _closure(i, _invert(after))
+        reads_i = {
+            j
+            for j in range(len(steps))
+            if j != i
+            and j != end_index
+            and j not in downstream
+            and (j not in kwargs_set or j in upstream)
+        }
+        read[i] = reads_i
+        after[i] |= reads_i
+
+    waits = [tuple(sorted(a)) for a in after]
+    reads = [tuple(sorted(r)) for r in read]
+    return (waits, reads)
+
+
+def _closure(i: int, edges: typing.List[typing.Set[int]]) -> typing.Set[int]:
+    seen: typing.Set[int] = set()
+    stack = list(edges[i])
+    while stack:
+        j = stack.pop()
+        if j not in seen:
+            seen.add(j)
+            stack.extend(edges[j])
+    return seen
+
+
+def _invert(edges: typing.List[typing.Set[int]]) -> typing.List[typing.Set[int]]:
+    inverted: typing.List[typing.Set[int]] = [set() for _ in edges]
+    for i, targets in enumerate(edges):
+        for j in targets:
+            inverted[j].add(i)
+    return inverted
+
+
+class DataflowPlan(FlowPlan):
+    dataflow = True
+
+    def __init__(
+        self,
+        flow: "Flow",
+        entry: NodeStep,
+        steps: typing.List[NodeStep],
+        analyze: bool = True,
+    ):
+        # Liveness is tracked with reader counts below, not the routed analysis.
+        super().__init__(flow, entry, steps, analyze=False)
+        self.exit = self.by_id[flow.end_node.id]
+        self.entry_index = steps.index(entry)
+        self.waits, self.reads = infer_dependencies(steps, entry, self.exit)
+        self.dependents: typing.List[typing.List[int]] = [[] for _ in steps]
+        for i, waits in enumerate(self.waits):
+            for j in waits:
+                self.dependents[j].append(i)
+        self.readers = [0] * len(steps)
+        for reads in self.reads:
+            for j in reads:
+                self.readers[j] += 1
+        self._check_acyclic()
+        # Synchronous nodes would block the loop, so async runs hand them to
+        # the pool; nodes with an executor already leave the loop on their own.
+        self.blocking = [
+            step.kind != STEP_SUBFLOW
+            and step.node.executor is None
+            and not is_boundary(step.node)
+            and not inspect.iscoroutinefunction(step.node.func)
+            for step in steps
+        ]
+        self.max_workers = flow.dataflow_workers
+        self._pool: typing.Optional[ThreadPoolExecutor] = None
+        self._pool_lock = threading.Lock()
+
+    def __repr__(self) -> typing.Text:
+        return f"<DataflowPlan flow={self.flow.name}, steps={len(self.steps)}>"
+
+    @classmethod
+    def from_flow(cls, flow: "Flow") -> "DataflowPlan":
+        if flow.checkpoint_store is not None:
+            raise ValueError(
+                f"Flow '{flow.name}' has a checkpoint store, but dataflow runs have "
+                + "no single position to resume from."
+            )
+        graph = flow.graph
+        steps: typing.Dict[typing.Text, NodeStep] = {
+            node.id: NodeStep(node, resources=flow.resources)
+            for node in graph.nodes.values()
+        }
+        _link_steps(steps)
+        return cls(flow, steps[flow.start_node.id], list(steps.values()))
+
+    def _check_acyclic(self):
+        remaining = [len(waits) for waits in self.waits]
+        ready = [i for i, count in enumerate(remaining) if not count]
+        seen = 0
+        while ready:
+            i = ready.pop()
+            seen += 1
+            for j in self.dependents[i]:
+                remaining[j] -= 1
+                if not remaining[j]:
+                    ready.append(j)
+        if seen != len(self.steps):
+            stuck = [self.steps[i].node.name for i, c in enumerate(remaining) if c]
+            raise ValueError(
+                f"Flow '{self.flow.name}' has cyclic data dependencies between: "
+                + ", ".join(stuck)
+            )
+
+    @property
+    def pool(self) -> ThreadPoolExecutor:
+        if self._pool is None:
+            with self._pool_lock:
+                if self._pool is None:
+                    self._pool = ThreadPoolExecutor(
+                        max_workers=self.max_workers,
+                        thread_name_prefix=f"flowter-{self.flow.name}",
+                    )
+        return self._pool
+
+    def run(self, *args, **kwargs) -> typing.Dict[typing.Text, typing.Any]:
+        run = self.new_run(args, kwargs)
+        result: typing.Dict[typing.Text, typing.Any] = {}
+        for hook in run.hooks:
+            hook.on_run_start(run)
+        try:
+            self._schedule(result, run)
+        except BaseException as e:
+            self._end(result, run, e)
+            raise
+        self._end(result, run, None)
+        return result
+
+    async def arun(self, *args, **kwargs) -> typing.Dict[typing.Text, typing.Any]:
+        run = self.new_run(args, kwargs)
+        result: typing.Dict[typing.Text, typing.Any] = {}
+        for hook in run.hooks:
+            hook.on_run_start(run)
+        try:
+            await self._aschedule(result, run)
+        except BaseException as e:
+            self._end(result, run, e)
+            raise
+        self._end(result, run, None)
+        return result
+
+    def resume(self, run_id: typing.Text) -> typing.Dict[typing.Text, typing.Any]:
+        raise ValueError("Dataflow runs cannot be resumed.")
+
+    async def aresume(
+        self, run_id: typing.Text
+    ) -> typing.Dict[typing.Text, typing.Any]:
+        raise ValueError("Dataflow runs cannot be resumed.")
+
+    def _call(
+        self,
+        step: NodeStep,
+        call_args: typing.Tuple[typing.Any, ...],
+        call_kwargs: typing.Dict[typing.Text, typing.Any],
+        run: RunState,
+    ) -> typing.Any:
+        if run.hooks:
+            return self._traced_call(step, call_args, call_kwargs, run)
+        return step.node.run(*call_args, **call_kwargs)
+
+    def _finish(
+        self,
+        i: int,
+        value: typing.Any,
+        result: typing.Dict[typing.Text, typing.Any],
+        run: RunState,
+        waiting: typing.List[int],
+        unread: typing.Optional[typing.List[int]],
+    ) -> typing.List[int]:
+        # Only the scheduling thread touches result and the counters.
+        step = self.steps[i]
+        self._store(step, result, value, run)
+        if unread is not None:
+            # A key is dead once every node reading it has run.
+            for j in self.reads[i]:
+                unread[j] -= 1
+                if not unread[j]:
+                    self._drop(j, result)
+            if not unread[i]:
+                self._drop(i, result)
+        ready = []
+        for j in self.dependents[i]:
+            waiting[j] -= 1
+            if not waiting[j]:
+                ready.append(j)
+        return ready
+
+    def _drop(self, i: int, result: typing.Dict[typing.Text, typing.Any]):
+        key = self.steps[i].key
+        if key not in self.keep_keys:
+            result.pop(key, None)
+
+    def _schedule(self, result: typing.Dict[typing.Text, typing.Any], run: RunState):
+        waiting = [len(waits) for waits in self.waits]
+        unread = list(self.readers) if self.liveness else None
+        ready = [self.entry_index]
+        running: typing.Dict[Future, int] = {}
+        try:
+            while ready or running:
+                if len(ready) == 1 and not running:
+                    # Nothing to overlap with, so skip the pool round trip.
+                    i = ready.pop()
+                    step = self.steps[i]
+                    if step.resources is not None:
+                        value = self._invoke(step, result, run)
+                    else:
+                        value = self._call(
+                            step, *self._collect(step, result, run.kwargs, run), run
+                        )
+                    ready = self._finish(i, value, result, run, waiting, unread)
+                    continue
+                for i in ready:
+                    step = self.steps[i]
+                    context = contextvars.copy_context()
+                    if step.resources is not None:
+                        # Leasing may block, so it happens on the worker; the
+                        # keys it binds are final once its inputs are stored.
+                        future = self.pool.submit(
+                            context.run, self._invoke, step, result, run
+                        )
+                    else:
+                        call_args, call_kwargs = self._collect(
+                            step, result, run.kwargs, run
+                        )
+                        future = self.pool.submit(
+                            context.run, self._call, step, call_args, call_kwargs, run
+                        )
+                    running[future] = i
+                ready = []
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    i = running.pop(future)
+                    value = future.result()
+                    ready.extend(self._finish(i, value, result, run, waiting, unread))
+        finally:
+            # On failure, nodes that have not started yet never will.
+            for future in running:
+                future.cancel()
+
+    async def _aschedule(
+        self, result: typing.Dict[typing.Text, typing.Any], run: RunState
+    ):
+        waiting = [len(waits) for waits in self.waits]
+        unread = list(self.readers) if self.liveness else None
+        ready = [self.entry_index]
+        running: typing.Dict[asyncio.Future, int] = {}
+        loop = asyncio.get_running_loop()
+        try:
+            while ready or running:
+                for i in ready:
+                    step = self.steps[i]
+                    if self.blocking[i]:
+                        context = contextvars.copy_context()
+                        if step.resources is not None:
+                            task = loop.run_in_executor(
+                                self.pool, context.run, self._invoke, step, result, run
+                            )
+                        else:
+                            call_args, call_kwargs = self._collect(
+                                step, result, run.kwargs, run
+                            )
+                            task = loop.run_in_executor(
+                                self.pool,
+                                context.run,
+                                self._call,
+                                step,
+                                call_args,
+                                call_kwargs,
+                                run,
+                            )
+                    elif step.resources is not None:
+                        task = asyncio.ensure_future(self._ainvoke(step, result, run))
+                    else:
+                        call_args, call_kwargs = self._collect(
+                            step, result, run.kwargs, run
+                        )
+                        task = asyncio.ensure_future(
+                            self._acall(step, call_args, call_kwargs, run)
+                        )
+                    running[task] = i
+                ready = []
+                done, _ = await asyncio.wait(
+                    running, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    i = running.pop(task)
+                    value = task.result()
+                    ready.extend(self._finish(i, value, result, run, waiting, unread))
+        finally:
+            for task in running:
+                task.cancel()
+
+    async def _acall(
+        self,
+        step: NodeStep,
+        call_args: typing.Tuple[typing.Any, ...],
+        call_kwargs: typing.Dict[typing.Text, typing.Any],
+        run: RunState,
+    ) -> typing.Any:
+        if run.hooks:
+            return await self._atraced_call(step, call_args, call_kwargs, run)
+        return await step.node.arun(*call_args, **call_kwargs)
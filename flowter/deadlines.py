@@ -0,0 +1,307 @@
+import asyncio
+import contextlib
+import contextvars
+import os
+import random
+import threading
+import time
+import typing
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    Executor,
+    Future,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+    wait,
+)
+
+from .executors import resolve_executor
+from .payloads import call_with_payloads, has_payloads
+
+if typing.TYPE_CHECKING:
+    from flowter import Node
+
+# Absolute time.monotonic() deadline of the innermost budget, None when
+# unbounded. Fork branches and guarded calls run in copies of the context.
+_deadline: contextvars.ContextVar[typing.Optional[float]] = contextvars.ContextVar(
+    "flowter_deadline", default=None
+)
+
+_lock = threading.Lock()
+_guard_pool: typing.Optional[ThreadPoolExecutor] = None
+
+
+class DeadlineExceeded(TimeoutError):
+    def __init__(self, name: typing.Text, budget: typing.Optional[float] = None):
+        detail = f" of {budget:.3f}s" if budget is not None else ""
+        super().__init__(f"Node '{name}' exceeded its time budget{detail}.")
+        self.name = name
+        self.budget = budget
+
+
+class Retry:
+    __slots__ = ("attempts", "backoff", "multiplier", "max_backoff", "jitter", "on")
+
+    def __init__(
+        self,
+        attempts: int = 3,
+        backoff: float = 0.05,
+        multiplier: float = 2.0,
+        max_backoff: float = 2.0,
+        jitter: bool = True,
+        on: typing.Union[
+            typing.Type[BaseException], typing.Tuple[typing.Type[BaseException], ...]
+        ] = Exception,
+    ):
+        if attempts < 1:
+            raise ValueError(f"Retry needs at least one attempt, got: {attempts}")
+        if backoff < 0 or max_backoff < 0 or multiplier < 1:
+            raise ValueError(
+                "Retry backoff and max_backoff must not be negative and "
+                + "multiplier must be at least 1."
+            )
+        self.attempts = attempts
+        self.backoff = backoff
+        self.multiplier = multiplier
+        self.max_backoff = max_backoff
+        self.jitter = jitter
+        self.on = on
+
+    def __repr__(self) -> typing.Text:
+        return f"<Retry attempts={self.attempts}, backoff={self.backoff}>"
+
+    def delay(self, attempt: int) -> float:
+        delay = min(self.max_backoff, self.backoff * self.multiplier ** (attempt - 1))
+        if self.jitter:
+            # Spread retries of concurrent runs so they don't hit a recovering
+            # dependency in lockstep.
+            delay = random.uniform(delay / 2, delay)
+        return delay
+
+    def should_retry(self, exc: BaseException, attempt: int) -> bool:
+        return (
+            attempt < self.attempts
+            and isinstance(exc, self.on)
+            and not isinstance(exc, DeadlineExceeded)
+        )
+
+
+def validate_seconds(
+    value: typing.Optional[float], label: typing.Text
+) -> typing.Optional[float]:
+    if value is None:
+        return None
+    if value <= 0:
+        raise ValueError(f"{label} must be a positive number of seconds, got: {value}")
+    return float(value)
+
+
+def current_deadline() -> typing.Optional[float]:
+    return _deadline.get()
+
+
+def remaining() -> typing.Optional[float]:
+    deadline = _deadline.get()
+    if deadline is None:
+        return None
+    return max(0.0, deadline - time.monotonic())
+
+
+@contextlib.contextmanager
+def budget(seconds: typing.Optional[float]) -> typing.Iterator[None]:
+    # Budgets only ever shrink: a nested budget cannot outlive its parent.
+    if seconds is None:
+        yield
+        return
+    deadline = time.monotonic() + seconds
+    outer = _deadline.get()
+    if outer is not None and outer < deadline:
+        deadline = outer
+    token = _deadline.set(deadline)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def get_guard_pool() -> ThreadPoolExecutor:
+    # Calls that may be abandoned at their deadline get their own pool, so
+    # stragglers cannot starve the shared 'thread' executor.
+    global _guard_pool
+    if _guard_pool is None:
+        with _lock:
+            if _guard_pool is None:
+                _guard_pool = ThreadPoolExecutor(
+                    max_workers=max(32, 4 * (os.cpu_count() or 1)),
+                    thread_name_prefix="flowter-guard",
+                )
+    return _guard_pool
+
+
+def call_with_budget(
+    func: typing.Callable,
+    seconds: typing.Optional[float],
+    args: typing.Tuple,
+    kwargs: typing.Dict[typing.Text, typing.Any],
+) -> typing.Any:
+    # Runs in worker processes, where the parent's context does not exist.
+    with budget(seconds):
+        if has_payloads(args, kwargs):
+            return call_with_payloads(func, args, kwargs)
+        return func(*args, **kwargs)
+
+
+def _node_deadline(node: "Node") -> typing.Optional[float]:
+    deadline = _deadline.get()
+    if node.timeout is not None:
+        own = time.monotonic() + node.timeout
+        if deadline is None or own < deadline:
+            deadline = own
+    return deadline
+
+
+def _check(node: "Node", deadline: typing.Optional[float]):
+    if deadline is not None and time.monotonic() >= deadline:
+        raise DeadlineExceeded(node.name, node.timeout)
+
+
+def _submit(
+    node: "Node", executor: Executor, args, kwargs, deadline: typing.Optional[float]
+) -> Future:
+    if isinstance(executor, ProcessPoolExecutor):
+        seconds = None if deadline is None else max(0.0, deadline - time.monotonic())
+        return executor.submit(call_with_budget, node.func, seconds, args, kwargs)
+    return executor.submit(contextvars.copy_context().run, node, *args, **kwargs)
+
+
+def call_guarded(
+    node: "Node", args: typing.Tuple, kwargs: typing.Dict[typing.Text, typing.Any]
+) -> typing.Any:
+    deadline = _node_deadline(node)
+    token = _deadline.set(deadline)
+    try:
+        attempt = 1
+        while True:
+            _check(node, deadline)
+            try:
+                return _attempt(node, args, kwargs, deadline)
+            except Exception as e:
+                if node.retry is None or not node.retry.should_retry(e, attempt):
+                    raise
+                delay = node.retry.delay(attempt)
+                if deadline is not None and time.monotonic() + delay >= deadline:
+                    raise
+                time.sleep(delay)
+                attempt += 1
+    finally:
+        _deadline.reset(token)
+
+
+def _attempt(node: "Node", args, kwargs, deadline: typing.Optional[float]):
+    if deadline is None and node.hedge_after is None:
+        return node._call(args, kwargs)
+    executor = resolve_executor(node.executor) or get_guard_pool()
+    hedge_at = None
+    if node.hedge_after is not None:
+        hedge_at = time.monotonic() + node.hedge_after
+    pending = {_submit(node, executor, args, kwargs, deadline)}
+    error: typing.Optional[BaseException] = None
+    try:
+        while True:
+            now = time.monotonic()
+            waits = [t - now for t in (deadline, hedge_at) if t is not None]
+            done, pending = wait(
+                pending,
+                timeout=max(0.0, min(waits)) if waits else None,
+                return_when=FIRST_COMPLETED,
+            )
+            for future in done:
+                if future.exception() is None:
+                    return future.result()
+                error = error or future.exception()
+            if not pending and (hedge_at is None or error is not None):
+                # A fast failure is not hedged; retries handle errors.
+                node._raise_executor_error(executor, error, args, kwargs)
+                raise error
+            now = time.monotonic()
+            if hedge_at is not None and now >= hedge_at:
+                # The original call is slow: race a duplicate against it.
+                hedge_at = None
+                pending.add(_submit(node, executor, args, kwargs, deadline))
+            elif deadline is not None and now >= deadline:
+                raise DeadlineExceeded(node.name, node.timeout)
+    finally:
+        # Losers and stragglers are abandoned; queued ones never start.
+        for future in pending:
+            future.cancel()
+
+
+async def acall_guarded(
+    node: "Node", args: typing.Tuple, kwargs: typing.Dict[typing.Text, typing.Any]
+) -> typing.Any:
+    deadline = _node_deadline(node)
+    token = _deadline.set(deadline)
+    try:
+        attempt = 1
+        while True:
+            _check(node, deadline)
+            try:
+                return await _aattempt(node, args, kwargs, deadline)
+            except Exception as e:
+                if node.retry is None or not node.retry.should_retry(e, attempt):
+                    raise
+                delay = node.retry.delay(attempt)
+                if deadline is not None and time.monotonic() + delay >= deadline:
+                    raise
+                await asyncio.sleep(delay)
+                attempt += 1
+    finally:
+        _deadline.reset(token)
+
+
+async def _aattempt(node: "Node", args, kwargs, deadline: typing.Optional[float]):
+    if deadline is None and node.hedge_after is None:
+        return await node._acall(args, kwargs)
+    loop = asyncio.get_running_loop()
+
+    def start() -> asyncio.Future:
+        if node.executor is None and asyncio.iscoroutinefunction(node.func):
+            return asyncio.ensure_future(node._acall(args, kwargs))
+        # Synchronous work must leave the loop to be abandoned on time.
+        executor = resolve_executor(node.executor) or get_guard_pool()
+        return asyncio.wrap_future(
+            _submit(node, executor, args, kwargs, deadline), loop=loop
+        )
+
+    hedge_at = None
+    if node.hedge_after is not None:
+        hedge_at = time.monotonic() + node.hedge_after
+    pending = {start()}
+    error: typing.Optional[BaseException] = None
+    try:
+        while True:
+            now = time.monotonic()
+            waits = [t - now for t in (deadline, hedge_at) if t is not None]
+            done, pending = await asyncio.wait(
+                pending,
+                timeout=max(0.0, min(waits)) if waits else None,
+                return_when=asyncio.FIRST_COMPLETED,
+            )
+            for future in done:
+                if future.exception() is None:
+                    value = future.result()
+                    if asyncio.iscoroutine(value):
+                        value = await value
+                    return value
+                error = error or future.exception()
+            if not pending and (hedge_at is None or error is not None):
+                raise error
+            now = time.monotonic()
+            if hedge_at is not None and now >= hedge_at:
+                hedge_at = None
+                pending.add(start())
+            elif deadline is not None and now >= deadline:
+                raise DeadlineExceeded(node.name, node.timeout)
+    finally:
+        for future in pending:
+            future.cancel()
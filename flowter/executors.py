@@ -0,0 +1,144 @@
+import os
+import pickle
+import sys
+import threading
+import typing
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+ExecutorSpec = typing.Union[typing.Text, Executor]
+
+_lock = threading.Lock()
+_thread_pool: typing.Optional[ThreadPoolExecutor] = None
+_process_pool: typing.Optional[ProcessPoolExecutor] = None
+# Worker count the shared process pool was created with.
+_process_pool_size = 0
+
+
+def get_thread_pool() -> ThreadPoolExecutor:
+    global _thread_pool
+    if _thread_pool is None:
+        with _lock:
+            if _thread_pool is None:
+                _thread_pool = ThreadPoolExecutor(thread_name_prefix="flowter")
+    return _thread_pool
+
+
+def get_process_pool(max_workers: typing.Optional[int] = None) -> ProcessPoolExecutor:
+    pool = _process_pool
+    if pool is not None and max_workers is None:
+        return pool
+    return _get_process_pool(max_workers)[0]
+
+
+def warm_up_process_pool(
+    max_workers: typing.Optional[int] = None,
+) -> ProcessPoolExecutor:
+    pool, size = _get_process_pool(max_workers)
+    # Workers are spawned on demand, so keep them all busy once to start them.
+    for future in [pool.submit(_noop) for _ in range(size)]:
+        future.result()
+    return pool
+
+
+def _get_process_pool(
+    max_workers: typing.Optional[int],
+) -> typing.Tuple[ProcessPoolExecutor, int]:
+    global _process_pool, _process_pool_size
+    if max_workers is not None and max_workers < 1:
+        raise ValueError(f"max_workers must be positive, got: {max_workers}")
+    with _lock:
+        if _process_pool is None:
+            _process_pool_size = max_workers or _default_process_workers()
+            _process_pool = ProcessPoolExecutor(max_workers=_process_pool_size)
+        elif max_workers is not None and max_workers != _process_pool_size:
+            raise ValueError(
+                f"The shared process pool already runs {_process_pool_size} "
+                + f"workers, cannot resize it to {max_workers}. Call "
+                + "shutdown_process_pool() first."
+            )
+        return (_process_pool, _process_pool_size)
+
+
+def _default_process_workers() -> int:
+    # Mirrors ProcessPoolExecutor's own default, including the Windows cap.
+    count = getattr(os, "process_cpu_count", os.cpu_count)() or 1
+    return min(count, 61) if sys.platform == "win32" else count
+
+
+def shutdown_process_pool(wait: bool = True):
+    global _process_pool
+    with _lock:
+        pool, _process_pool = _process_pool, None
+    if pool is not None:
+        pool.shutdown(wait=wait)
+
+
+def discard_broken_process_pool(pool: Executor):
+    global _process_pool
+    with _lock:
+        if _process_pool is pool:
+            _process_pool = None
+
+
+def validate_executor(
+    spec: typing.Optional[ExecutorSpec],
+) -> typing.Optional[ExecutorSpec]:
+    if spec is None or isinstance(spec, Executor) or spec in ("thread", "process"):
+        return spec
+    raise ValueError(
+        f"Invalid executor: '{spec}'. Executor must be None, 'thread', 'process' "
+        + "or a concurrent.futures.Executor instance."
+    )
+
+
+def is_process_executor(spec: typing.Optional[ExecutorSpec]) -> bool:
+    return spec == "process" or isinstance(spec, ProcessPoolExecutor)
+
+
+def resolve_executor(spec: typing.Optional[ExecutorSpec]) -> typing.Optional[Executor]:
+    spec = validate_executor(spec)
+    if spec == "thread":
+        return get_thread_pool()
+    if spec == "process":
+        return get_process_pool()
+    return spec
+
+
+def explain_process_error(
+    exc: BaseException,
+    name: typing.Text,
+    func: typing.Callable,
+    args: typing.Tuple[typing.Any, ...],
+    kwargs: typing.Dict[typing.Text, typing.Any],
+) -> typing.Optional[Exception]:
+    if isinstance(exc, BrokenProcessPool):
+        return RuntimeError(
+            f"The process pool running node '{name}' broke, a worker probably "
+            + "died abruptly. The pool will be recreated on the next call."
+        )
+    if not isinstance(exc, pickle.PicklingError) and not (
+        isinstance(exc, (AttributeError, TypeError)) and "pickle" in str(exc)
+    ):
+        return None
+
+    candidates = [("function", func)]
+    candidates.extend((f"positional argument {i}", v) for i, v in enumerate(args))
+    candidates.extend((f"keyword argument '{k}'", v) for k, v in kwargs.items())
+    for label, value in candidates:
+        try:
+            pickle.dumps(value)
+        except Exception as e:
+            return TypeError(
+                f"Node '{name}' cannot run in a process pool: its {label} "
+                + f"({type(value).__name__}) is not picklable: {e}. Process "
+                + "nodes need module-level functions and picklable arguments."
+            )
+    return TypeError(
+        f"Node '{name}' cannot run in a process pool: its return value "
+        + f"could not be pickled: {exc}"
+    )
+
+
+def _noop() -> None:
+    return None
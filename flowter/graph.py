@@ -0,0 +1,147 @@
+import typing
+
+if typing.TYPE_CHECKING:
+    from flowter import Flow, Node
+
+
+class Graph:
+    def __init__(self, flow: "Flow"):
+        self.flow_name = flow.name
+        self.nodes: typing.Dict[typing.Text, "Node"] = dict(flow.node_pool)
+        self.by_name: typing.Dict[typing.Text, typing.List["Node"]] = {}
+        self.predecessors: typing.Dict[typing.Text, typing.List["Node"]] = {}
+        self.edge_count = 0
+
+        # Each node's version as its edges were read, see Flow.graph.
+        self.watched: typing.List[typing.Tuple["Node", int]] = []
+
+        # Edges live on the nodes themselves, so walk them to also pick up
+        # nodes that were linked with Node.add_next instead of Flow.add_node.
+        pending = list(self.nodes.values())
+        if flow.start_node.id not in self.nodes:
+            pending.append(flow.start_node)
+        while pending:
+            node = pending.pop()
+            self.nodes.setdefault(node.id, node)
+            self.watched.append((node, node._version))
+            for next_node in node.next_ or ():
+                if next_node.id not in self.nodes:
+                    self.nodes[next_node.id] = next_node
+                    pending.append(next_node)
+
+        for node in self.nodes.values():
+            self.by_name.setdefault(node.name, []).append(node)
+            self.predecessors.setdefault(node.id, [])
+            for next_node in node.next_ or ():
+                self.predecessors.setdefault(next_node.id, []).append(node)
+                self.edge_count += 1
+
+        self._topological_order: typing.Optional[typing.List["Node"]] = None
+        self._cycle: typing.Optional[typing.List["Node"]] = None
+        self._cycle_checked = False
+
+    def __repr__(self) -> typing.Text:
+        return (
+            f"<Graph flow={self.flow_name}, nodes={len(self.nodes)}, "
+            + f"edges={self.edge_count}>"
+        )
+
+    def __len__(self) -> int:
+        return len(self.nodes)
+
+    def __contains__(self, node: "Node") -> bool:
+        return node.id in self.nodes
+
+    def edges(self) -> typing.Iterator[typing.Tuple["Node", "Node"]]:
+        for node in self.nodes.values():
+            for next_node in node.next_ or ():
+                yield (node, next_node)
+
+    def successors(self, node: "Node") -> typing.List["Node"]:
+        return list(node.next_ or ())
+
+    def get_predecessors(self, node: "Node") -> typing.List["Node"]:
+        return list(self.predecessors.get(node.id, ()))
+
+    def find(self, name: typing.Text) -> "Node":
+        nodes = self.by_name.get(name)
+        if not nodes:
+            raise KeyError(f"No node named '{name}' in flow '{self.flow_name}'.")
+        if len(nodes) > 1:
+            raise ValueError(
+                f"Node name '{name}' is ambiguous in flow '{self.flow_name}', "
+                + f"{len(nodes)} nodes share it."
+            )
+        return nodes[0]
+
+    def reachable(self, source: "Node") -> typing.List["Node"]:
+        # Depth-first, following successors in routing order.
+        seen = {source.id}
+        order = []
+        pending = [source]
+        while pending:
+            node = pending.pop()
+            order.append(node)
+            for next_node in reversed(node.next_ or ()):
+                if next_node.id not in seen:
+                    seen.add(next_node.id)
+                    pending.append(next_node)
+        return order
+
+    def find_cycle(self) -> typing.Optional[typing.List["Node"]]:
+        if self._cycle_checked:
+            return self._cycle
+        white, grey, black = 0, 1, 2
+        color = {node_id: white for node_id in self.nodes}
+        for root in self.nodes.values():
+            if color[root.id] != white:
+                continue
+            stack = [(root, iter(root.next_ or ()))]
+            path = [root]
+            color[root.id] = grey
+            while stack:
+                node, children = stack[-1]
+                for child in children:
+                    if color[child.id] == grey:
+                        start = next(i for i, n in enumerate(path) if n.id == child.id)
+                        self._cycle = path[start:] + [child]
+                        self._cycle_checked = True
+                        return self._cycle
+                    if color[child.id] == white:
+                        color[child.id] = grey
+                        stack.append((child, iter(child.next_ or ())))
+                        path.append(child)
+                        break
+                else:
+                    color[node.id] = black
+                    stack.pop()
+                    path.pop()
+        self._cycle_checked = True
+        return None
+
+    def has_cycle(self) -> bool:
+        return self.find_cycle() is not None
+
+    def topological_order(self) -> typing.List["Node"]:
+        if self._topological_order is not None:
+            return self._topological_order
+        in_degree = {
+            node_id: len(preds) for node_id, preds in self.predecessors.items()
+        }
+        ready = [node for node in self.nodes.values() if not in_degree[node.id]]
+        order = []
+        while ready:
+            node = ready.pop()
+            order.append(node)
+            for next_node in reversed(node.next_ or ()):
+                in_degree[next_node.id] -= 1
+                if not in_degree[next_node.id]:
+                    ready.append(next_node)
+        if len(order) != len(self.nodes):
+            cycle = self.find_cycle() or []
+            raise ValueError(
+                f"Flow '{self.flow_name}' has a cycle and no topological order: "
+                + " -> ".join(node.name for node in cycle)
+            )
+        self._topological_order = order
+        return order
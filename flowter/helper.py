@@ -1,13 +1,39 @@
+import functools
 import inspect
 import keyword
 import random
 import re
+import sqlite3
 import string
+import threading
 import typing
+import weakref
 from types import MappingProxyType
 
 if typing.TYPE_CHECKING:
     from flowter import Flow, Node
+    from flowter.profiling import ExecutionStats
+
+_POSITIONAL_ONLY = 0
+_POSITIONAL_OR_KEYWORD = 1
+_VAR_POSITIONAL = 2
+_KEYWORD_ONLY = 3
+_VAR_KEYWORD = 4
+# Parameters filled from leased resource instances, see flowter.resources.
+_RESOURCE_POSITIONAL = 5
+_RESOURCE_KEYWORD = 6
+_PARAM_KINDS = {
+    inspect.Parameter.POSITIONAL_ONLY: _POSITIONAL_ONLY,
+    inspect.Parameter.POSITIONAL_OR_KEYWORD: _POSITIONAL_OR_KEYWORD,
+    inspect.Parameter.VAR_POSITIONAL: _VAR_POSITIONAL,
+    inspect.Parameter.KEYWORD_ONLY: _KEYWORD_ONLY,
+    inspect.Parameter.VAR_KEYWORD: _VAR_KEYWORD,
+}
+_NAME_PATTERN = re.compile(r"^[a-zA-Z0-9\-_/:]+$")
+# Signatures are shared by every node wrapping the same function object.
+_SIGNATURES: "weakref.WeakKeyDictionary[typing.Callable, inspect.Signature]" = (
+    weakref.WeakKeyDictionary()
+)
 
 
 def str_or_none(s: typing.Text) -> typing.Optional[typing.Text]:
@@ -18,6 +44,20 @@ def str_or_none(s: typing.Text) -> typing.Optional[typing.Text]:
     return None
 
 
+def noop(*args, **kwargs) -> None:
+    return None
+
+
+def local_connection(
+    local: threading.local, path: typing.Text, **options
+) -> sqlite3.Connection:
+    # sqlite3 connections may not be shared across threads.
+    conn = getattr(local, "conn", None)
+    if conn is None:
+        conn = local.conn = sqlite3.connect(path, **options)
+    return conn
+
+
 def rand_str(length: int = 10) -> typing.Text:
     return "".join(
         random.choice(string.ascii_letters + string.digits) for _ in range(length)
@@ -25,7 +65,7 @@ def rand_str(length: int = 10) -> typing.Text:
 
 
 def validate_name(s: typing.Text) -> typing.Text:
-    if re.match(r"^[a-zA-Z0-9\-_/:]+$", s):
+    if _NAME_PATTERN.match(s):
         return s
     raise ValueError(
         f"Invalid name: '{s}'. Name must only contain alphanumeric "
@@ -33,6 +73,25 @@ def validate_name(s: typing.Text) -> typing.Text:
     )
 
 
+@functools.lru_cache(maxsize=4096)
+def validate_name_prefix(s: typing.Text) -> typing.Text:
+    return validate_name(s)
+
+
+def signature_of(func: typing.Callable) -> inspect.Signature:
+    try:
+        return _SIGNATURES[func]
+    except (KeyError, TypeError):
+        pass
+    signature = inspect.signature(func)
+    try:
+        _SIGNATURES[func] = signature
+    except TypeError:
+        # Not weak-referenceable or not hashable, so it cannot be shared.
+        pass
+    return signature
+
+
 def validate_params_name(
     name: typing.Text,
     replace_hyphen: typing.Optional[typing.Text] = None,
@@ -128,6 +187,134 @@ def collect_params(
     return (tuple(collected_args), collected_kwargs)
 
 
+def compile_params(
+    signature_parameters: MappingProxyType[typing.Text, "inspect.Parameter"],
+) -> typing.Callable[
+    [
+        typing.Tuple[typing.Any, ...],
+        typing.Optional[typing.Dict[typing.Text, typing.Any]],
+        typing.Dict[typing.Text, typing.Any],
+    ],
+    typing.Tuple[typing.Tuple[typing.Any, ...], typing.Dict[typing.Text, typing.Any]],
+]:
+    """Precompute the binding plan that `collect_params` derives on every call.
+
+    The returned binder takes ``(args, kwargs, extra_kwargs)`` and produces the
+    same ``(args, kwargs)`` pair as ``collect_params(params, *args,
+    kwargs=kwargs, **extra_kwargs)``.
+    """
+
+    return compile_param_specs(param_specs(signature_parameters))
+
+
+def param_specs(
+    signature_parameters: MappingProxyType[typing.Text, "inspect.Parameter"],
+) -> typing.List[typing.Tuple[int, typing.Text, bool, typing.Any]]:
+    specs = []
+    for param_name, param_meta in signature_parameters.items():
+        if param_meta.kind not in _PARAM_KINDS:
+            raise TypeError(f"Unsupported parameter type: '{param_meta.kind}'")
+        specs.append(
+            (
+                _PARAM_KINDS[param_meta.kind],
+                param_name,
+                param_meta.default is not inspect.Parameter.empty,
+                param_meta.default,
+            )
+        )
+    return specs
+
+
+def compile_param_specs(
+    param_specs: typing.Iterable[typing.Sequence[typing.Any]],
+    resources: typing.Collection[typing.Text] = (),
+) -> typing.Callable[
+    [
+        typing.Tuple[typing.Any, ...],
+        typing.Optional[typing.Dict[typing.Text, typing.Any]],
+        typing.Dict[typing.Text, typing.Any],
+    ],
+    typing.Tuple[typing.Tuple[typing.Any, ...], typing.Dict[typing.Text, typing.Any]],
+]:
+    specs = []
+    visited_names: typing.List[typing.Text] = []
+    for kind, param_name, has_default, default in param_specs:
+        if param_name in resources and kind != _VAR_KEYWORD:
+            # Instances arrive through extra_kwargs, ahead of result keys.
+            kind = _RESOURCE_KEYWORD if kind == _KEYWORD_ONLY else _RESOURCE_POSITIONAL
+        specs.append((kind, param_name, has_default, default, frozenset(visited_names)))
+        visited_names.append(param_name)
+
+    if not specs:
+
+        def bind_nothing(args, kwargs, extra_kwargs):
+            return ((), {})
+
+        return bind_nothing
+
+    specs = tuple(specs)
+
+    def bind(args, kwargs, extra_kwargs):
+        collected_args = []
+        collected_kwargs = {}
+        args_idx = 0
+        kwargs = kwargs or {}
+
+        for kind, param_name, has_default, default, visited in specs:
+            if kind == _POSITIONAL_OR_KEYWORD:
+                if param_name in kwargs:
+                    collected_args.append(kwargs[param_name])
+                elif param_name in extra_kwargs:
+                    collected_args.append(extra_kwargs[param_name])
+                elif args_idx < len(args):
+                    collected_args.append(args[args_idx])
+                    args_idx += 1
+                elif has_default:
+                    collected_kwargs[param_name] = default
+                else:
+                    raise TypeError(
+                        f"Missing required positional argument: '{param_name}'"
+                    )
+
+            elif kind == _VAR_POSITIONAL:
+                collected_args.extend(args[args_idx:])
+                args_idx = len(args)
+
+            elif kind == _KEYWORD_ONLY:
+                if param_name in kwargs:
+                    collected_kwargs[param_name] = kwargs[param_name]
+                elif has_default:
+                    collected_kwargs[param_name] = default
+                elif param_name in extra_kwargs:
+                    collected_kwargs[param_name] = extra_kwargs[param_name]
+                else:
+                    raise TypeError(
+                        f"Missing required keyword argument: '{param_name}'"
+                    )
+
+            elif kind == _VAR_KEYWORD:
+                for k, v in kwargs.items():
+                    if k not in collected_kwargs and k not in visited:
+                        collected_kwargs[k] = v
+                for k, v in extra_kwargs.items():
+                    if k not in collected_kwargs and k not in visited:
+                        collected_kwargs[k] = v
+
+            elif kind == _RESOURCE_POSITIONAL:
+                collected_args.append(extra_kwargs[param_name])
+
+            elif kind == _RESOURCE_KEYWORD:
+                collected_kwargs[param_name] = extra_kwargs[param_name]
+
+            else:
+                collected_args.append(args[args_idx])
+                args_idx += 1
+
+        return (tuple(collected_args), collected_kwargs)
+
+    return bind
+
+
 def able_to_dict(data: typing.Any) -> bool:
     if isinstance(data, typing.Dict):
         return True
@@ -141,26 +328,133 @@ def able_to_dict(data: typing.Any) -> bool:
     return True
 
 
+def switch_labels(node: "Node") -> typing.Dict[typing.Text, typing.Text]:
+    cases = getattr(node, "cases", None)
+    if cases is None:
+        return {}
+    keys: typing.Dict[typing.Text, typing.List[typing.Text]] = {}
+    for key, case_node in cases.items():
+        keys.setdefault(case_node.id, []).append(str(key))
+    if node.default is not None:
+        keys.setdefault(node.default.id, []).append("default")
+    return {
+        node_id: ", ".join(k.replace("\n", " ").replace(":", "&#58;") for k in ks)
+        for node_id, ks in keys.items()
+    }
+
+
+# Heat levels by share of the busiest node's total time, coolest first.
+_HEAT_STYLES = (
+    "fill:#fff5cc,stroke:#e6b800,color:#000",
+    "fill:#ffd699,stroke:#e67300,color:#000",
+    "fill:#ff9966,stroke:#cc3300,color:#000",
+    "fill:#e6452e,stroke:#991f00,color:#fff",
+)
+_DEAD_STYLE = "fill:#eeeeee,stroke:#999999,stroke-dasharray:4 4,color:#777"
+
+
 def flow_to_mermaid(
-    flow: "Flow", title: typing.Optional[typing.Text] = None, direction_lr: bool = False
+    flow: "Flow",
+    title: typing.Optional[typing.Text] = None,
+    direction_lr: bool = False,
+    stats: typing.Optional["ExecutionStats"] = None,
 ) -> typing.Text:
-    def node_to_mermaid(node: "Node") -> typing.Text:
-        node_conn = f"{node.id.replace('-', '_')} : {node.name}\n"
-        if node.next_:
-            for next_node in node.next_:
-                node_conn += (
-                    f"{node.id.replace('-', '_')} --> "
-                    + f"{next_node.id.replace('-', '_')}\n"
-                )
-        return node_conn.strip()
-
-    mermaid_md = f"---\ntitle: {title if title else flow.name}\n---\n"
-    mermaid_md += "stateDiagram-v2\n"
+    # Lines are collected and joined once, which keeps rendering linear on
+    # graphs with tens of thousands of nodes.
+    lines = ["---", f"title: {title if title else flow.name}", "---"]
+    lines.append("stateDiagram-v2")
     if direction_lr:
-        mermaid_md += "direction LR\n"
+        lines.append("direction LR")
+
+    nodes = flow.graph.nodes
+    ids = {node_id: node_id.replace("-", "_") for node_id in nodes}
+    classes: typing.Dict[typing.Text, typing.List[typing.Text]] = {}
+    busiest = max((t.total_ns for t in stats.nodes.values()), default=0) if stats else 0
+    for node in nodes.values():
+        mermaid_id = ids[node.id]
+        if stats is None:
+            lines.append(f"{mermaid_id} : {node.name}")
+        else:
+            lines.append(f"{mermaid_id} : {node.name}{_mermaid_stats(stats, node)}")
+            heat = _mermaid_heat(stats, node, busiest)
+            if heat is not None:
+                classes.setdefault(heat, []).append(mermaid_id)
+        if not node.next_:
+            continue
+        labels = switch_labels(node)
+        for next_node in node.next_:
+            target = ids.get(next_node.id)
+            if target is None:
+                target = next_node.id.replace("-", "_")
+            label = labels.get(next_node.id)
+            if stats is not None:
+                label = _mermaid_edge(stats, node, next_node, label)
+            if label:
+                lines.append(f"{mermaid_id} --> {target} : {label}")
+            else:
+                lines.append(f"{mermaid_id} --> {target}")
+
+    if classes:
+        for level, style in enumerate(_HEAT_STYLES, 1):
+            lines.append(f"classDef heat{level} {style}")
+        lines.append(f"classDef dead {_DEAD_STYLE}")
+        for name, members in sorted(classes.items()):
+            lines.append(f"class {', '.join(members)} {name}")
+
+    return "\n".join(lines)
+
+
+def _mermaid_stats(stats: "ExecutionStats", node: "Node") -> typing.Text:
+    condition = stats.conditions.get(node.id)
+    if condition is not None:
+        evaluated, taken = condition
+        return f" (taken {taken}/{evaluated})"
+    timing = stats.nodes.get(node.id)
+    if timing is None or not timing.calls:
+        return " (never ran)" if stats.runs else ""
+    return (
+        f" ({timing.calls} calls, mean {format_ns(timing.mean_ns)}, "
+        + f"p95 {format_ns(timing.percentile_ns(0.95))})"
+    )
+
+
+def _mermaid_heat(
+    stats: "ExecutionStats", node: "Node", busiest: int
+) -> typing.Optional[typing.Text]:
+    if not stats.runs:
+        return None
+    condition = stats.conditions.get(node.id)
+    if condition is not None:
+        # A condition that never held marks a dead branch.
+        return "dead" if not condition[1] else None
+    timing = stats.nodes.get(node.id)
+    if timing is None or not timing.calls:
+        return "dead"
+    if not busiest:
+        return None
+    level = -(-timing.total_ns * len(_HEAT_STYLES) // busiest)
+    return f"heat{max(1, min(level, len(_HEAT_STYLES)))}"
+
+
+def _mermaid_edge(
+    stats: "ExecutionStats",
+    node: "Node",
+    next_node: "Node",
+    label: typing.Optional[typing.Text],
+) -> typing.Optional[typing.Text]:
+    condition = stats.conditions.get(next_node.id)
+    if condition is not None:
+        evaluated, taken = condition
+        share = f"{taken / evaluated:.0%}" if evaluated else "0%"
+        return f"{label} {share}" if label else share
+    count = stats.switches.get((node.id, next_node.id))
+    if count is not None:
+        return f"{label} {count}x" if label else f"{count}x"
+    return label
 
-    for node in flow.node_pool.values():
-        node_conns = node_to_mermaid(node).strip()
-        mermaid_md += f"{node_conns}\n" if node_conns else ""
 
-    return mermaid_md.strip()
+def format_ns(ns: float) -> typing.Text:
+    for unit, scale in (("s", 1e9), ("ms", 1e6), ("us", 1e3)):
+        if ns >= scale:
+            return f"{ns / scale:.2f} {unit}"
+    return f"{ns:.0f} ns"
@@ -0,0 +1,300 @@
+import mmap
+import os
+import tempfile
+import threading
+import typing
+import uuid
+import weakref
+from multiprocessing import shared_memory
+
+BACKEND_SHM = "shm"
+BACKEND_MMAP = "mmap"
+
+# Segments created in this process, so local consumers skip re-attaching.
+_local_segments: typing.Dict[typing.Text, "_Segment"] = {}
+_local_lock = threading.Lock()
+
+
+class PayloadHandle:
+    __slots__ = ("backend", "name", "size", "format", "shape", "__weakref__")
+
+    def __init__(
+        self,
+        backend: typing.Text,
+        name: typing.Text,
+        size: int,
+        format: typing.Text = "B",
+        shape: typing.Optional[typing.Tuple[int, ...]] = None,
+    ):
+        self.backend = backend
+        self.name = name
+        self.size = size
+        self.format = format
+        self.shape = shape
+
+    def __repr__(self) -> typing.Text:
+        return (
+            f"<PayloadHandle backend={self.backend}, name={self.name}, "
+            + f"size={self.size}>"
+        )
+
+    def __getstate__(self):
+        return (self.backend, self.name, self.size, self.format, self.shape)
+
+    def __setstate__(self, state):
+        self.backend, self.name, self.size, self.format, self.shape = state
+
+    def resolve(self) -> memoryview:
+        with _local_lock:
+            segment = _local_segments.get(self.name)
+        if segment is None:
+            raise LookupError(
+                f"Payload '{self.name}' is not owned by this process; it was "
+                + "released or must be resolved through call_with_payloads."
+            )
+        return self._view(segment.buffer)
+
+    def _view(self, buffer: memoryview) -> memoryview:
+        view = buffer[: self.size]
+        if self.format != "B" or self.shape is not None:
+            view = view.cast(self.format, self.shape or [self.size // view.itemsize])
+        return view
+
+
+class _Segment:
+    __slots__ = ("name", "refs", "_shm", "_mmap", "_path")
+
+    def __init__(self, name: typing.Text):
+        # Only the name, so returned handles can be collected independently.
+        self.name = name
+        self.refs = 1
+        self._shm: typing.Optional[shared_memory.SharedMemory] = None
+        self._mmap: typing.Optional[mmap.mmap] = None
+        self._path: typing.Optional[typing.Text] = None
+
+    @property
+    def buffer(self) -> memoryview:
+        if self._shm is not None:
+            return self._shm.buf
+        return memoryview(self._mmap)
+
+    def close(self, unlink: bool = False):
+        # A consumer may still hold a view; the mapping then goes away with it.
+        try:
+            if self._shm is not None:
+                self._shm.close()
+            elif self._mmap is not None:
+                self._mmap.close()
+        except BufferError:
+            pass
+        if not unlink:
+            return
+        try:
+            if self._shm is not None:
+                self._shm.unlink()
+            elif self._path is not None:
+                os.remove(self._path)
+        except FileNotFoundError:
+            pass
+
+
+class PayloadStore:
+    backend: typing.Text = ""
+
+    def __init__(self, threshold: int = 1 << 20):
+        self.threshold = threshold
+        self._segments: typing.Dict[typing.Text, _Segment] = {}
+        self._runs: typing.Dict[typing.Hashable, typing.List[PayloadHandle]] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._segments)
+
+    def offload(self, value: typing.Any, run_id: typing.Hashable) -> typing.Any:
+        view = _as_buffer(value)
+        if view is None or view.nbytes < self.threshold:
+            return value
+        return self.put(view, run_id)
+
+    def put(self, view: memoryview, run_id: typing.Hashable) -> PayloadHandle:
+        handle = _handle_for(self.backend, view)
+        segment = self._create(handle, view)
+        with self._lock:
+            self._segments[handle.name] = segment
+            self._runs.setdefault(run_id, []).append(handle)
+        with _local_lock:
+            _local_segments[handle.name] = segment
+        return handle
+
+    def retain(self, handle: PayloadHandle):
+        with self._lock:
+            self._segments[handle.name].refs += 1
+
+    def release(self, handle: PayloadHandle):
+        self._release(handle.name)
+
+    def _release(self, name: typing.Text):
+        with self._lock:
+            segment = self._segments.get(name)
+            if segment is None:
+                return
+            segment.refs -= 1
+            if segment.refs > 0:
+                return
+            del self._segments[name]
+        self._free(segment)
+
+    def end_run(
+        self, run_id: typing.Hashable, result: typing.Dict[typing.Text, typing.Any]
+    ):
+        with self._lock:
+            handles = self._runs.pop(run_id, [])
+        if not handles:
+            return
+        self.keep(result)
+        for handle in handles:
+            self.release(handle)
+
+    def keep(self, result: typing.Dict[typing.Text, typing.Any]):
+        # Handles returned to the caller stay valid until they are collected.
+        for value in result.values():
+            if isinstance(value, PayloadHandle) and value.name in self._segments:
+                self.retain(value)
+                weakref.finalize(value, self._release, value.name)
+
+    def close(self):
+        with self._lock:
+            segments = list(self._segments.values())
+            self._segments.clear()
+            self._runs.clear()
+        for segment in segments:
+            self._free(segment)
+
+    def _free(self, segment: _Segment):
+        with _local_lock:
+            _local_segments.pop(segment.name, None)
+        segment.close(unlink=True)
+
+    def _create(self, handle: PayloadHandle, view: memoryview) -> _Segment:
+        raise NotImplementedError
+
+
+class SharedMemoryPayloadStore(PayloadStore):
+    backend = BACKEND_SHM
+
+    def _create(self, handle: PayloadHandle, view: memoryview) -> _Segment:
+        shm = shared_memory.SharedMemory(
+            name=handle.name, create=True, size=max(view.nbytes, 1)
+        )
+        shm.buf[: view.nbytes] = view.cast("B")
+        segment = _Segment(handle.name)
+        segment._shm = shm
+        return segment
+
+
+class MmapPayloadStore(PayloadStore):
+    backend = BACKEND_MMAP
+
+    def __init__(
+        self, directory: typing.Optional[typing.Text] = None, threshold: int = 1 << 20
+    ):
+        super().__init__(threshold=threshold)
+        if directory is None:
+            directory = "/dev/shm" if os.path.isdir("/dev/shm") else None
+            directory = directory or tempfile.gettempdir()
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _create(self, handle: PayloadHandle, view: memoryview) -> _Segment:
+        handle.name = os.path.join(self.directory, f"{handle.name}.payload")
+        size = max(view.nbytes, 1)
+        with open(handle.name, "w+b") as f:
+            f.truncate(size)
+            mapped = mmap.mmap(f.fileno(), size)
+        mapped[: view.nbytes] = view.cast("B")
+        segment = _Segment(handle.name)
+        segment._mmap = mapped
+        segment._path = handle.name
+        return segment
+
+
+def _as_buffer(value: typing.Any) -> typing.Optional[memoryview]:
+    if isinstance(value, (bytes, bytearray)):
+        return memoryview(value)
+    if isinstance(value, memoryview):
+        view = value
+    elif hasattr(type(value), "__array_interface__"):
+        # NumPy-style arrays export the buffer protocol.
+        try:
+            view = memoryview(value)
+        except TypeError:
+            return None
+    else:
+        return None
+    return view if view.c_contiguous else None
+
+
+def _handle_for(backend: typing.Text, view: memoryview) -> PayloadHandle:
+    name = f"flowter-{uuid.uuid4().hex[:16]}"
+    if view.format == "B" and view.ndim == 1:
+        return PayloadHandle(backend, name, view.nbytes)
+    return PayloadHandle(backend, name, view.nbytes, view.format, tuple(view.shape))
+
+
+def has_payloads(args: typing.Tuple, kwargs: typing.Dict[typing.Text, typing.Any]):
+    return any(isinstance(a, PayloadHandle) for a in args) or any(
+        isinstance(v, PayloadHandle) for v in kwargs.values()
+    )
+
+
+def resolve_payloads(
+    args: typing.Tuple, kwargs: typing.Dict[typing.Text, typing.Any]
+) -> typing.Tuple[typing.Tuple, typing.Dict[typing.Text, typing.Any]]:
+    if not has_payloads(args, kwargs):
+        return (args, kwargs)
+    return (
+        tuple(a.resolve() if isinstance(a, PayloadHandle) else a for a in args),
+        {
+            k: v.resolve() if isinstance(v, PayloadHandle) else v
+            for k, v in kwargs.items()
+        },
+    )
+
+
+def call_with_payloads(
+    func: typing.Callable,
+    args: typing.Tuple,
+    kwargs: typing.Dict[typing.Text, typing.Any],
+) -> typing.Any:
+    # Runs in worker processes: attach, call, then drop the attachments again.
+    attached: typing.List[_Segment] = []
+
+    def attach(value: typing.Any) -> typing.Any:
+        if not isinstance(value, PayloadHandle):
+            return value
+        with _local_lock:
+            segment = _local_segments.get(value.name)
+        if segment is None:
+            segment = _attach(value)
+            attached.append(segment)
+        return value._view(segment.buffer)
+
+    try:
+        return func(
+            *(attach(a) for a in args), **{k: attach(v) for k, v in kwargs.items()}
+        )
+    finally:
+        for segment in attached:
+            segment.close()
+
+
+def _attach(handle: PayloadHandle) -> _Segment:
+    segment = _Segment(handle.name)
+    if handle.backend == BACKEND_SHM:
+        segment._shm = shared_memory.SharedMemory(name=handle.name)
+    else:
+        with open(handle.name, "rb") as f:
+            segment._mmap = mmap.mmap(
+                f.fileno(), max(handle.size, 1), access=mmap.ACCESS_READ
+            )
+    return segment
@@ -0,0 +1,980 @@
+import asyncio
+import contextvars
+import inspect
+import itertools
+import time
+import typing
+
+from .checkpoint import (
+    STATUS_COMPLETED,
+    STATUS_FAILED,
+    CheckpointedRunError,
+    RunCheckpoint,
+)
+from .executors import is_process_executor
+from .helper import able_to_dict, compile_param_specs, compile_params, noop, param_specs
+from .payloads import resolve_payloads
+from .resources import aacquire_all, acquire_all, release_all
+from .tracing import SPAN_BIND, SPAN_CONDITION
+
+if typing.TYPE_CHECKING:
+    from flowter import Flow, Node
+    from flowter.resources import ResourcePool
+    from flowter.tracing import Hook
+
+STEP_NODE = "node"
+STEP_CONDITION = "condition"
+STEP_FORK = "fork"
+STEP_MERGE = "merge"
+STEP_SWITCH = "switch"
+STEP_SUBFLOW = "subflow"
+
+_MISSING = object()
+_run_ids = itertools.count(1)
+
+
+class RunState:
+    __slots__ = ("flow_name", "run_id", "args", "kwargs", "hooks", "checkpoint")
+
+    def __init__(
+        self,
+        flow_name: typing.Text,
+        args: typing.Tuple[typing.Any, ...],
+        kwargs: typing.Dict[typing.Text, typing.Any],
+        hooks: typing.Tuple["Hook", ...] = (),
+        checkpoint: typing.Optional[RunCheckpoint] = None,
+    ):
+        self.flow_name = flow_name
+        self.run_id: typing.Union[int, typing.Text] = (
+            checkpoint.run_id if checkpoint is not None else next(_run_ids)
+        )
+        self.args = args
+        self.kwargs = kwargs
+        self.hooks = hooks
+        self.checkpoint = checkpoint
+
+    def __repr__(self) -> typing.Text:
+        return f"<RunState flow={self.flow_name}, run_id={self.run_id}>"
+
+
+class NodeStep:
+    __slots__ = (
+        "node",
+        "bind",
+        "kind",
+        "key",
+        "merge",
+        "routes",
+        "is_condition",
+        "cases",
+        "default",
+        "live",
+        "resources",
+    )
+
+    def __init__(
+        self,
+        node: "Node",
+        bind: typing.Optional[typing.Callable] = None,
+        resources: typing.Optional[typing.Dict[typing.Text, "ResourcePool"]] = None,
+    ):
+        self.node = node
+        # Pools whose instances this node receives, in a fixed order.
+        self.resources: typing.Optional[typing.Tuple["ResourcePool", ...]] = None
+        used = _resource_params(node, resources) if resources else None
+        if used:
+            self.resources = tuple(resources[name] for name in used)
+            bind = bind or compile_param_specs(
+                param_specs(node.func_params), resources=used
+            )
+        self.bind = bind or compile_params(node.func_params)
+        self.kind: typing.Text = node.step_kind
+        self.is_condition = self.kind == STEP_CONDITION
+        # Envelope handling is decided once: store under a key or merge a dict.
+        self.merge = node.return_envelope is False
+        # None for inlined subflow boundaries, whose value is not stored.
+        self.key: typing.Optional[typing.Text] = (
+            node.return_envelope
+            if isinstance(node.return_envelope, typing.Text)
+            else node.name
+        )
+        self.routes: typing.Tuple["NodeStep", ...] = ()
+        if resources and self.key in resources:
+            raise ValueError(
+                f"Node '{node.name}' writes result key '{self.key}', which is the "
+                + "name of a resource."
+            )
+        # Only switch steps dispatch through a table, see FlowPlan.from_flow.
+        self.cases: typing.Optional[typing.Dict[typing.Hashable, "NodeStep"]] = None
+        self.default: typing.Optional["NodeStep"] = None
+        # Result keys that may still be read from here on, None when unknown.
+        self.live: typing.Optional[typing.FrozenSet[typing.Text]] = None
+
+    def __repr__(self) -> typing.Text:
+        return f"<NodeStep node={self.node.name}, routes={len(self.routes)}>"
+
+    def dispatch(self, value: typing.Any) -> typing.Optional["NodeStep"]:
+        try:
+            return self.cases.get(value, self.default)
+        except TypeError as e:
+            raise TypeError(
+                f"Switch '{self.node.name}' returned an unhashable key of type "
+                + f"{type(value).__name__}."
+            ) from e
+
+    def route(self, value: typing.Any) -> typing.Optional["NodeStep"]:
+        if self.cases is not None:
+            return self.dispatch(value)
+        for next_step in self.routes:
+            if next_step.is_condition:
+                if next_step.node(value):
+                    return next_step
+            else:
+                return next_step
+        return None
+
+    async def aroute(self, value: typing.Any) -> typing.Optional["NodeStep"]:
+        if self.cases is not None:
+            return self.dispatch(value)
+        for next_step in self.routes:
+            if next_step.is_condition:
+                if await _maybe_await(next_step.node(value)):
+                    return next_step
+            else:
+                return next_step
+        return None
+
+    def check(self, condition: "NodeStep", value: typing.Any, run: RunState) -> bool:
+        """Evaluate a condition on this step's result and notify the hooks."""
+        start = time.perf_counter_ns()
+        taken = condition.node(value)
+        self._notify(condition, taken, start, run)
+        return taken
+
+    async def acheck(
+        self, condition: "NodeStep", value: typing.Any, run: RunState
+    ) -> bool:
+        start = time.perf_counter_ns()
+        taken = await _maybe_await(condition.node(value))
+        self._notify(condition, taken, start, run)
+        return taken
+
+    def _notify(self, condition: "NodeStep", taken: bool, start: int, run: RunState):
+        end = time.perf_counter_ns()
+        for hook in run.hooks:
+            hook.on_condition(run, self.node, condition.node, taken)
+            hook.on_span(run, condition.node, SPAN_CONDITION, start, end)
+
+    def traced_route(
+        self, value: typing.Any, run: RunState
+    ) -> typing.Optional["NodeStep"]:
+        if self.cases is not None:
+            return self.traced_dispatch(value, run)
+        for next_step in self.routes:
+            if next_step.is_condition:
+                if self.check(next_step, value, run):
+                    return next_step
+            else:
+                return next_step
+        return None
+
+    async def atraced_route(
+        self, value: typing.Any, run: RunState
+    ) -> typing.Optional["NodeStep"]:
+        if self.cases is not None:
+            return self.traced_dispatch(value, run)
+        for next_step in self.routes:
+            if next_step.is_condition:
+                if await self.acheck(next_step, value, run):
+                    return next_step
+            else:
+                return next_step
+        return None
+
+    def traced_dispatch(
+        self, value: typing.Any, run: RunState
+    ) -> typing.Optional["NodeStep"]:
+        next_step = self.dispatch(value)
+        target = next_step.node if next_step is not None else None
+        for hook in run.hooks:
+            hook.on_switch(run, self.node, value, target)
+        return next_step
+
+    def fan_out(self, value: typing.Any, run: RunState) -> typing.List["NodeStep"]:
+        branches = []
+        for next_step in self.routes:
+            if next_step.is_condition and not self.check(next_step, value, run):
+                continue
+            branches.append(next_step)
+        return branches
+
+    async def afan_out(
+        self, value: typing.Any, run: RunState
+    ) -> typing.List["NodeStep"]:
+        branches = []
+        for next_step in self.routes:
+            if next_step.is_condition and not await self.acheck(next_step, value, run):
+                continue
+            branches.append(next_step)
+        return branches
+
+
+class FlowPlan:
+    dataflow = False
+
+    def __init__(
+        self,
+        flow: "Flow",
+        entry: NodeStep,
+        steps: typing.List[NodeStep],
+        analyze: bool = True,
+    ):
+        self.flow = flow
+        self.entry = entry
+        self.steps = steps
+        self.by_id: typing.Dict[typing.Text, NodeStep] = {
+            step.node.id: step for step in steps
+        }
+        self.version: int = 0
+        # The nodes this plan was built from and their versions, see
+        # Flow._is_stale.
+        self.watched: typing.Tuple[typing.Tuple["Node", int], ...] = ()
+        self.liveness: bool = flow.liveness
+        self.keep_keys: typing.FrozenSet[typing.Text] = flow.keep_keys
+        self.payloads = flow.payload_store
+        # Fork branch step id -> whether it can run off the event loop.
+        self._sync_branches: typing.Dict[int, bool] = {}
+        if self.liveness and analyze:
+            self._analyze_liveness()
+
+        self._unique_names: typing.Dict[typing.Text, typing.Optional[NodeStep]] = {}
+        for step in steps:
+            name = step.node.name
+            self._unique_names[name] = None if name in self._unique_names else step
+
+    def __repr__(self) -> typing.Text:
+        return f"<FlowPlan flow={self.flow.name}, steps={len(self.steps)}>"
+
+    @classmethod
+    def from_flow(cls, flow: "Flow") -> "FlowPlan":
+        steps: typing.Dict[typing.Text, NodeStep] = {
+            node.id: NodeStep(node, resources=flow.resources)
+            for node in flow.graph.reachable(flow.start_node)
+        }
+
+        _link_steps(steps)
+        _inline_subflows(steps, keep={flow.start_node.id})
+        return cls(flow, steps[flow.start_node.id], list(steps.values()))
+
+    def _analyze_liveness(self):
+        # Backward dataflow over the step graph: a key is live before a step if
+        # the step reads it, or if it is live afterwards and the step does not
+        # overwrite it. None stands for "every key", e.g. a **kwargs reader.
+        reads: typing.Dict[int, typing.Optional[typing.FrozenSet[typing.Text]]] = {}
+        for step in self.steps:
+            params = step.node.func_params.values()
+            if step.node.func is noop:
+                reads[id(step)] = frozenset()
+            elif any(p.kind == inspect.Parameter.VAR_KEYWORD for p in params):
+                reads[id(step)] = None
+            else:
+                reads[id(step)] = frozenset(
+                    p.name
+                    for p in params
+                    if p.kind
+                    in (
+                        inspect.Parameter.POSITIONAL_OR_KEYWORD,
+                        inspect.Parameter.KEYWORD_ONLY,
+                    )
+                )
+
+        live: typing.Dict[int, typing.Optional[typing.FrozenSet[typing.Text]]] = {
+            id(step): frozenset() for step in self.steps
+        }
+        changed = True
+        while changed:
+            changed = False
+            for step in reversed(self.steps):
+                after: typing.Optional[typing.FrozenSet[typing.Text]] = frozenset()
+                for next_step in step.routes:
+                    next_live = live[id(next_step)]
+                    if next_live is None:
+                        after = None
+                        break
+                    after = after | next_live
+                used = reads[id(step)]
+                if after is None or used is None:
+                    before = None
+                else:
+                    # Merged dict envelopes may write any key, so they kill none.
+                    written = frozenset() if step.merge else frozenset((step.key,))
+                    before = used | (after - written)
+                if before != live[id(step)]:
+                    live[id(step)] = before
+                    changed = True
+
+        for step in self.steps:
+            step_live = live[id(step)]
+            step.live = None if step_live is None else step_live | self.keep_keys
+
+    def new_run(
+        self,
+        args: typing.Tuple[typing.Any, ...],
+        kwargs: typing.Dict[typing.Text, typing.Any],
+        checkpoint: typing.Optional[RunCheckpoint] = None,
+    ) -> RunState:
+        store = self.flow.checkpoint_store
+        if checkpoint is None and store is not None:
+            checkpoint = RunCheckpoint(store, self.flow.name, args, kwargs)
+        hooks = self.flow.hooks
+        if hooks:
+            # Unsampled hooks drop out up front, so a run nobody samples takes
+            # the untraced path.
+            hooks = tuple(hook for hook in hooks if hook.sample())
+        return RunState(self.flow.name, args, kwargs, hooks, checkpoint)
+
+    def run(self, *args, **kwargs) -> typing.Dict[typing.Text, typing.Any]:
+        run = self.new_run(args, kwargs)
+        if run.checkpoint is None and not run.hooks and self.payloads is None:
+            result: typing.Dict[typing.Text, typing.Any] = {}
+            self._walk(self.entry, result, run)
+            return result
+        return self._run(self.entry, {}, run)
+
+    async def arun(self, *args, **kwargs) -> typing.Dict[typing.Text, typing.Any]:
+        run = self.new_run(args, kwargs)
+        if run.checkpoint is None and not run.hooks and self.payloads is None:
+            result: typing.Dict[typing.Text, typing.Any] = {}
+            await self._awalk(self.entry, result, run)
+            return result
+        return await self._arun(self.entry, {}, run)
+
+    def resume(self, run_id: typing.Text) -> typing.Dict[typing.Text, typing.Any]:
+        run, step, result = self._restore(run_id)
+        return self._run(step, result, run) if step is not None else result
+
+    async def aresume(
+        self, run_id: typing.Text
+    ) -> typing.Dict[typing.Text, typing.Any]:
+        run, step, result = self._restore(run_id)
+        return await self._arun(step, result, run) if step is not None else result
+
+    def _run(
+        self,
+        step: NodeStep,
+        result: typing.Dict[typing.Text, typing.Any],
+        run: RunState,
+    ) -> typing.Dict[typing.Text, typing.Any]:
+        self._start(step, result, run)
+        try:
+            self._walk(step, result, run)
+        except BaseException as e:
+            self._end(result, run, e)
+            raise
+        self._end(result, run, None)
+        return result
+
+    async def _arun(
+        self,
+        step: NodeStep,
+        result: typing.Dict[typing.Text, typing.Any],
+        run: RunState,
+    ) -> typing.Dict[typing.Text, typing.Any]:
+        self._start(step, result, run)
+        try:
+            await self._awalk(step, result, run)
+        except BaseException as e:
+            self._end(result, run, e)
+            raise
+        self._end(result, run, None)
+        return result
+
+    def _start(
+        self,
+        step: NodeStep,
+        result: typing.Dict[typing.Text, typing.Any],
+        run: RunState,
+    ):
+        if run.checkpoint is not None:
+            run.checkpoint.save(step.node, result)
+        for hook in run.hooks:
+            hook.on_run_start(run)
+
+    def _end(
+        self,
+        result: typing.Dict[typing.Text, typing.Any],
+        run: RunState,
+        exc: typing.Optional[BaseException],
+    ):
+        if run.checkpoint is not None and exc is None:
+            run.checkpoint.save(None, result, STATUS_COMPLETED)
+        if self.payloads is not None:
+            self.payloads.end_run(run.run_id, result)
+        for hook in run.hooks:
+            hook.on_run_end(run, result, exc)
+
+    def _restore(
+        self, run_id: typing.Text
+    ) -> typing.Tuple[
+        RunState, typing.Optional[NodeStep], typing.Dict[typing.Text, typing.Any]
+    ]:
+        store = self.flow.checkpoint_store
+        if store is None:
+            raise ValueError(f"Flow '{self.flow.name}' has no checkpoint store.")
+        record = store.load(run_id)
+        if record is None:
+            raise ValueError(f"No checkpoint found for run '{run_id}'.")
+        if record["status"] == STATUS_COMPLETED:
+            step = None
+        elif record["node"] in self.by_id:
+            step = self.by_id[record["node"]]
+        elif self._unique_names.get(record["node_name"]):
+            # Node ids are per process; a rebuilt flow is matched by node name.
+            step = self._unique_names[record["node_name"]]
+        else:
+            raise ValueError(
+                f"Run '{run_id}' stopped at node '{record['node_name']}', which is "
+                + f"not part of flow '{self.flow.name}'."
+            )
+        checkpoint = RunCheckpoint(
+            store, self.flow.name, record["args"], record["kwargs"], run_id=run_id
+        )
+        run = self.new_run(record["args"], record["kwargs"], checkpoint=checkpoint)
+        return (run, step, record["result"])
+
+    def _walk(
+        self,
+        step: typing.Optional[NodeStep],
+        result: typing.Dict[typing.Text, typing.Any],
+        run: RunState,
+        in_branch: bool = False,
+    ) -> typing.Optional[NodeStep]:
+        kwargs = run.kwargs
+        hooks = run.hooks
+        checkpoint = None if in_branch else run.checkpoint
+        # Inside a fork branch the walk stops at the first merge it reaches and
+        # hands it back to the fork, which runs it once all branches joined.
+        joined = False
+        try:
+            while step is not None:
+                if in_branch and not joined and step.kind == STEP_MERGE:
+                    return step
+                if step.resources is not None:
+                    value = self._invoke(step, result, run)
+                else:
+                    call_args, call_kwargs = self._collect(step, result, kwargs, run)
+                    if hooks:
+                        value = self._traced_call(step, call_args, call_kwargs, run)
+                    else:
+                        value = step.node.run(*call_args, **call_kwargs)
+                self._store(step, result, value, run)
+                if step.kind == STEP_FORK:
+                    step = self._fork(step, value, result, run)
+                    joined = True
+                else:
+                    step = step.traced_route(value, run) if hooks else step.route(value)
+                    joined = False
+                self._advance(step, result, checkpoint)
+        except Exception as e:
+            if checkpoint is None:
+                raise
+            checkpoint.save(step.node, result, STATUS_FAILED)
+            raise CheckpointedRunError(checkpoint.run_id, step.node.name, e) from e
+
+        return None
+
+    async def _awalk(
+        self,
+        step: typing.Optional[NodeStep],
+        result: typing.Dict[typing.Text, typing.Any],
+        run: RunState,
+        in_branch: bool = False,
+    ) -> typing.Optional[NodeStep]:
+        kwargs = run.kwargs
+        hooks = run.hooks
+        checkpoint = None if in_branch else run.checkpoint
+        joined = False
+        try:
+            while step is not None:
+                if in_branch and not joined and step.kind == STEP_MERGE:
+                    return step
+                if step.resources is not None:
+                    value = await self._ainvoke(step, result, run)
+                else:
+                    call_args, call_kwargs = self._collect(step, result, kwargs, run)
+                    if hooks:
+                        value = await self._atraced_call(
+                            step, call_args, call_kwargs, run
+                        )
+                    else:
+                        value = await step.node.arun(*call_args, **call_kwargs)
+                self._store(step, result, value, run)
+                if step.kind == STEP_FORK:
+                    step = await self._afork(step, value, result, run)
+                    joined = True
+                elif hooks:
+                    step = await step.atraced_route(value, run)
+                    joined = False
+                else:
+                    step = await step.aroute(value)
+                    joined = False
+                self._advance(step, result, checkpoint)
+        except Exception as e:
+            if checkpoint is None:
+                raise
+            checkpoint.save(step.node, result, STATUS_FAILED)
+            raise CheckpointedRunError(checkpoint.run_id, step.node.name, e) from e
+
+        return None
+
+    def _advance(
+        self,
+        step: typing.Optional[NodeStep],
+        result: typing.Dict[typing.Text, typing.Any],
+        checkpoint: typing.Optional[RunCheckpoint],
+    ):
+        if self.liveness:
+            self._release(step, result)
+        if checkpoint is not None and step is not None:
+            checkpoint.save(step.node, result)
+
+    def _invoke(
+        self,
+        step: NodeStep,
+        result: typing.Dict[typing.Text, typing.Any],
+        run: RunState,
+    ) -> typing.Any:
+        # Instances are leased for exactly the duration of the node call.
+        instances = acquire_all(step.resources)
+        failed = True
+        try:
+            call_args, call_kwargs = self._collect(
+                step, result, {**run.kwargs, **instances}, run
+            )
+            if run.hooks:
+                value = self._traced_call(step, call_args, call_kwargs, run)
+            else:
+                value = step.node.run(*call_args, **call_kwargs)
+            failed = False
+        finally:
+            release_all(step.resources, instances, failed)
+        return value
+
+    async def _ainvoke(
+        self,
+        step: NodeStep,
+        result: typing.Dict[typing.Text, typing.Any],
+        run: RunState,
+    ) -> typing.Any:
+        instances = await aacquire_all(step.resources)
+        failed = True
+        try:
+            call_args, call_kwargs = self._collect(
+                step, result, {**run.kwargs, **instances}, run
+            )
+            if run.hooks:
+                value = await self._atraced_call(step, call_args, call_kwargs, run)
+            else:
+                value = await step.node.arun(*call_args, **call_kwargs)
+            failed = False
+        finally:
+            release_all(step.resources, instances, failed)
+        return value
+
+    def _collect(
+        self,
+        step: NodeStep,
+        result: typing.Dict[typing.Text, typing.Any],
+        kwargs: typing.Dict[typing.Text, typing.Any],
+        run: RunState,
+    ) -> typing.Tuple[
+        typing.Tuple[typing.Any, ...], typing.Dict[typing.Text, typing.Any]
+    ]:
+        if run.hooks:
+            return self._traced_bind(step, result, kwargs, run)
+        return self._bind(step, result, kwargs, run)
+
+    def _bind(
+        self,
+        step: NodeStep,
+        result: typing.Dict[typing.Text, typing.Any],
+        kwargs: typing.Dict[typing.Text, typing.Any],
+        run: RunState,
+    ) -> typing.Tuple[
+        typing.Tuple[typing.Any, ...], typing.Dict[typing.Text, typing.Any]
+    ]:
+        call_args, call_kwargs = step.bind(run.args, result, kwargs)
+        if self.payloads is not None and not is_process_executor(step.node.executor):
+            call_args, call_kwargs = resolve_payloads(call_args, call_kwargs)
+        return (call_args, call_kwargs)
+
+    def _traced_bind(
+        self,
+        step: NodeStep,
+        result: typing.Dict[typing.Text, typing.Any],
+        kwargs: typing.Dict[typing.Text, typing.Any],
+        run: RunState,
+    ) -> typing.Tuple[
+        typing.Tuple[typing.Any, ...], typing.Dict[typing.Text, typing.Any]
+    ]:
+        start = time.perf_counter_ns()
+        call_args, call_kwargs = self._bind(step, result, kwargs, run)
+        end = time.perf_counter_ns()
+        for hook in run.hooks:
+            hook.on_span(run, step.node, SPAN_BIND, start, end)
+        return (call_args, call_kwargs)
+
+    def _traced_call(
+        self,
+        step: NodeStep,
+        call_args: typing.Tuple[typing.Any, ...],
+        call_kwargs: typing.Dict[typing.Text, typing.Any],
+        run: RunState,
+    ) -> typing.Any:
+        node = step.node
+        for hook in run.hooks:
+            hook.on_node_start(run, node, call_args, call_kwargs)
+        start = time.perf_counter_ns()
+        try:
+            value = node.run(*call_args, **call_kwargs)
+        except BaseException as e:
+            elapsed = time.perf_counter_ns() - start
+            for hook in run.hooks:
+                hook.on_node_end(run, node, None, elapsed, e)
+            raise
+        elapsed = time.perf_counter_ns() - start
+        for hook in run.hooks:
+            hook.on_node_end(run, node, value, elapsed, None)
+        return value
+
+    async def _atraced_call(
+        self,
+        step: NodeStep,
+        call_args: typing.Tuple[typing.Any, ...],
+        call_kwargs: typing.Dict[typing.Text, typing.Any],
+        run: RunState,
+    ) -> typing.Any:
+        node = step.node
+        for hook in run.hooks:
+            hook.on_node_start(run, node, call_args, call_kwargs)
+        start = time.perf_counter_ns()
+        try:
+            value = await node.arun(*call_args, **call_kwargs)
+        except BaseException as e:
+            elapsed = time.perf_counter_ns() - start
+            for hook in run.hooks:
+                hook.on_node_end(run, node, None, elapsed, e)
+            raise
+        elapsed = time.perf_counter_ns() - start
+        for hook in run.hooks:
+            hook.on_node_end(run, node, value, elapsed, None)
+        return value
+
+    def _fork(
+        self,
+        step: NodeStep,
+        value: typing.Any,
+        result: typing.Dict[typing.Text, typing.Any],
+        run: RunState,
+    ) -> typing.Optional[NodeStep]:
+        branches = step.fan_out(value, run)
+        if not branches:
+            return None
+        branch_results = [dict(result) for _ in branches]
+        pool = step.node.pool
+        futures = [
+            pool.submit(
+                contextvars.copy_context().run,
+                self._walk,
+                branch,
+                branch_result,
+                run,
+                True,
+            )
+            for branch, branch_result in zip(branches[1:], branch_results[1:])
+        ]
+        # The forking thread runs the first branch itself instead of idling.
+        joins = [self._walk(branches[0], branch_results[0], run, True)]
+        joins.extend(future.result() for future in futures)
+        return self._join(step, joins, result, branch_results)
+
+    async def _afork(
+        self,
+        step: NodeStep,
+        value: typing.Any,
+        result: typing.Dict[typing.Text, typing.Any],
+        run: RunState,
+    ) -> typing.Optional[NodeStep]:
+        branches = await step.afan_out(value, run)
+        if not branches:
+            return None
+        branch_results = [dict(result) for _ in branches]
+        loop = asyncio.get_running_loop()
+        walks = []
+        for branch, branch_result in zip(branches, branch_results):
+            sync = self._sync_branches.get(id(branch))
+            if sync is None:
+                sync = self._sync_branches[id(branch)] = _is_sync_branch(branch)
+            if sync:
+                # Synchronous branches would run one after another on the
+                # loop, so they overlap on the fork's pool as with run().
+                walks.append(
+                    loop.run_in_executor(
+                        step.node.pool,
+                        contextvars.copy_context().run,
+                        self._walk,
+                        branch,
+                        branch_result,
+                        run,
+                        True,
+                    )
+                )
+            else:
+                walks.append(self._awalk(branch, branch_result, run, True))
+        joins = await asyncio.gather(*walks)
+        return self._join(step, joins, result, branch_results)
+
+    def _join(
+        self,
+        step: NodeStep,
+        joins: typing.List[typing.Optional[NodeStep]],
+        result: typing.Dict[typing.Text, typing.Any],
+        branch_results: typing.List[typing.Dict[typing.Text, typing.Any]],
+    ) -> typing.Optional[NodeStep]:
+        merge_steps = {id(join): join for join in joins if join is not None}
+        if len(merge_steps) > 1:
+            raise ValueError(
+                f"Branches of fork '{step.node.name}' reached different merge "
+                + f"nodes: {[join.node.name for join in merge_steps.values()]}"
+            )
+        # Each branch worked on its own copy of the result dict; the entries a
+        # branch wrote are merged back in successor order, later branches win.
+        writes = [
+            {k: v for k, v in branch_result.items() if result.get(k, _MISSING) is not v}
+            for branch_result in branch_results
+        ]
+        for branch_writes in writes:
+            result.update(branch_writes)
+        return next(iter(merge_steps.values()), None)
+
+    def _release(
+        self,
+        step: typing.Optional[NodeStep],
+        result: typing.Dict[typing.Text, typing.Any],
+    ):
+        live = step.live if step is not None else self.keep_keys
+        if live is None:
+            return
+        for key in [key for key in result if key not in live]:
+            del result[key]
+
+    def _store(
+        self,
+        step: NodeStep,
+        result: typing.Dict[typing.Text, typing.Any],
+        value: typing.Any,
+        run: RunState,
+    ):
+        payloads = self.payloads
+        if step.key is None:
+            return
+        if not step.merge:
+            if payloads is not None:
+                value = payloads.offload(value, run.run_id)
+            result[step.key] = value
+            for hook in run.hooks:
+                hook.on_envelope_write(run, step.node, step.key, value)
+        elif able_to_dict(value):
+            value = dict(value)
+            if payloads is not None:
+                value = {k: payloads.offload(v, run.run_id) for k, v in value.items()}
+            result.update(value)
+            for hook in run.hooks:
+                for k, v in value.items():
+                    hook.on_envelope_write(run, step.node, k, v)
+        else:
+            self.flow.log(
+                f"Node '{step.node.name}' returned a non-dict object of type "
+                + f"{type(value).__name__} but set to return_envelope=False.",
+                level="warning",
+            )
+
+
+def _is_sync_branch(branch: NodeStep) -> bool:
+    # True when nothing up to the branch's merge needs the event loop: no
+    # coroutine functions, conditions included, and no nested subflows,
+    # which may hold async nodes of their own.
+    seen: typing.Set[typing.Tuple[int, int]] = set()
+    pending = [(branch, 0)]
+    while pending:
+        step, depth = pending.pop()
+        if (id(step), depth) in seen:
+            continue
+        seen.add((id(step), depth))
+        if step.kind == STEP_MERGE:
+            if not depth:
+                continue
+            depth -= 1
+        if step.kind == STEP_SUBFLOW or inspect.iscoroutinefunction(step.node.func):
+            return False
+        if step.kind == STEP_FORK:
+            depth += 1
+        routes = step.routes
+        if step.cases is not None:
+            routes = tuple(step.cases.values()) + (
+                (step.default,) if step.default is not None else ()
+            )
+        pending.extend((next_step, depth) for next_step in routes)
+    return True
+
+
+def _link_steps(steps: typing.Dict[typing.Text, NodeStep]):
+    for step in steps.values():
+        step.routes = tuple(steps[n.id] for n in step.node.next_ or [])
+        if step.kind == STEP_SWITCH:
+            node = step.node
+            step.cases = {k: steps[n.id] for k, n in node.cases.items()}
+            if node.default is not None:
+                step.default = steps[node.default.id]
+            # A switch only dispatches through its table, so any other edge
+            # would never be taken.
+            targets = {n.id for n in node.cases.values()}
+            if node.default is not None:
+                targets.add(node.default.id)
+            for next_node in node.next_ or ():
+                if next_node.id not in targets:
+                    raise ValueError(
+                        f"Switch '{node.name}' links to '{next_node.name}', which "
+                        + "is neither one of its cases nor its default; use "
+                        + "add_case or set_default instead."
+                    )
+
+
+async def _maybe_await(value: typing.Any) -> typing.Any:
+    if inspect.isawaitable(value):
+        return await value
+    return value
+
+
+def _resource_params(
+    node: "Node", resources: typing.Dict[typing.Text, "ResourcePool"]
+) -> typing.List[typing.Text]:
+    return sorted(
+        name
+        for name, param in node.func_params.items()
+        if name in resources and param.kind != inspect.Parameter.VAR_KEYWORD
+    )
+
+
+def is_boundary(node: "Node") -> bool:
+    # Default start and end nodes only delimit a flow and produce nothing.
+    return node.func is noop
+
+
+def _inline_subflows(
+    steps: typing.Dict[typing.Text, NodeStep],
+    keep: typing.Collection[typing.Text] = (),
+    inlined: typing.Optional[typing.Set[int]] = None,
+):
+    # Merged subflows are spliced into the surrounding step graph, so their
+    # nodes run in the parent walk without a nested run or result dict.
+    inlined = set() if inlined is None else inlined
+    for step in [s for s in steps.values() if s.kind == STEP_SUBFLOW]:
+        if step.node.id in keep:
+            continue
+        sub_steps = _subflow_steps(step, steps, inlined)
+        if sub_steps is None:
+            continue
+        sub = step.node.flow
+        after = step.routes
+        end = sub_steps.get(sub.end_node.id)
+        if end is None:
+            # Subflows often never link their end node; they finish wherever
+            # the walk runs out of routes.
+            pass
+        elif is_boundary(end.node):
+            del sub_steps[sub.end_node.id]
+            _reroute(sub_steps.values(), end, after)
+        else:
+            end.routes = after
+        if after:
+            # A nested run ends at any step without a route to take, and the
+            # parent then carries on, so those steps fall through to after.
+            for sub_step in sub_steps.values():
+                if sub_step.cases is not None:
+                    if sub_step.default is None:
+                        sub_step.default = after[0]
+                elif all(route.is_condition for route in sub_step.routes):
+                    sub_step.routes = sub_step.routes + after
+        entry = sub_steps[sub.start_node.id]
+        if (
+            is_boundary(entry.node)
+            and len(entry.routes) == 1
+            and not entry.routes[0].is_condition
+            and not any(entry in s.routes for s in sub_steps.values())
+        ):
+            del sub_steps[sub.start_node.id]
+            entry = entry.routes[0]
+        elif is_boundary(entry.node):
+            # A nested run drops its boundary keys, see SubflowCall._trim.
+            entry.key = None
+        del steps[step.node.id]
+        _reroute(steps.values(), step, (entry,))
+        steps.update(sub_steps)
+
+
+def _subflow_steps(
+    step: NodeStep,
+    steps: typing.Dict[typing.Text, NodeStep],
+    inlined: typing.Set[int],
+) -> typing.Optional[typing.Dict[typing.Text, NodeStep]]:
+    node = step.node
+    sub = node.flow
+    # Anything that wraps the call or looks at the nested result as a whole
+    # needs the real nested run.
+    if (
+        not node.inline
+        or not step.merge
+        or node.executor is not None
+        or node.cache is not None
+        or node.timeout is not None
+        or node.retry is not None
+        or node.hedge_after is not None
+        or any(next_step.is_condition for next_step in step.routes)
+        or id(sub) in inlined
+        or sub.hooks
+        or sub.checkpoint_store is not None
+        or sub.payload_store is not None
+        or sub.liveness
+        or sub.dataflow
+        or sub.timeout is not None
+        or sub.resources
+    ):
+        return None
+    inlined.add(id(sub))
+    sub_steps = {n.id: NodeStep(n) for n in sub.graph.reachable(sub.start_node)}
+    if any(s.kind == STEP_FORK for s in sub_steps.values()):
+        # Fork branches run until a merge and would walk on into the parent.
+        return None
+    _link_steps(sub_steps)
+    _inline_subflows(sub_steps, keep={sub.start_node.id}, inlined=inlined)
+    if any(node_id in steps for node_id in sub_steps):
+        return None
+    return sub_steps
+
+
+def _reroute(
+    steps: typing.Iterable[NodeStep],
+    old: NodeStep,
+    new: typing.Tuple[NodeStep, ...],
+):
+    target = new[0] if new else None
+    for step in steps:
+        if old in step.routes:
+            step.routes = tuple(
+                r for route in step.routes for r in (new if route is old else (route,))
+            )
+        if step.cases is not None:
+            step.cases = {k: target if v is old else v for k, v in step.cases.items()}
+            if step.default is old:
+                step.default = target
@@ -0,0 +1,430 @@
+import collections
+import contextvars
+import math
+import os
+import random
+import sys
+import threading
+import time
+import tracemalloc
+import typing
+
+from .tracing import SPAN_NODE, SPAN_RUN, Hook
+
+if typing.TYPE_CHECKING:
+    from flowter import Node
+    from flowter.plan import RunState
+
+
+def validate_rate(rate: float) -> float:
+    if not 0.0 <= rate <= 1.0:
+        raise ValueError(f"Invalid sample_rate: {rate}. It must be between 0 and 1.")
+    return rate
+
+
+class SamplingMixin:
+    # Shared by the profiling hooks: each run is kept with probability
+    # sample_rate, decided once in sample().
+    def __init__(self, sample_rate: float = 1.0):
+        self.sample_rate = validate_rate(sample_rate)
+        self._random = random.Random()
+
+    def sample(self) -> bool:
+        return self.sample_rate >= 1.0 or self._random.random() < self.sample_rate
+
+
+class Span(typing.NamedTuple):
+    name: typing.Text
+    kind: typing.Text
+    # Names of the runs and nodes enclosing this span, outermost first.
+    stack: typing.Tuple[typing.Text, ...]
+    start_ns: int
+    end_ns: int
+    pid: int
+    tid: int
+    run_id: typing.Optional[typing.Union[int, typing.Text]]
+    failed: bool
+
+
+class SpanRecorder(SamplingMixin, Hook):
+    def __init__(
+        self, sample_rate: float = 1.0, max_spans: typing.Optional[int] = None
+    ):
+        super().__init__(sample_rate)
+        # Appending to a deque is atomic, so runs on many threads need no lock.
+        self.spans: typing.Deque[Span] = collections.deque(maxlen=max_spans)
+        self.origin_ns = time.perf_counter_ns()
+        self._run_starts: typing.Dict[typing.Union[int, typing.Text], int] = {}
+        # A context variable rather than a thread local, so concurrent tasks on
+        # one event loop and fork branches each keep their own stack.
+        self._stack: contextvars.ContextVar[
+            typing.Tuple[typing.Text, ...]
+        ] = contextvars.ContextVar(f"flowter_spans_{id(self)}", default=())
+
+    def __repr__(self) -> typing.Text:
+        return f"<SpanRecorder sample_rate={self.sample_rate}, spans={len(self.spans)}>"
+
+    def clear(self):
+        self.spans.clear()
+
+    def record(
+        self,
+        name: typing.Text,
+        kind: typing.Text,
+        start_ns: int,
+        end_ns: int,
+        run_id: typing.Optional[typing.Union[int, typing.Text]] = None,
+        failed: bool = False,
+    ):
+        self.spans.append(
+            Span(
+                name,
+                kind,
+                self._stack.get(),
+                start_ns,
+                end_ns,
+                os.getpid(),
+                threading.get_ident(),
+                run_id,
+                failed,
+            )
+        )
+
+    def on_run_start(self, run: "RunState"):
+        stack = self._stack.get()
+        self._stack.set(stack + (run.flow_name,))
+        self._run_starts[run.run_id] = time.perf_counter_ns()
+
+    def on_run_end(self, run, result, exc):
+        end = time.perf_counter_ns()
+        start = self._run_starts.pop(run.run_id, end)
+        self._stack.set(self._stack.get()[:-1])
+        self.record(run.flow_name, SPAN_RUN, start, end, run.run_id, exc is not None)
+
+    def on_node_start(self, run, node, args, kwargs):
+        self._stack.set(self._stack.get() + (node.name,))
+
+    def on_node_end(self, run, node, value, elapsed_ns, exc):
+        end = time.perf_counter_ns()
+        self._stack.set(self._stack.get()[:-1])
+        self.record(
+            node.name, SPAN_NODE, end - elapsed_ns, end, run.run_id, exc is not None
+        )
+
+    def on_span(self, run, node: "Node", kind, start_ns, end_ns):
+        self.record(node.name, kind, start_ns, end_ns, run.run_id)
+
+    def to_chrome_trace(self) -> typing.Dict[typing.Text, typing.Any]:
+        # Complete ("X") events of the Trace Event Format, loadable in
+        # chrome://tracing and Perfetto. Timestamps are microseconds.
+        events = []
+        for span in list(self.spans):
+            args: typing.Dict[typing.Text, typing.Any] = {"run_id": span.run_id}
+            if span.failed:
+                args["failed"] = True
+            events.append(
+                {
+                    "name": span.name,
+                    "cat": span.kind,
+                    "ph": "X",
+                    "ts": (span.start_ns - self.origin_ns) / 1000,
+                    "dur": (span.end_ns - span.start_ns) / 1000,
+                    "pid": span.pid,
+                    "tid": span.tid,
+                    "args": args,
+                }
+            )
+        return {"traceEvents": events, "displayTimeUnit": "ns"}
+
+    def to_collapsed(self) -> typing.Text:
+        # One "frame;frame;frame weight" line per stack, as read by
+        # flamegraph.pl and speedscope. Weights are self time in nanoseconds.
+        totals: typing.Dict[typing.Tuple[typing.Text, ...], int] = {}
+        for span in list(self.spans):
+            if span.kind in (SPAN_RUN, SPAN_NODE):
+                frame = span.name
+            else:
+                frame = f"{span.kind}:{span.name}"
+            path = span.stack + (frame,)
+            totals[path] = totals.get(path, 0) + span.end_ns - span.start_ns
+        weights = dict(totals)
+        for path, total in totals.items():
+            if path[:-1] in weights:
+                weights[path[:-1]] -= total
+        lines = []
+        for path, weight in sorted(weights.items()):
+            if weight > 0:
+                lines.append(";".join(map(_frame, path)) + f" {weight}")
+        return "\n".join(lines)
+
+
+def _frame(name: typing.Text) -> typing.Text:
+    # Semicolons separate frames and the last space starts the weight.
+    return name.replace(";", ":").replace(" ", "_").replace("\n", "_")
+
+
+class NodeTiming:
+    __slots__ = ("calls", "errors", "total_ns", "samples")
+
+    def __init__(self, max_samples: int):
+        self.calls = 0
+        self.errors = 0
+        self.total_ns = 0
+        # The most recent durations, which percentiles are taken over.
+        self.samples: typing.Deque[int] = collections.deque(maxlen=max_samples)
+
+    def __repr__(self) -> typing.Text:
+        return f"<NodeTiming calls={self.calls}, mean_ns={self.mean_ns:.0f}>"
+
+    @property
+    def mean_ns(self) -> float:
+        return self.total_ns / self.calls if self.calls else 0.0
+
+    def percentile_ns(self, q: float) -> int:
+        if not self.samples:
+            return 0
+        ordered = sorted(self.samples)
+        return ordered[max(0, math.ceil(q * len(ordered)) - 1)]
+
+
+class ExecutionStats(SamplingMixin, Hook):
+    # Aggregates runs for flow_to_mermaid(flow, stats=...). Everything is
+    # keyed by node id, so the stats belong to the flow they were attached to.
+    def __init__(self, sample_rate: float = 1.0, max_samples: int = 1024):
+        super().__init__(sample_rate)
+        self.max_samples = max_samples
+        self.runs = 0
+        self.nodes: typing.Dict[typing.Text, NodeTiming] = {}
+        # Condition node id -> [evaluated, taken].
+        self.conditions: typing.Dict[typing.Text, typing.List[int]] = {}
+        # (switch node id, target node id) -> times dispatched.
+        self.switches: typing.Dict[typing.Tuple[typing.Text, typing.Text], int] = {}
+        self._lock = threading.Lock()
+
+    def __repr__(self) -> typing.Text:
+        return f"<ExecutionStats runs={self.runs}, nodes={len(self.nodes)}>"
+
+    def clear(self):
+        with self._lock:
+            self.runs = 0
+            self.nodes.clear()
+            self.conditions.clear()
+            self.switches.clear()
+
+    def on_run_start(self, run: "RunState"):
+        with self._lock:
+            self.runs += 1
+
+    def on_node_end(self, run, node, value, elapsed_ns, exc):
+        with self._lock:
+            timing = self.nodes.get(node.id)
+            if timing is None:
+                timing = self.nodes[node.id] = NodeTiming(self.max_samples)
+            timing.calls += 1
+            timing.total_ns += elapsed_ns
+            timing.samples.append(elapsed_ns)
+            if exc is not None:
+                timing.errors += 1
+
+    def on_condition(self, run, node, condition, taken):
+        with self._lock:
+            counts = self.conditions.get(condition.id)
+            if counts is None:
+                counts = self.conditions[condition.id] = [0, 0]
+            counts[0] += 1
+            if taken:
+                counts[1] += 1
+
+    def on_switch(self, run, node, key, target):
+        if target is None:
+            return
+        edge = (node.id, target.id)
+        with self._lock:
+            self.switches[edge] = self.switches.get(edge, 0) + 1
+
+
+def deep_sizeof(value: typing.Any, max_objects: int = 100_000) -> int:
+    # Follows containers and instance dicts; shared objects count once, and the
+    # walk gives up after max_objects so huge values stay cheap to measure.
+    seen: typing.Set[int] = set()
+    pending = [value]
+    size = 0
+    while pending and len(seen) < max_objects:
+        obj = pending.pop()
+        if id(obj) in seen:
+            continue
+        seen.add(id(obj))
+        size += sys.getsizeof(obj, 0)
+        if isinstance(obj, (str, bytes, bytearray, int, float, bool, type(None))):
+            continue
+        if isinstance(obj, dict):
+            pending.extend(obj.keys())
+            pending.extend(obj.values())
+        elif isinstance(obj, (list, tuple, set, frozenset, collections.deque)):
+            pending.extend(obj)
+        elif hasattr(obj, "__dict__") and not isinstance(obj, type):
+            pending.append(vars(obj))
+    return size
+
+
+class NodeMemory:
+    __slots__ = ("name", "calls", "retained", "peak", "result_size")
+
+    def __init__(self, name: typing.Text):
+        self.name = name
+        self.calls = 0
+        # Bytes still allocated when the node returned, summed over calls.
+        self.retained = 0
+        # Highest traced memory above the level at node start, over all calls.
+        self.peak = 0
+        # Largest value the node wrote into the result.
+        self.result_size = 0
+
+    def __repr__(self) -> typing.Text:
+        return (
+            f"<NodeMemory name={self.name}, calls={self.calls}, peak={self.peak}, "
+            + f"retained={self.retained}, result_size={self.result_size}>"
+        )
+
+
+class MemoryProfiler(SamplingMixin, Hook):
+    def __init__(
+        self,
+        sample_rate: float = 1.0,
+        frames: int = 1,
+        measure_results: bool = True,
+    ):
+        super().__init__(sample_rate)
+        self.frames = frames
+        self.measure_results = measure_results
+        self.nodes: typing.Dict[typing.Text, NodeMemory] = {}
+        # Largest size seen per result key.
+        self.value_sizes: typing.Dict[typing.Text, int] = {}
+        self.run_peak = 0
+        self._started = False
+        self._lock = threading.Lock()
+        # Each open run or node has a [start, peak] frame. reset_peak is
+        # process-wide, so a finishing frame hands its peak to its parent.
+        self._frames: contextvars.ContextVar[
+            typing.Tuple[typing.List[int], ...]
+        ] = contextvars.ContextVar(f"flowter_memory_{id(self)}", default=())
+
+    def __repr__(self) -> typing.Text:
+        return f"<MemoryProfiler nodes={len(self.nodes)}, run_peak={self.run_peak}>"
+
+    def close(self):
+        # Stops tracemalloc if this profiler started it.
+        if self._started:
+            tracemalloc.stop()
+            self._started = False
+
+    def clear(self):
+        with self._lock:
+            self.nodes.clear()
+            self.value_sizes.clear()
+            self.run_peak = 0
+
+    def on_run_start(self, run: "RunState"):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(self.frames)
+            self._started = True
+        self._push()
+
+    def on_run_end(self, run, result, exc):
+        peak = self._pop()
+        with self._lock:
+            self.run_peak = max(self.run_peak, peak)
+
+    def on_node_start(self, run, node, args, kwargs):
+        self._push()
+
+    def on_node_end(self, run, node, value, elapsed_ns, exc):
+        start = self._frames.get()[-1][0]
+        peak = self._pop()
+        retained = tracemalloc.get_traced_memory()[0] - start
+        with self._lock:
+            stats = self.nodes.get(node.name)
+            if stats is None:
+                stats = self.nodes[node.name] = NodeMemory(node.name)
+            stats.calls += 1
+            stats.retained += retained
+            stats.peak = max(stats.peak, peak)
+
+    def on_envelope_write(self, run, node, key, value):
+        if not self.measure_results:
+            return
+        size = deep_sizeof(value)
+        with self._lock:
+            stats = self.nodes.get(node.name)
+            if stats is None:
+                stats = self.nodes[node.name] = NodeMemory(node.name)
+            stats.result_size = max(stats.result_size, size)
+            self.value_sizes[key] = max(self.value_sizes.get(key, 0), size)
+
+    def ranking(self, by: typing.Text = "peak") -> typing.List[NodeMemory]:
+        if by not in NodeMemory.__slots__[1:]:
+            raise ValueError(
+                f"Invalid ranking key: '{by}'. It must be one of "
+                + f"{list(NodeMemory.__slots__[1:])}."
+            )
+        with self._lock:
+            nodes = list(self.nodes.values())
+        return sorted(nodes, key=lambda stats: getattr(stats, by), reverse=True)
+
+    def report(self, by: typing.Text = "peak", limit: int = 10) -> typing.Text:
+        rows = [("node", "calls", "peak", "retained", "result")]
+        for stats in self.ranking(by)[:limit]:
+            rows.append(
+                (
+                    stats.name,
+                    str(stats.calls),
+                    format_bytes(stats.peak),
+                    format_bytes(stats.retained),
+                    format_bytes(stats.result_size),
+                )
+            )
+        widths = [max(len(row[i]) for row in rows) for i in range(len(rows[0]))]
+        lines = [
+            "  ".join(
+                cell.ljust(width) if i == 0 else cell.rjust(width)
+                for i, (cell, width) in enumerate(zip(row, widths))
+            )
+            for row in rows
+        ]
+        lines.append(f"run peak: {format_bytes(self.run_peak)}")
+        return "\n".join(lines)
+
+    def _push(self):
+        frames = self._frames.get()
+        current, peak = tracemalloc.get_traced_memory()
+        if frames and _reset_peak is not None:
+            # The parent's peak so far would be lost by the reset below.
+            frames[-1][1] = max(frames[-1][1], peak)
+        if _reset_peak is not None:
+            _reset_peak()
+        self._frames.set(frames + ([current, current],))
+
+    def _pop(self) -> int:
+        # Returns the frame's peak above its start and folds it into the parent.
+        frames = self._frames.get()
+        frame = frames[-1]
+        current, peak = tracemalloc.get_traced_memory()
+        if _reset_peak is None:
+            # Python 3.8 cannot reset the peak, so only the end level is known.
+            peak = current
+        frame[1] = max(frame[1], peak)
+        if len(frames) > 1:
+            frames[-2][1] = max(frames[-2][1], frame[1])
+        self._frames.set(frames[:-1])
+        return frame[1] - frame[0]
+
+
+_reset_peak = getattr(tracemalloc, "reset_peak", None)
+
+
+def format_bytes(size: float) -> typing.Text:
+    for unit in ("B", "KiB", "MiB", "GiB"):
+        if abs(size) < 1024 or unit == "GiB":
+            break
+        size /= 1024
+    return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
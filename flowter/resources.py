@@ -0,0 +1,256 @@
+import asyncio
+import contextlib
+import threading
+import time
+import typing
+
+from .deadlines import remaining
+from .helper import validate_params_name
+
+_EMPTY = object()
+
+
+class ResourceTimeoutError(TimeoutError):
+    def __init__(self, name: typing.Text, timeout: float):
+        super().__init__(
+            f"Timed out after {timeout:.3f}s waiting for resource '{name}'; all "
+            + "instances are in use."
+        )
+        self.name = name
+
+
+class ResourcePool:
+    def __init__(
+        self,
+        name: typing.Text,
+        factory: typing.Callable[[], typing.Any],
+        close: typing.Optional[typing.Callable[[typing.Any], None]] = None,
+        validate: typing.Optional[typing.Callable[[typing.Any], bool]] = None,
+        reset: typing.Optional[typing.Callable[[typing.Any], None]] = None,
+        max_size: typing.Optional[int] = None,
+        acquire_timeout: typing.Optional[float] = None,
+        discard_on_error: bool = True,
+    ):
+        if max_size is not None and max_size < 1:
+            raise ValueError(f"Resource '{name}' needs max_size >= 1, got: {max_size}")
+        self.name = validate_params_name(name)
+        self.factory = factory
+        self.close_instance = close
+        self.validate = validate
+        self.reset = reset
+        self.max_size = max_size
+        self.acquire_timeout = acquire_timeout
+        self.discard_on_error = discard_on_error
+        # Most recently returned first, so warm instances are reused and the
+        # rest can go idle.
+        self._idle: typing.List[typing.Any] = []
+        self._size = 0
+        self._in_use = 0
+        self._closed = False
+        self._cond = threading.Condition()
+        self._stats = {"created": 0, "reused": 0, "discarded": 0, "waits": 0}
+
+    def __repr__(self) -> typing.Text:
+        return (
+            f"<ResourcePool name={self.name}, size={self._size}, "
+            + f"in_use={self._in_use}, max_size={self.max_size}>"
+        )
+
+    @property
+    def stats(self) -> typing.Dict[typing.Text, int]:
+        with self._cond:
+            return dict(
+                self._stats, size=self._size, in_use=self._in_use, idle=len(self._idle)
+            )
+
+    def acquire(self, timeout: typing.Optional[float] = None) -> typing.Any:
+        timeout = self._timeout(timeout)
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            instance = self._checkout(deadline, timeout)
+            if instance is _EMPTY:
+                return self._create()
+            if self.validate is None or self._is_valid(instance):
+                return instance
+
+    def try_acquire(self) -> typing.Any:
+        # Returns the instance, or None when acquiring would have to wait.
+        while True:
+            with self._cond:
+                self._check_open()
+                if self._idle:
+                    instance = self._idle.pop()
+                    self._in_use += 1
+                    self._stats["reused"] += 1
+                elif self.max_size is None or self._size < self.max_size:
+                    self._size += 1
+                    self._in_use += 1
+                    instance = _EMPTY
+                else:
+                    return None
+            if instance is _EMPTY:
+                return self._create()
+            if self.validate is None or self._is_valid(instance):
+                return instance
+
+    async def aacquire(self, timeout: typing.Optional[float] = None) -> typing.Any:
+        instance = self.try_acquire()
+        if instance is not None:
+            return instance
+        timeout = self._timeout(timeout)
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(None, self.acquire, timeout)
+        try:
+            # Shielded, so a cancelled caller leaves the blocking acquire
+            # running and can hand back what it checks out.
+            return await asyncio.shield(future)
+        except asyncio.CancelledError:
+            future.add_done_callback(self._release_abandoned)
+            raise
+
+    def _release_abandoned(self, future: "asyncio.Future"):
+        if not future.cancelled() and future.exception() is None:
+            self.release(future.result())
+
+    def release(self, instance: typing.Any, discard: bool = False):
+        if not discard and self.reset is not None:
+            try:
+                self.reset(instance)
+            except Exception:
+                discard = True
+        with self._cond:
+            self._in_use -= 1
+            if discard or self._closed:
+                self._size -= 1
+                self._stats["discarded"] += 1
+            else:
+                self._idle.append(instance)
+            self._cond.notify()
+        if discard or self._closed:
+            self._dispose(instance)
+
+    @contextlib.contextmanager
+    def lease(
+        self, timeout: typing.Optional[float] = None
+    ) -> typing.Iterator[typing.Any]:
+        instance = self.acquire(timeout)
+        try:
+            yield instance
+        except BaseException:
+            self.release(instance, discard=self.discard_on_error)
+            raise
+        self.release(instance)
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._size -= len(idle)
+            self._cond.notify_all()
+        for instance in idle:
+            self._dispose(instance)
+
+    def _timeout(self, timeout: typing.Optional[float]) -> typing.Optional[float]:
+        # Waiting for an instance counts against the caller's time budget.
+        if timeout is None:
+            timeout = self.acquire_timeout
+        budget = remaining()
+        if budget is not None and (timeout is None or budget < timeout):
+            timeout = budget
+        return timeout
+
+    def _checkout(
+        self, deadline: typing.Optional[float], timeout: typing.Optional[float]
+    ) -> typing.Any:
+        with self._cond:
+            waited = False
+            while True:
+                self._check_open()
+                if self._idle:
+                    self._in_use += 1
+                    self._stats["reused"] += 1
+                    return self._idle.pop()
+                if self.max_size is None or self._size < self.max_size:
+                    # Reserve the slot; the factory runs outside the lock.
+                    self._size += 1
+                    self._in_use += 1
+                    return _EMPTY
+                if not waited:
+                    self._stats["waits"] += 1
+                    waited = True
+                wait = None if deadline is None else deadline - time.monotonic()
+                if wait is not None and wait <= 0:
+                    raise ResourceTimeoutError(self.name, timeout)
+                self._cond.wait(wait)
+
+    def _create(self) -> typing.Any:
+        try:
+            instance = self.factory()
+        except BaseException:
+            with self._cond:
+                self._size -= 1
+                self._in_use -= 1
+                self._cond.notify()
+            raise
+        with self._cond:
+            self._stats["created"] += 1
+        return instance
+
+    def _is_valid(self, instance: typing.Any) -> bool:
+        try:
+            valid = self.validate(instance)
+        except Exception:
+            valid = False
+        if not valid:
+            self.release(instance, discard=True)
+        return valid
+
+    def _dispose(self, instance: typing.Any):
+        if self.close_instance is not None:
+            try:
+                self.close_instance(instance)
+            except Exception:
+                pass
+
+    def _check_open(self):
+        if self._closed:
+            raise RuntimeError(f"Resource '{self.name}' is closed.")
+
+
+def acquire_all(
+    resources: typing.Tuple[ResourcePool, ...],
+) -> typing.Dict[typing.Text, typing.Any]:
+    instances: typing.Dict[typing.Text, typing.Any] = {}
+    try:
+        # A fixed order keeps two nodes needing the same pools from deadlocking.
+        for resource in resources:
+            instances[resource.name] = resource.acquire()
+    except BaseException:
+        release_all(resources, instances, False)
+        raise
+    return instances
+
+
+async def aacquire_all(
+    resources: typing.Tuple[ResourcePool, ...],
+) -> typing.Dict[typing.Text, typing.Any]:
+    instances: typing.Dict[typing.Text, typing.Any] = {}
+    try:
+        for resource in resources:
+            instances[resource.name] = await resource.aacquire()
+    except BaseException:
+        release_all(resources, instances, False)
+        raise
+    return instances
+
+
+def release_all(
+    resources: typing.Tuple[ResourcePool, ...],
+    instances: typing.Dict[typing.Text, typing.Any],
+    failed: bool,
+):
+    for resource in resources:
+        if resource.name in instances:
+            resource.release(
+                instances[resource.name], discard=failed and resource.discard_on_error
+            )
@@ -0,0 +1,186 @@
+import collections
+import queue
+import threading
+import typing
+from concurrent.futures import FIRST_COMPLETED, Future, wait
+
+if typing.TYPE_CHECKING:
+    from flowter import Flow
+
+_STOP = object()
+
+
+class RunnerClosedError(RuntimeError):
+    pass
+
+
+class FlowRunner:
+    def __init__(
+        self,
+        flow: "Flow",
+        max_workers: int = 8,
+        max_queue: int = 128,
+        name: typing.Optional[typing.Text] = None,
+    ):
+        if max_workers < 1:
+            raise ValueError(f"max_workers must be positive, got: {max_workers}")
+        # queue.Queue treats maxsize=0 as unbounded, which defeats the point.
+        if max_queue < 1:
+            raise ValueError(f"max_queue must be positive, got: {max_queue}")
+        self.flow = flow
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.name = name or flow.name
+        # Compile up front so workers never race on the first compile.
+        flow.compile()
+
+        self._queue: "queue.Queue" = queue.Queue(maxsize=max_queue)
+        self._lock = threading.Lock()
+        self._closed = False
+        self._in_flight = 0
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self._workers = [
+            threading.Thread(
+                target=self._work, name=f"flowter-runner-{self.name}-{i}", daemon=True
+            )
+            for i in range(max_workers)
+        ]
+        for worker in self._workers:
+            worker.start()
+
+    def __repr__(self) -> typing.Text:
+        return (
+            f"<FlowRunner flow={self.flow.name}, queue_depth={self.queue_depth}, "
+            + f"in_flight={self.in_flight}>"
+        )
+
+    def __enter__(self) -> "FlowRunner":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.shutdown()
+
+    @property
+    def queue_depth(self) -> int:
+        return self._queue.qsize()
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    @property
+    def stats(self) -> typing.Dict[typing.Text, int]:
+        with self._lock:
+            return {
+                "queue_depth": self._queue.qsize(),
+                "in_flight": self._in_flight,
+                "submitted": self.submitted,
+                "completed": self.completed,
+                "failed": self.failed,
+                "max_workers": self.max_workers,
+                "max_queue": self.max_queue,
+            }
+
+    def submit(self, *args, **kwargs) -> Future:
+        # Blocks while the queue is full, which pushes back on the producer.
+        return self._enqueue(args, kwargs, block=True)
+
+    def try_submit(self, *args, **kwargs) -> typing.Optional[Future]:
+        try:
+            return self._enqueue(args, kwargs, block=False)
+        except queue.Full:
+            return None
+
+    def map(
+        self,
+        inputs: typing.Iterable[typing.Mapping[typing.Text, typing.Any]],
+        ordered: bool = True,
+    ) -> typing.Iterator[typing.Dict[typing.Text, typing.Any]]:
+        # Keep at most one window of inputs outstanding so long streams are not
+        # materialised; results are yielded as the window drains.
+        window = self.max_workers + self.max_queue
+        inputs = iter(inputs)
+        pending: "collections.deque[Future]" = collections.deque()
+        exhausted = False
+        while pending or not exhausted:
+            while not exhausted and len(pending) < window:
+                try:
+                    kwargs = next(inputs)
+                except StopIteration:
+                    exhausted = True
+                    break
+                pending.append(self.submit(**kwargs))
+            if not pending:
+                break
+            if ordered:
+                yield pending.popleft().result()
+            else:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    pending.remove(future)
+                for future in done:
+                    yield future.result()
+
+    def shutdown(self, wait: bool = True, cancel_pending: bool = False):
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+        if cancel_pending:
+            self._cancel_queued()
+        for _ in self._workers:
+            self._queue.put(_STOP)
+        if wait:
+            for worker in self._workers:
+                worker.join()
+            # Anything that slipped in behind the stop markers will never run.
+            self._cancel_queued()
+
+    def _cancel_queued(self):
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                return
+            if item is not _STOP:
+                item[0].cancel()
+
+    def _enqueue(
+        self,
+        args: typing.Tuple[typing.Any, ...],
+        kwargs: typing.Dict[typing.Text, typing.Any],
+        block: bool,
+    ) -> Future:
+        if self._closed:
+            raise RunnerClosedError(f"Runner for flow '{self.flow.name}' is closed.")
+        future: Future = Future()
+        self._queue.put((future, args, kwargs), block=block)
+        with self._lock:
+            self.submitted += 1
+        return future
+
+    def _work(self):
+        flow = self.flow
+        while True:
+            item = self._queue.get()
+            if item is _STOP:
+                return
+            future, args, kwargs = item
+            if not future.set_running_or_notify_cancel():
+                continue
+            with self._lock:
+                self._in_flight += 1
+            try:
+                result = flow.run(*args, **kwargs)
+            except BaseException as e:
+                with self._lock:
+                    self._in_flight -= 1
+                    self.failed += 1
+                future.set_exception(e)
+            else:
+                with self._lock:
+                    self._in_flight -= 1
+                    self.completed += 1
+                future.set_result(result)
@@ -0,0 +1,302 @@
+import gc
+import importlib
+import json
+import pickle
+import typing
+from concurrent.futures import Executor
+
+from flowter import BatchNode, Condition, Flow, Fork, Merge, Node, Subflow, Switch
+
+from .deadlines import Retry
+from .helper import compile_param_specs, param_specs
+from .plan import FlowPlan, NodeStep, _link_steps
+from .tracing import LEVELS
+
+FORMAT = "flowter/flow"
+FORMAT_VERSION = 1
+BINARY_MAGIC = b"FLOWTER\x01"
+
+# Ordered most specific first, so subclasses are not saved as their base.
+_KINDS: typing.List[typing.Tuple[typing.Text, typing.Type[Node]]] = [
+    ("subflow", Subflow),
+    ("batch", BatchNode),
+    ("switch", Switch),
+    ("fork", Fork),
+    ("merge", Merge),
+    ("condition", Condition),
+    ("node", Node),
+]
+_KIND_CLASSES = dict(_KINDS)
+_JSON_SCALARS = (str, int, float, bool, type(None))
+
+
+def func_path(func: typing.Callable) -> typing.Text:
+    module = getattr(func, "__module__", None)
+    qualname = getattr(func, "__qualname__", None)
+    if not module or not qualname or "<" in qualname:
+        raise ValueError(
+            f"Cannot serialize {func!r}: only module-level functions and class "
+            + "attributes can be referenced by import path."
+        )
+    return f"{module}:{qualname}"
+
+
+def import_path(path: typing.Text, modules: typing.Dict[typing.Text, typing.Any]):
+    module_name, _, qualname = path.partition(":")
+    target = modules.get(module_name)
+    if target is None:
+        target = modules[module_name] = importlib.import_module(module_name)
+    for part in qualname.split("."):
+        target = getattr(target, part)
+    return target
+
+
+def flow_to_dict(
+    flow: Flow, include_plan: bool = False
+) -> typing.Dict[typing.Text, typing.Any]:
+    nodes = list(flow.graph.nodes.values())
+    index = {node.id: i for i, node in enumerate(nodes)}
+    levels = {level: name for name, level in LEVELS.items()}
+    return {
+        "format": FORMAT,
+        "version": FORMAT_VERSION,
+        "name": flow.name,
+        "start": index[flow.start_node.id],
+        "end": index[flow.end_node.id],
+        "options": {
+            "stream_buffer_size": flow.stream_buffer_size,
+            "log_level": levels.get(flow.log_level, "warning"),
+            "liveness": flow.liveness,
+            "keep_keys": sorted(flow.keep_keys),
+            "timeout": flow.timeout,
+            "dataflow": flow.dataflow,
+            "dataflow_workers": flow.dataflow_workers,
+        },
+        "nodes": [_node_to_dict(node, index) for node in nodes],
+        "plan": _plan_to_dict(flow.compile(), index) if include_plan else None,
+    }
+
+
+def _node_to_dict(
+    node: Node, index: typing.Dict[typing.Text, int]
+) -> typing.Dict[typing.Text, typing.Any]:
+    if isinstance(node.executor, Executor):
+        raise ValueError(
+            f"Cannot serialize node '{node.name}': executor instances are runtime "
+            + "objects, use 'thread' or 'process' instead."
+        )
+    if node.cache is not None:
+        raise ValueError(
+            f"Cannot serialize node '{node.name}': cache backends are runtime "
+            + "objects, attach them after loading."
+        )
+    kind = next(kind for kind, cls in _KINDS if isinstance(node, cls))
+    data = {
+        "kind": kind,
+        "func": None if kind == "subflow" else func_path(node.func),
+        "name": node.name,
+        "return_envelope": node.return_envelope,
+        "executor": node.executor,
+        "next": [index[n.id] for n in node.next_ or ()],
+    }
+    if node.timeout is not None:
+        data["timeout"] = node.timeout
+    if node.hedge_after is not None:
+        data["hedge_after"] = node.hedge_after
+    if node.retry is not None:
+        data["retry"] = _retry_to_dict(node.retry)
+    if kind == "fork":
+        data["max_workers"] = node.max_workers
+    elif kind == "switch":
+        data["cases"] = [[key, index[n.id]] for key, n in node.cases.items()]
+        data["default"] = None if node.default is None else index[node.default.id]
+    elif kind == "subflow":
+        # Nested definitions keep their own node indexes.
+        data["flow"] = flow_to_dict(node.flow)
+        data["inline"] = node.inline
+    elif kind == "batch":
+        data["max_batch_size"] = node.batcher.max_batch_size
+        data["max_wait"] = node.batcher.max_wait
+    return data
+
+
+def _retry_to_dict(retry: Retry) -> typing.Dict[typing.Text, typing.Any]:
+    on = retry.on if isinstance(retry.on, tuple) else (retry.on,)
+    return {
+        "attempts": retry.attempts,
+        "backoff": retry.backoff,
+        "multiplier": retry.multiplier,
+        "max_backoff": retry.max_backoff,
+        "jitter": retry.jitter,
+        "on": [func_path(exc) for exc in on],
+    }
+
+
+def _retry_from_dict(
+    data: typing.Dict[typing.Text, typing.Any],
+    modules: typing.Dict[typing.Text, typing.Any],
+) -> Retry:
+    on = tuple(import_path(path, modules) for path in data["on"])
+    return Retry(
+        attempts=data["attempts"],
+        backoff=data["backoff"],
+        multiplier=data["multiplier"],
+        max_backoff=data["max_backoff"],
+        jitter=data["jitter"],
+        on=on[0] if len(on) == 1 else on,
+    )
+
+
+def _plan_to_dict(
+    plan: FlowPlan, index: typing.Dict[typing.Text, int]
+) -> typing.Optional[typing.Dict[typing.Text, typing.Any]]:
+    if any(step.node.id not in index for step in plan.steps):
+        # Inlined subflow steps belong to nested definitions; recompile instead.
+        return None
+    steps = []
+    for step in plan.steps:
+        specs = [
+            [kind, name, has_default, default if has_default else None]
+            for kind, name, has_default, default in param_specs(step.node.func_params)
+        ]
+        if not all(isinstance(spec[3], _JSON_SCALARS) for spec in specs):
+            # Such defaults are recompiled from the signature at load time.
+            specs = None
+        steps.append(
+            {
+                "node": index[step.node.id],
+                "params": specs,
+                "live": None if step.live is None else sorted(step.live),
+            }
+        )
+    return {"liveness": plan.liveness, "steps": steps}
+
+
+def flow_from_dict(data: typing.Dict[typing.Text, typing.Any]) -> Flow:
+    if data.get("format") != FORMAT:
+        raise ValueError("Not a flowter flow definition.")
+    if data.get("version") != FORMAT_VERSION:
+        raise ValueError(f"Unsupported flow definition version: {data.get('version')}")
+
+    modules: typing.Dict[typing.Text, typing.Any] = {}
+    specs = data["nodes"]
+    nodes = []
+    for spec in specs:
+        options = {
+            "timeout": spec.get("timeout"),
+            "hedge_after": spec.get("hedge_after"),
+        }
+        if "retry" in spec:
+            options["retry"] = _retry_from_dict(spec["retry"], modules)
+        if spec["kind"] == "fork":
+            options["max_workers"] = spec.get("max_workers")
+        elif spec["kind"] == "batch":
+            options["max_batch_size"] = spec["max_batch_size"]
+            options["max_wait"] = spec["max_wait"]
+        elif spec["kind"] == "subflow":
+            options["flow"] = flow_from_dict(spec["flow"])
+            options["inline"] = spec.get("inline", True)
+        nodes.append(
+            _KIND_CLASSES[spec["kind"]]._restore(
+                import_path(spec["func"], modules) if spec["func"] else None,
+                spec["name"],
+                spec["return_envelope"],
+                spec["executor"],
+                **options,
+            )
+        )
+    for node, spec in zip(nodes, specs):
+        if spec["next"]:
+            node.next_ = [nodes[i] for i in spec["next"]]
+        if spec["kind"] == "switch":
+            node.cases = {key: nodes[i] for key, i in spec.get("cases", ())}
+            if spec.get("default") is not None:
+                node.default = nodes[spec["default"]]
+    Node._topology_version += 1
+
+    options = data.get("options", {})
+    flow = Flow(
+        start_node=nodes[data["start"]],
+        end_node=nodes[data["end"]],
+        name=data["name"],
+        stream_buffer_size=options.get("stream_buffer_size", 16),
+        log_level=options.get("log_level", "warning"),
+        liveness=options.get("liveness", False),
+        keep_keys=options.get("keep_keys"),
+        timeout=options.get("timeout"),
+        dataflow=options.get("dataflow", False),
+        dataflow_workers=options.get("dataflow_workers"),
+    )
+    flow.node_pool = {node.id: node for node in nodes}
+    if data.get("plan") is not None:
+        _restore_plan(flow, nodes, data["plan"])
+    return flow
+
+
+def _restore_plan(
+    flow: Flow, nodes: typing.List[Node], snapshot: typing.Dict[typing.Text, typing.Any]
+):
+    if snapshot["liveness"] != flow.liveness or flow.dataflow:
+        # Dataflow plans are cheap to infer and are compiled on first run.
+        return
+    steps: typing.Dict[typing.Text, NodeStep] = {}
+    for spec in snapshot["steps"]:
+        node = nodes[spec["node"]]
+        bind = (
+            compile_param_specs(spec["params"]) if spec["params"] is not None else None
+        )
+        step = NodeStep(node, bind=bind)
+        step.live = None if spec["live"] is None else frozenset(spec["live"])
+        steps[node.id] = step
+    _link_steps(steps)
+    plan = FlowPlan(
+        flow, steps[flow.start_node.id], list(steps.values()), analyze=False
+    )
+    plan.version, plan.watched = flow._versions()
+    flow._plan = plan
+
+
+def dumps(
+    flow: Flow, binary: bool = False, include_plan: bool = False
+) -> typing.Union[typing.Text, bytes]:
+    data = flow_to_dict(flow, include_plan=include_plan)
+    if binary:
+        return BINARY_MAGIC + pickle.dumps(data, protocol=pickle.HIGHEST_PROTOCOL)
+    for spec in data["nodes"]:
+        for key, _ in spec.get("cases", ()):
+            if not isinstance(key, _JSON_SCALARS):
+                raise ValueError(
+                    f"Switch '{spec['name']}' has a case key of type "
+                    + f"{type(key).__name__}, which JSON cannot represent; "
+                    + "use binary=True."
+                )
+    return json.dumps(data, separators=(",", ":"))
+
+
+def loads(data: typing.Union[typing.Text, bytes]) -> Flow:
+    # Loading allocates many long-lived objects at once; pausing the cyclic
+    # collector avoids repeated full-generation scans over them.
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        if isinstance(data, bytes) and data.startswith(BINARY_MAGIC):
+            return flow_from_dict(pickle.loads(data[len(BINARY_MAGIC) :]))
+        return flow_from_dict(json.loads(data))
+    finally:
+        if enabled:
+            gc.enable()
+
+
+def dump(
+    flow: Flow, path: typing.Text, binary: bool = False, include_plan: bool = False
+):
+    data = dumps(flow, binary=binary, include_plan=include_plan)
+    mode = "wb" if binary else "w"
+    with open(path, mode, **({} if binary else {"encoding": "utf-8"})) as f:
+        f.write(data)
+
+
+def load(path: typing.Text) -> Flow:
+    with open(path, "rb") as f:
+        data = f.read()
+    return loads(data if data.startswith(BINARY_MAGIC) else data.decode("utf-8"))
@@ -0,0 +1,210 @@
+import contextvars
+import inspect
+import queue
+import threading
+import typing
+
+from .plan import STEP_FORK, STEP_NODE, NodeStep, RunState
+
+if typing.TYPE_CHECKING:
+    from .plan import FlowPlan
+
+# An item travelling through the stages: its own result dict plus the last
+# step that ran on it and that step's value, which decides the next route.
+StreamItem = typing.Tuple[typing.Dict[typing.Text, typing.Any], NodeStep, typing.Any]
+
+_DONE = object()
+
+
+class _Failure:
+    __slots__ = ("exc",)
+
+    def __init__(self, exc: BaseException):
+        self.exc = exc
+
+
+def stream_plan(
+    plan: "FlowPlan",
+    args: typing.Tuple[typing.Any, ...],
+    kwargs: typing.Dict[typing.Text, typing.Any],
+    buffer_size: int = 16,
+) -> typing.Iterator[typing.Dict[typing.Text, typing.Any]]:
+    run = RunState(plan.flow.name, args, kwargs)
+    result: typing.Dict[typing.Text, typing.Any] = {}
+    error: typing.Optional[BaseException] = None
+    try:
+        step = plan.entry
+        while step is not None:
+            if step.resources is not None:
+                value = plan._invoke(step, result, run)
+            else:
+                call_args, call_kwargs = plan._collect(step, result, kwargs, run)
+                value = step.node.run(*call_args, **call_kwargs)
+            if inspect.isgenerator(value):
+                break
+            plan._store(step, result, value, run)
+            if step.kind == STEP_FORK:
+                step = plan._fork(step, value, result, run)
+            else:
+                step = step.route(value)
+        else:
+            # Nothing streamed: behave like a regular run with a single output.
+            yield result
+            return
+
+        yield from _Pipeline(plan, step, value, result, run, buffer_size)
+    except Exception as e:
+        error = e
+        raise
+    finally:
+        # Frees the run's payload segments; yielded items keep their own.
+        plan._end(result, run, error)
+
+
+class _Pipeline:
+    def __init__(
+        self,
+        plan: "FlowPlan",
+        source_step: NodeStep,
+        source: typing.Iterator[typing.Any],
+        result: typing.Dict[typing.Text, typing.Any],
+        run: RunState,
+        buffer_size: int,
+    ):
+        self.plan = plan
+        self.source_step = source_step
+        self.source = source
+        self.result = result
+        self.run = run
+        self.buffer_size = buffer_size
+        self.stop = threading.Event()
+
+        # The straight run of plain nodes after the source becomes one thread
+        # per stage; anything past it (conditions, forks) is walked per item.
+        self.stages: typing.List[NodeStep] = []
+        step = source_step
+        while (
+            len(step.routes) == 1
+            and step.routes[0].kind == STEP_NODE
+            and step.routes[0] is not source_step
+            and step.routes[0] not in self.stages
+        ):
+            step = step.routes[0]
+            self.stages.append(step)
+
+    def __iter__(self) -> typing.Iterator[typing.Dict[typing.Text, typing.Any]]:
+        queues = [
+            queue.Queue(maxsize=self.buffer_size) for _ in range(len(self.stages) + 2)
+        ]
+        workers = [self._produce] + [self._run_stage(s) for s in self.stages]
+        workers.append(self._finish)
+        threads = []
+        for i, worker in enumerate(workers):
+            q_in = queues[i - 1] if i else None
+            thread = threading.Thread(
+                target=contextvars.copy_context().run,
+                args=(self._pump, worker, q_in, queues[i]),
+                name=f"flowter-stream-{i}",
+                daemon=True,
+            )
+            thread.start()
+            threads.append(thread)
+
+        try:
+            while True:
+                payload = queues[-1].get()
+                if payload is _DONE:
+                    break
+                if isinstance(payload, _Failure):
+                    raise payload.exc
+                if self.plan.payloads is not None:
+                    self.plan.payloads.keep(payload)
+                yield payload
+        finally:
+            self.stop.set()
+            close = getattr(self.source, "close", None)
+            for q in queues:
+                _drain(q)
+            for thread in threads:
+                thread.join(timeout=1)
+            if close is not None and not threads[0].is_alive():
+                close()
+
+    def _pump(
+        self,
+        worker: typing.Callable[[typing.Any], typing.Any],
+        q_in: typing.Optional[queue.Queue],
+        q_out: queue.Queue,
+    ):
+        if q_in is None:
+            # The producer pulls from the generator instead of a queue.
+            try:
+                for item in self.source:
+                    if not self._put(q_out, worker(item)):
+                        return
+            except BaseException as e:
+                self._put(q_out, _Failure(e))
+                return
+            self._put(q_out, _DONE)
+            return
+
+        while not self.stop.is_set():
+            try:
+                payload = q_in.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            if payload is not _DONE and not isinstance(payload, _Failure):
+                try:
+                    payload = worker(payload)
+                except BaseException as e:
+                    payload = _Failure(e)
+            self._put(q_out, payload)
+            if payload is _DONE or isinstance(payload, _Failure):
+                return
+
+    def _put(self, q: queue.Queue, payload: typing.Any) -> bool:
+        # Bounded queues give backpressure; the stop flag lets a blocked stage
+        # give up when the consumer abandons the stream.
+        while not self.stop.is_set():
+            try:
+                q.put(payload, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _produce(self, item: typing.Any) -> StreamItem:
+        item_result = dict(self.result)
+        self.plan._store(self.source_step, item_result, item, self.run)
+        return (item_result, self.source_step, item)
+
+    def _run_stage(self, step: NodeStep) -> typing.Callable[[StreamItem], StreamItem]:
+        plan = self.plan
+        run = self.run
+
+        def run_stage(payload: StreamItem) -> StreamItem:
+            item_result = payload[0]
+            if step.resources is not None:
+                value = plan._invoke(step, item_result, run)
+            else:
+                call_args, call_kwargs = plan._collect(
+                    step, item_result, run.kwargs, run
+                )
+                value = step.node.run(*call_args, **call_kwargs)
+            plan._store(step, item_result, value, run)
+            return (item_result, step, value)
+
+        return run_stage
+
+    def _finish(self, payload: StreamItem) -> typing.Dict[typing.Text, typing.Any]:
+        item_result, last_step, value = payload
+        self.plan._walk(last_step.route(value), item_result, self.run)
+        return item_result
+
+
+def _drain(q: queue.Queue):
+    try:
+        while True:
+            q.get_nowait()
+    except queue.Empty:
+        pass
@@ -0,0 +1,240 @@
+import json
+import logging
+import reprlib
+import threading
+import time
+import typing
+
+if typing.TYPE_CHECKING:
+    from flowter import Node
+    from flowter.plan import RunState
+
+LEVELS: typing.Dict[typing.Text, int] = {
+    "debug": logging.DEBUG,
+    "info": logging.INFO,
+    "warning": logging.WARNING,
+    "error": logging.ERROR,
+}
+
+SPAN_RUN = "run"
+SPAN_NODE = "node"
+SPAN_CONDITION = "condition"
+SPAN_BIND = "bind"
+SPAN_CALL = "call"
+
+
+def validate_level(level: typing.Text) -> int:
+    if level not in LEVELS:
+        raise ValueError(
+            f"Invalid level: '{level}'. Level must be one of {list(LEVELS)}."
+        )
+    return LEVELS[level]
+
+
+class Hook:
+    def sample(self) -> bool:
+        # Called once per run; a hook returning False sees none of its events.
+        return True
+
+    def on_run_start(self, run: "RunState"):
+        pass
+
+    def on_run_end(
+        self,
+        run: "RunState",
+        result: typing.Dict[typing.Text, typing.Any],
+        exc: typing.Optional[BaseException],
+    ):
+        pass
+
+    def on_node_start(
+        self,
+        run: "RunState",
+        node: "Node",
+        args: typing.Tuple[typing.Any, ...],
+        kwargs: typing.Dict[typing.Text, typing.Any],
+    ):
+        pass
+
+    def on_node_end(
+        self,
+        run: "RunState",
+        node: "Node",
+        value: typing.Any,
+        elapsed_ns: int,
+        exc: typing.Optional[BaseException],
+    ):
+        pass
+
+    def on_condition(
+        self, run: "RunState", node: "Node", condition: "Node", taken: bool
+    ):
+        pass
+
+    def on_switch(
+        self,
+        run: "RunState",
+        node: "Node",
+        key: typing.Hashable,
+        target: typing.Optional["Node"],
+    ):
+        pass
+
+    def on_envelope_write(
+        self, run: "RunState", node: "Node", key: typing.Text, value: typing.Any
+    ):
+        pass
+
+    def on_span(
+        self,
+        run: "RunState",
+        node: "Node",
+        kind: typing.Text,
+        start_ns: int,
+        end_ns: int,
+    ):
+        pass
+
+
+class Sink:
+    def emit(self, level: int, event: typing.Dict[typing.Text, typing.Any]):
+        raise NotImplementedError
+
+
+class LoggingSink(Sink):
+    def __init__(self, logger: typing.Optional[logging.Logger] = None):
+        self.logger = logger or logging.getLogger("flowter")
+
+    def emit(self, level: int, event: typing.Dict[typing.Text, typing.Any]):
+        if self.logger.isEnabledFor(level):
+            self.logger.log(
+                level,
+                "%s %s",
+                event["event"],
+                json.dumps(event, default=str),
+                extra={"flowter_event": event},
+            )
+
+
+class JSONLinesSink(Sink):
+    def __init__(self, file: typing.Union[typing.Text, typing.TextIO]):
+        self._owned = isinstance(file, typing.Text)
+        self.file = open(file, "a", encoding="utf-8") if self._owned else file
+        self._lock = threading.Lock()
+
+    def emit(self, level: int, event: typing.Dict[typing.Text, typing.Any]):
+        line = json.dumps(event, default=str) + "\n"
+        with self._lock:
+            self.file.write(line)
+
+    def close(self):
+        if self._owned:
+            self.file.close()
+
+
+class Tracer(Hook):
+    def __init__(
+        self,
+        sinks: typing.Optional[typing.List[Sink]] = None,
+        level: typing.Text = "info",
+        include_payloads: bool = False,
+        max_payload_chars: int = 512,
+    ):
+        self.sinks = list(sinks) if sinks else [LoggingSink()]
+        self.level = validate_level(level)
+        self.include_payloads = include_payloads
+        self._repr = reprlib.Repr()
+        self._repr.maxstring = max_payload_chars
+        self._repr.maxother = max_payload_chars
+
+    def on_run_start(self, run: "RunState"):
+        if self.level <= logging.INFO:
+            self._emit(logging.INFO, "run_start", run)
+
+    def on_run_end(self, run, result, exc):
+        if exc is not None:
+            self._emit(logging.ERROR, "run_error", run, error=repr(exc))
+        elif self.level <= logging.INFO:
+            self._emit(logging.INFO, "run_end", run)
+
+    def on_node_start(self, run, node, args, kwargs):
+        if self.level > logging.DEBUG:
+            return
+        if self.include_payloads:
+            self._emit(
+                logging.DEBUG,
+                "node_start",
+                run,
+                node=node.name,
+                args=self._repr.repr(args),
+                kwargs=self._repr.repr(kwargs),
+            )
+        else:
+            self._emit(logging.DEBUG, "node_start", run, node=node.name)
+
+    def on_node_end(self, run, node, value, elapsed_ns, exc):
+        if exc is not None:
+            self._emit(
+                logging.ERROR,
+                "node_error",
+                run,
+                node=node.name,
+                elapsed_ms=elapsed_ns / 1e6,
+                error=repr(exc),
+            )
+        elif self.level <= logging.DEBUG:
+            self._emit(
+                logging.DEBUG,
+                "node_end",
+                run,
+                node=node.name,
+                elapsed_ms=elapsed_ns / 1e6,
+            )
+
+    def on_condition(self, run, node, condition, taken):
+        if self.level <= logging.DEBUG:
+            self._emit(
+                logging.DEBUG,
+                "condition",
+                run,
+                node=node.name,
+                condition=condition.name,
+                taken=bool(taken),
+            )
+
+    def on_switch(self, run, node, key, target):
+        if self.level <= logging.DEBUG:
+            self._emit(
+                logging.DEBUG,
+                "switch",
+                run,
+                node=node.name,
+                key=self._repr.repr(key),
+                target=target.name if target is not None else None,
+            )
+
+    def on_envelope_write(self, run, node, key, value):
+        if self.level > logging.DEBUG:
+            return
+        if self.include_payloads:
+            self._emit(
+                logging.DEBUG,
+                "envelope_write",
+                run,
+                node=node.name,
+                key=key,
+                value=self._repr.repr(value),
+            )
+        else:
+            self._emit(logging.DEBUG, "envelope_write", run, node=node.name, key=key)
+
+    def _emit(self, level: int, event: typing.Text, run: "RunState", **fields):
+        record = {
+            "event": event,
+            "ts": time.time(),
+            "flow": run.flow_name,
+            "run_id": run.run_id,
+        }
+        record.update(fields)
+        for sink in self.sinks:
+            sink.emit(level, record)
@@ -0,0 +1,56 @@
+import json
+
+from flowter.__main__ import main
+from flowter.bench import (
+    SCENARIOS,
+    compare,
+    measure,
+    measure_node_creation,
+    percentile,
+    run_benchmarks,
+)
+
+
+def test_scenarios_run():
+    for name, build in SCENARIOS.items():
+        flow, kwargs, nodes_per_run = build()
+        result = flow.run(**kwargs)
+        assert result, name
+        metrics = measure(flow, kwargs, nodes_per_run, iterations=5, warmup=1)
+        assert metrics["p50_us"] <= metrics["p99_us"]
+        assert metrics["throughput_rps"] > 0
+
+
+def test_percentile():
+    assert percentile([], 0.5) == 0.0
+    assert percentile([3, 1, 2], 0.5) == 2
+    assert percentile(list(range(101)), 0.99) == 99
+
+
+def test_measure_node_creation():
+    metrics = measure_node_creation(count=100)
+    assert metrics["nodes"] == 100
+    assert metrics["create_us"] > 0
+    assert metrics["bytes_per_node"] > 0
+
+
+def test_compare_reports_regressions():
+    baseline = {"results": {"chain": {"p99_us": 100.0, "throughput_rps": 1000.0}}}
+    report = {"results": {"chain": {"p99_us": 150.0, "throughput_rps": 980.0}}}
+    regressions = compare(report, baseline, threshold=0.1)
+    assert len(regressions) == 1
+    assert regressions[0].startswith("chain.p99_us")
+
+
+def test_bench_cli(tmp_path, capsys):
+    output = tmp_path / "bench.json"
+    argv = ["bench", "--scenario", "chain", "--iterations", "5", "--warmup", "1"]
+    assert main(argv + ["--output", str(output)]) == 0
+    report = json.loads(output.read_text())
+    assert set(report["results"]) == {"chain", "build", "nodes", "load"}
+    assert "chain:" in capsys.readouterr().out
+
+    report["results"]["chain"]["p99_us"] = 1e-9
+    output.write_text(json.dumps(report))
+    assert main(argv + ["--baseline", str(output)]) == 1
+    assert run_benchmarks(scenarios=["chain"], iterations=2, warmup=0)["results"]
@@ -0,0 +1,133 @@
+import os
+import subprocess
+import sys
+import threading
+import time
+
+import pytest
+
+from flowter.broker import (
+    TASK_DONE,
+    TASK_FAILED,
+    TASK_QUEUED,
+    SQLiteBroker,
+    TaskFailedError,
+    Worker,
+    load_flow,
+)
+
+from .utils import build_worker_flow, func_sum_of_squares
+
+
+@pytest.fixture
+def broker(tmp_path):
+    return SQLiteBroker(str(tmp_path / "broker.db"))
+
+
+def test_enqueue_run_and_collect(broker):
+    worker = Worker(broker, [build_worker_flow()], poll_interval=0.01)
+    task_ids = [broker.enqueue("worker-flow", kwargs={"n": n}) for n in range(5)]
+    assert broker.status(task_ids[0]) == TASK_QUEUED
+    assert worker.run(max_tasks=5, concurrency=2) == 5
+    assert [broker.wait(t, timeout=1)["total"] for t in task_ids] == [
+        func_sum_of_squares(n) for n in range(5)
+    ]
+    assert broker.counts() == {TASK_DONE: 5}
+
+
+def test_failed_flow_is_reported(broker):
+    worker = Worker(broker, [build_worker_flow()])
+    task_id = broker.enqueue("worker-flow", kwargs={"n": "x"})
+    assert worker.run_one()
+    with pytest.raises(TaskFailedError, match="TypeError"):
+        broker.wait(task_id, timeout=1)
+
+
+def make_lock() -> threading.Lock:
+    return threading.Lock()
+
+
+def test_unpicklable_result_fails_the_task(broker):
+    from flowter import Flow, Node
+
+    flow = Flow(name="lock-flow")
+    flow.add_node(
+        Node(make_lock, name="lock", return_envelope="lock"),
+        src=flow.start_node,
+        dst=flow.end_node,
+    )
+    worker = Worker(broker, [flow])
+    task_id = broker.enqueue("lock-flow")
+    assert worker.run_one()
+    assert broker.status(task_id) == TASK_FAILED
+    with pytest.raises(TaskFailedError, match="Cannot store result"):
+        broker.wait(task_id, timeout=1)
+
+
+def test_unknown_flows_are_not_claimed(broker):
+    broker.enqueue("other-flow")
+    assert not Worker(broker, [build_worker_flow()]).run_one()
+
+
+def test_crashed_worker_task_is_retried(broker):
+    task_id = broker.enqueue("worker-flow", kwargs={"n": 3}, max_attempts=2)
+    # A worker claims the task and dies without acknowledging it.
+    lost = broker.claim(["worker-flow"], "crashed", lease=0.01)
+    assert lost.id == task_id
+    time.sleep(0.02)
+
+    worker = Worker(broker, [build_worker_flow()], worker_id="healthy")
+    assert worker.run_one()
+    assert broker.wait(task_id, timeout=1)["total"] == func_sum_of_squares(3)
+
+    # The crashed worker's late acknowledgement is ignored.
+    broker.complete(task_id, "crashed", {"total": -1})
+    assert broker.result(task_id)["total"] == func_sum_of_squares(3)
+
+
+def test_task_fails_after_max_attempts(broker):
+    task_id = broker.enqueue("worker-flow", kwargs={"n": 3}, max_attempts=1)
+    broker.claim(["worker-flow"], "crashed", lease=0.01)
+    time.sleep(0.02)
+    assert broker.claim(["worker-flow"], "other", lease=1) is None
+    assert broker.status(task_id) == TASK_FAILED
+    with pytest.raises(TaskFailedError, match="worker lost"):
+        broker.result(task_id)
+
+
+def test_load_flow():
+    assert load_flow("tests.utils:build_worker_flow").name == "worker-flow"
+    with pytest.raises(ValueError):
+        load_flow("tests.utils")
+    with pytest.raises(TypeError):
+        load_flow("tests.utils:func_sum_of_squares.__name__")
+
+
+def test_worker_cli(broker):
+    task_ids = [broker.enqueue("worker-flow", kwargs={"n": n}) for n in (10, 20)]
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    completed = subprocess.run(
+        [
+            sys.executable,
+            "-m",
+            "flowter",
+            "worker",
+            "--broker",
+            broker.path,
+            "--flow",
+            "tests.utils:build_worker_flow",
+            "--max-tasks",
+            "2",
+            "--poll-interval",
+            "0.01",
+        ],
+        cwd=root,
+        capture_output=True,
+        text=True,
+        timeout=60,
+    )
+    assert completed.returncode == 0, completed.stderr
+    assert [broker.wait(t, timeout=1)["total"] for t in task_ids] == [
+        func_sum_of_squares(10),
+        func_sum_of_squares(20),
+    ]
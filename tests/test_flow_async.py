@@ -0,0 +1,46 @@
+import asyncio
+import time
+from typing import Text
+
+from flowter import Flow, Node
+
+
+def test_flow_arun_awaits_coroutine_nodes():
+    async def fetch_user(user_id: int) -> Text:
+        await asyncio.sleep(0.05)
+        return f"user-{user_id}"
+
+    async def is_admin(user: Text) -> bool:
+        return user.endswith("0")
+
+    def greet(user: Text) -> Text:
+        return f"Hi {user}!"
+
+    def grant_access(user: Text) -> Text:
+        return f"Welcome back, admin {user}."
+
+    flow = Flow()
+    node_1 = flow.add_node(
+        Node(fetch_user, name="fetch_user", return_envelope="user"),
+        src=flow.start_node,
+    )
+    flow.add_node(
+        Node(grant_access, name="grant_access", return_envelope="message"),
+        src=node_1,
+        src_condition_node=is_admin,
+        dst=flow.end_node,
+    )
+    flow.add_node(
+        Node(greet, name="greet", return_envelope="message", executor="thread"),
+        src=node_1,
+        dst=flow.end_node,
+    )
+
+    async def main():
+        return await asyncio.gather(*(flow.arun(user_id=i) for i in range(200)))
+
+    start = time.perf_counter()
+    results = asyncio.run(main())
+    assert time.perf_counter() - start < 2.0
+    assert results[10]["message"] == "Welcome back, admin user-10."
+    assert results[11]["message"] == "Hi user-11!"
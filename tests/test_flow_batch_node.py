@@ -0,0 +1,106 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List
+
+import pytest
+
+from flowter import BatchNode, DeadlineExceeded, Flow
+from flowter.cache import LRUCache
+
+
+def test_batch_node_groups_concurrent_runs():
+    batch_sizes = []
+
+    def score(texts: List[str]) -> List[int]:
+        batch_sizes.append(len(texts))
+        time.sleep(0.01)
+        return [len(text) for text in texts]
+
+    flow = Flow()
+    node = BatchNode(
+        score, name="score", return_envelope="score", max_batch_size=8, max_wait=0.05
+    )
+    flow.add_node(node, src=flow.start_node, dst=flow.end_node)
+
+    with ThreadPoolExecutor(max_workers=16) as pool:
+        results = list(pool.map(lambda i: flow.run(texts="x" * i), range(32)))
+
+    assert [result["score"] for result in results] == list(range(32))
+    assert sum(batch_sizes) == 32
+    assert max(batch_sizes) <= 8
+    assert len(batch_sizes) < 32
+    assert node.batcher.batch_count == len(batch_sizes)
+
+
+def test_batch_node_propagates_errors():
+    def broken(items: List[int]) -> List[int]:
+        return items[:-1]
+
+    flow = Flow()
+    flow.add_node(BatchNode(broken, name="broken"), src=flow.start_node)
+    with pytest.raises(ValueError, match="returned 0 results for 1 inputs"):
+        flow.run(items=1)
+
+
+def test_batch_node_requires_list_parameter():
+    with pytest.raises(TypeError):
+        BatchNode(lambda **kwargs: [], name="invalid")
+
+
+def test_batch_node_survives_cancelled_callers():
+    def slow_double(items: List[int]) -> List[int]:
+        time.sleep(0.1)
+        return [item * 2 for item in items]
+
+    flow = Flow()
+    node = BatchNode(slow_double, name="double", return_envelope="double")
+    flow.add_node(node, src=flow.start_node, dst=flow.end_node)
+
+    async def give_up():
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(flow.arun(items=1), timeout=0.02)
+
+    asyncio.run(give_up())
+    # A caller queued behind the running batch gives up before it starts.
+    queued = node.batcher.submit(2)
+    queued.cancel()
+    time.sleep(0.15)
+    assert node.batcher._worker.is_alive()
+    assert flow.run(items=3)["double"] == 6
+
+
+def test_batch_node_honours_node_options():
+    calls = []
+
+    def slow_len(texts: List[str]) -> List[int]:
+        time.sleep(0.2)
+        return [len(text) for text in texts]
+
+    def fast_len(texts: List[str]) -> List[int]:
+        calls.append(texts)
+        return [len(text) for text in texts]
+
+    flow = Flow()
+    flow.add_node(BatchNode(slow_len, name="slow", timeout=0.05), src=flow.start_node)
+    start = time.perf_counter()
+    with pytest.raises(DeadlineExceeded):
+        flow.run(texts="abc")
+    with pytest.raises(DeadlineExceeded):
+        asyncio.run(flow.arun(texts="abc"))
+    assert time.perf_counter() - start < 0.3
+
+    cache = LRUCache()
+    flow = Flow()
+    flow.add_node(
+        BatchNode(fast_len, name="cached", return_envelope="n", cache=cache),
+        src=flow.start_node,
+        dst=flow.end_node,
+    )
+    assert flow.run(texts="abc")["n"] == 3
+    assert asyncio.run(flow.arun(texts="abc"))["n"] == 3
+    assert len(calls) == 1
+    assert (cache.hits, cache.misses) == (1, 1)
+
+    with pytest.raises(ValueError, match="executor"):
+        BatchNode(slow_len, name="threaded", executor="thread")
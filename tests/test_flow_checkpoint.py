@@ -0,0 +1,85 @@
+import asyncio
+
+import pytest
+
+from flowter import Flow, Node
+from flowter.checkpoint import (
+    STATUS_COMPLETED,
+    STATUS_FAILED,
+    CheckpointedRunError,
+    FileCheckpointStore,
+    SQLiteCheckpointStore,
+)
+
+
+@pytest.fixture(params=["file", "sqlite"])
+def store(request, tmp_path):
+    if request.param == "file":
+        return FileCheckpointStore(str(tmp_path / "checkpoints"))
+    return SQLiteCheckpointStore(str(tmp_path / "checkpoints.db"))
+
+
+def test_resume_from_failed_node(store):
+    calls = []
+    state = {"fail": True}
+
+    def download(url: str) -> str:
+        calls.append("download")
+        return f"data from {url}"
+
+    def parse(data: str) -> int:
+        calls.append("parse")
+        if state["fail"]:
+            raise RuntimeError("parser crashed")
+        return len(data)
+
+    flow = Flow(checkpoint_store=store)
+    node_1 = flow.add_node(
+        Node(download, name="download", return_envelope="data"), src=flow.start_node
+    )
+    flow.add_node(
+        Node(parse, name="parse", return_envelope="size"), src=node_1, dst=flow.end_node
+    )
+
+    with pytest.raises(CheckpointedRunError) as exc_info:
+        flow.run(url="http://example.com")
+    run_id = exc_info.value.run_id
+    assert exc_info.value.node_name == "parse"
+    assert isinstance(exc_info.value.__cause__, RuntimeError)
+    assert store.list_runs(status=STATUS_FAILED) == [run_id]
+    assert store.load(run_id)["result"]["data"] == "data from http://example.com"
+
+    state["fail"] = False
+    result = flow.resume(run_id)
+    assert result["size"] == len("data from http://example.com")
+    assert calls == ["download", "parse", "parse"]
+    assert store.load(run_id)["status"] == STATUS_COMPLETED
+    assert asyncio.run(flow.aresume(run_id)) == result
+
+
+def test_resume_unknown_run(store):
+    flow = Flow(checkpoint_store=store)
+    with pytest.raises(ValueError):
+        flow.resume("missing")
+    with pytest.raises(ValueError):
+        Flow().resume("missing")
+
+
+def test_resume_rebuilt_flow_by_node_name(store):
+    def build(fail: bool) -> Flow:
+        def parse(data: str) -> int:
+            if fail:
+                raise RuntimeError("parser crashed")
+            return len(data)
+
+        flow = Flow(checkpoint_store=store)
+        node_1 = flow.add_node(
+            Node(str.upper, name="download", return_envelope="data"),
+            src=flow.start_node,
+        )
+        flow.add_node(Node(parse, name="parse", return_envelope="size"), src=node_1)
+        return flow
+
+    with pytest.raises(CheckpointedRunError) as exc_info:
+        build(fail=True).run("abc")
+    assert build(fail=False).resume(exc_info.value.run_id)["size"] == 3
@@ -0,0 +1,87 @@
+import inspect
+import pprint
+
+import pytest
+
+from flowter import Flow, Node
+from flowter.helper import collect_params, compile_params
+from flowter.serialize import dumps, loads
+
+from .utils import func_add, func_concat, func_key_value_table, func_merge
+
+
+def func_keyword_only(a: int, *, b: int = 2, c: int) -> int:
+    return a + b + c
+
+
+@pytest.mark.parametrize(
+    "func, args",
+    [
+        (func_add, (1, 2, 3)),
+        (func_concat, (1, 2, 3)),
+        (func_merge, ({"hello": "world"},)),
+        (func_key_value_table, (1, 2, 3)),
+        (func_keyword_only, (1,)),
+    ],
+)
+def test_compile_params_matches_collect_params(func, args):
+    kwargs = {"c": 7}
+    extra_kwargs = dict(b=4, c=5, d=6)
+    params = inspect.signature(func).parameters
+
+    expected = collect_params(params, *args, kwargs=kwargs, **extra_kwargs)
+    collected = compile_params(params)(args, kwargs, extra_kwargs)
+    assert collected[0] == expected[0]
+    assert pprint.pformat(collected[1]) == pprint.pformat(expected[1])
+
+
+def test_compile_params_missing_argument():
+    bind = compile_params(inspect.signature(func_add).parameters)
+    with pytest.raises(TypeError):
+        bind((), {"a": 1}, {})
+
+
+def test_flow_compile_reuse_and_invalidation():
+    flow = Flow()
+    node_1 = flow.add_node(
+        Node(lambda x: x + 1, name="inc", return_envelope="y"), src=flow.start_node
+    )
+
+    plan = flow.compile()
+    assert plan is flow.compile()
+    assert flow.run(x=1) == {"start": None, "y": 2}
+
+    flow.add_node(
+        Node(lambda y: y * 10, name="scale", return_envelope="z"),
+        src=node_1,
+        dst=flow.end_node,
+    )
+    assert flow.compile() is not plan
+    assert flow.run(x=1) == {"start": None, "y": 2, "z": 20, "end": None}
+
+    plan = flow.compile()
+    node_1.add_next(Node(lambda: "unused", name="unused"))
+    assert flow.compile() is not plan
+
+
+def test_other_flows_do_not_invalidate_a_plan():
+    def build(name: str, **flow_kwargs) -> Flow:
+        flow = Flow(name=name, **flow_kwargs)
+        flow.add_node(
+            Node(func_add, name="add", return_envelope="total"),
+            src=flow.start_node,
+            dst=flow.end_node,
+        )
+        return flow
+
+    a = build("a")
+    d = build("d", dataflow=True)
+    plan, dataflow_plan = a.compile(), d.compile()
+    b = build("b")
+    b.add_node(Node(func_concat, name="concat"), src=b.start_node)
+    loads(dumps(b))
+    assert a.compile() is plan
+    assert d.compile() is dataflow_plan
+
+    a.start_node.add_next(Node(func_concat, name="concat"))
+    assert a.compile() is not plan
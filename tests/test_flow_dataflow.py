@@ -0,0 +1,223 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from flowter import Condition, Flow, Node
+
+
+def fetch_user(user_id: int) -> dict:
+    return {"id": user_id, "name": f"user-{user_id}"}
+
+
+def fetch_orders(user_id: int) -> list:
+    return [user_id * 10, user_id * 10 + 1]
+
+
+def fetch_prefs(user_id: int) -> dict:
+    return {"theme": "dark"}
+
+
+def is_positive(value) -> bool:
+    return value > 0
+
+
+def render(user: dict, orders: list, prefs: dict) -> str:
+    return f"{user['name']}:{len(orders)}:{prefs['theme']}"
+
+
+def _dataflow(*funcs, envelopes=None, **flow_kwargs) -> Flow:
+    flow = Flow(name="dataflow", dataflow=True, **flow_kwargs)
+    for func, envelope in zip(funcs, envelopes or [None] * len(funcs)):
+        flow.add_node(Node(func, name=func.__name__, return_envelope=envelope))
+    return flow
+
+
+def _profile_flow(**flow_kwargs) -> Flow:
+    return _dataflow(
+        render,
+        fetch_orders,
+        fetch_user,
+        fetch_prefs,
+        envelopes=["page", "orders", "user", "prefs"],
+        **flow_kwargs,
+    )
+
+
+def test_dependencies_are_inferred_from_parameter_names():
+    plan = _profile_flow().compile()
+    names = [step.node.name for step in plan.steps]
+    render_waits = {names[j] for j in plan.waits[names.index("render")]}
+    assert render_waits == {"start", "fetch_user", "fetch_orders", "fetch_prefs"}
+    assert {names[j] for j in plan.waits[names.index("fetch_user")]} == {"start"}
+
+
+def test_dataflow_run_matches_sequential_result():
+    result = _profile_flow().run(user_id=3)
+    assert result["page"] == "user-3:2:dark"
+    assert result["orders"] == [30, 31]
+    assert asyncio.run(_profile_flow().arun(user_id=3))["page"] == "user-3:2:dark"
+
+
+def test_independent_nodes_run_concurrently():
+    barrier = threading.Barrier(3, timeout=2)
+
+    def wait_a(x: int) -> int:
+        barrier.wait()
+        return x
+
+    def wait_b(x: int) -> int:
+        barrier.wait()
+        return x + 1
+
+    def wait_c(x: int) -> int:
+        barrier.wait()
+        return x + 2
+
+    def total(a: int, b: int, c: int) -> int:
+        return a + b + c
+
+    flow = _dataflow(wait_a, wait_b, wait_c, total, envelopes=["a", "b", "c", "total"])
+    # The barrier only opens when all three fetches overlap.
+    assert flow.run(x=1)["total"] == 6
+
+
+def test_async_nodes_overlap():
+    async def sleep_a(x: int) -> int:
+        await asyncio.sleep(0.1)
+        return x
+
+    async def sleep_b(x: int) -> int:
+        await asyncio.sleep(0.1)
+        return x
+
+    flow = _dataflow(sleep_a, sleep_b, envelopes=["a", "b"])
+    start = time.monotonic()
+    asyncio.run(flow.arun(x=1))
+    assert time.monotonic() - start < 0.18
+
+
+def test_explicit_edges_are_kept_as_ordering():
+    order = []
+
+    def first(x: int) -> int:
+        order.append("first")
+        return x
+
+    def second(x: int) -> int:
+        order.append("second")
+        return x
+
+    flow = Flow(name="ordered", dataflow=True)
+    a = flow.add_node(Node(first, return_envelope="a"), src=flow.start_node)
+    flow.add_node(Node(second, return_envelope="b"), src=a, dst=flow.end_node)
+    flow.run(x=1)
+    assert order == ["first", "second"]
+
+
+def collect(**kwargs) -> list:
+    return sorted(kwargs)
+
+
+def describe(collected: list) -> str:
+    return ",".join(collected)
+
+
+def test_kwargs_reader_waits_only_for_its_producers():
+    flow = _dataflow(
+        describe,
+        collect,
+        fetch_user,
+        fetch_prefs,
+        envelopes=["report", "collected", "user", "prefs"],
+    )
+    result = flow.run(user_id=1)
+    # The reader of collect's key runs after it, so collect cannot see it.
+    assert result["collected"] == ["prefs", "start", "user", "user_id"]
+    assert result["report"] == "prefs,start,user,user_id"
+    assert asyncio.run(flow.arun(user_id=1))["report"] == "prefs,start,user,user_id"
+
+
+def test_two_kwargs_readers_do_not_wait_on_each_other():
+    def count(**kwargs) -> int:
+        return len(kwargs)
+
+    flow = _dataflow(
+        collect, count, fetch_user, envelopes=["collected", "count", "user"]
+    )
+    plan = flow.compile()
+    names = [step.node.name for step in plan.steps]
+    for name, other in (("collect", "count"), ("count", "collect")):
+        waits = {names[j] for j in plan.waits[names.index(name)]}
+        assert waits == {"start", "fetch_user"}, other
+    result = flow.run(user_id=1)
+    assert "user" in result["collected"]
+    assert result["count"] >= 2
+
+
+def test_liveness_drops_keys_once_read():
+    flow = _profile_flow(liveness=True, keep_keys=["page"])
+    assert flow.run(user_id=1) == {"page": "user-1:2:dark"}
+
+
+def test_failures_propagate():
+    def boom(user: dict) -> int:
+        raise RuntimeError("boom")
+
+    flow = _dataflow(fetch_user, boom, envelopes=["user", "boom"])
+    with pytest.raises(RuntimeError, match="boom"):
+        flow.run(user_id=1)
+
+
+def test_unsupported_graphs_are_rejected():
+    flow = _dataflow(fetch_user, fetch_prefs, envelopes=["same", "same"])
+    with pytest.raises(ValueError, match="ambiguous"):
+        flow.run(user_id=1)
+
+    def needs_b(b: int) -> int:
+        return b
+
+    def needs_a(a: int) -> int:
+        return a
+
+    flow = _dataflow(needs_b, needs_a, envelopes=["a", "b"])
+    with pytest.raises(ValueError, match="cyclic"):
+        flow.compile()
+
+    flow = Flow(name="routed", dataflow=True)
+    flow.add_node(
+        Node(fetch_user), src=flow.start_node, src_condition_node=Condition(is_positive)
+    )
+    with pytest.raises(ValueError, match="routes"):
+        flow.compile()
+
+    with pytest.raises(ValueError, match="stream"):
+        next(_profile_flow().stream(user_id=1))
+
+
+def test_switching_modes_recompiles():
+    flow = _profile_flow()
+    assert flow.compile().dataflow
+    flow.dataflow = False
+    assert not flow.compile().dataflow
+
+
+def test_sync_nodes_overlap_in_async_runs():
+    def nap_a(x: int) -> int:
+        time.sleep(0.2)
+        return x
+
+    def nap_b(x: int) -> int:
+        time.sleep(0.2)
+        return x
+
+    def nap_c(x: int) -> int:
+        time.sleep(0.2)
+        return x
+
+    flow = _dataflow(nap_a, nap_b, nap_c, envelopes=["a", "b", "c"])
+    start = time.monotonic()
+    result = asyncio.run(flow.arun(x=1))
+    assert time.monotonic() - start < 0.5
+    assert (result["a"], result["b"], result["c"]) == (1, 1, 1)
@@ -0,0 +1,175 @@
+import asyncio
+import itertools
+import threading
+import time
+
+import pytest
+
+from flowter import DeadlineExceeded, Flow, Node, Retry, remaining
+from flowter.deadlines import budget
+from flowter.serialize import dumps, loads
+
+
+def slow(value: int) -> int:
+    time.sleep(1.0)
+    return value
+
+
+def report_budget(value: int) -> float:
+    return remaining()
+
+
+def _chain(*nodes, **flow_kwargs) -> Flow:
+    flow = Flow(name="deadlines", **flow_kwargs)
+    flow.add_nodes(nodes, src=flow.start_node, dst=flow.end_node, chain=True)
+    return flow
+
+
+def _flaky(failures: int):
+    calls = itertools.count(1)
+
+    def flaky(value: int) -> int:
+        if next(calls) <= failures:
+            raise ConnectionError("unavailable")
+        return value
+
+    return flaky
+
+
+def _slow_first(delay: float = 1.0):
+    calls = itertools.count(1)
+    lock = threading.Lock()
+
+    def call(value: int) -> int:
+        with lock:
+            first = next(calls) == 1
+        if first:
+            time.sleep(delay)
+            return -1
+        return value
+
+    return call
+
+
+def test_remaining_is_none_without_budget():
+    flow = _chain(Node(report_budget, name="report"))
+    assert flow.run(value=1)["report"] is None
+
+
+def test_node_timeout_is_visible_and_enforced():
+    flow = _chain(Node(report_budget, name="report", timeout=5.0))
+    assert 0 < flow.run(value=1)["report"] <= 5.0
+
+    flow = _chain(Node(slow, name="slow", timeout=0.05))
+    start = time.monotonic()
+    with pytest.raises(DeadlineExceeded, match="slow"):
+        flow.run(value=1)
+    assert time.monotonic() - start < 0.5
+
+
+def test_run_budget_propagates_to_nodes():
+    def nap(value: int) -> int:
+        time.sleep(0.05)
+        return value
+
+    flow = _chain(
+        Node(nap, name="a", return_envelope="value"),
+        Node(report_budget, name="report", timeout=10.0),
+        timeout=1.0,
+    )
+    # The node's own timeout cannot extend the run's budget.
+    assert 0 < flow.run(value=1)["report"] < 0.96
+
+    flow = _chain(
+        *(Node(nap, return_envelope="value") for _ in range(10)), timeout=0.12
+    )
+    with pytest.raises(DeadlineExceeded):
+        flow.run(value=1)
+
+
+def test_nested_budget_only_shrinks():
+    with budget(0.5):
+        with budget(10.0):
+            assert remaining() <= 0.5
+    assert remaining() is None
+
+
+def test_retry_with_backoff():
+    flow = _chain(Node(_flaky(2), name="flaky", retry=Retry(attempts=3, backoff=0.001)))
+    assert flow.run(value=7)["flaky"] == 7
+
+    flow = _chain(Node(_flaky(2), name="flaky", retry=Retry(attempts=2, backoff=0.001)))
+    with pytest.raises(ConnectionError):
+        flow.run(value=7)
+
+    flow = _chain(Node(_flaky(1), name="flaky", retry=Retry(attempts=3, on=ValueError)))
+    with pytest.raises(ConnectionError):
+        flow.run(value=7)
+
+
+def test_retry_gives_up_when_backoff_exceeds_deadline():
+    node = Node(
+        _flaky(1),
+        name="flaky",
+        timeout=0.05,
+        retry=Retry(attempts=3, backoff=1.0, jitter=False),
+    )
+    start = time.monotonic()
+    with pytest.raises(ConnectionError):
+        _chain(node).run(value=1)
+    assert time.monotonic() - start < 0.5
+
+
+def test_retry_delays_grow_and_are_capped():
+    retry = Retry(backoff=0.1, multiplier=2.0, max_backoff=0.3, jitter=False)
+    assert [retry.delay(i) for i in (1, 2, 3, 4)] == pytest.approx([0.1, 0.2, 0.3, 0.3])
+    assert 0.05 <= Retry(backoff=0.1).delay(1) <= 0.1
+
+
+def test_hedged_call_takes_the_faster_result():
+    flow = _chain(Node(_slow_first(), name="hedged", hedge_after=0.02))
+    start = time.monotonic()
+    assert flow.run(value=5)["hedged"] == 5
+    assert time.monotonic() - start < 0.5
+
+
+def test_async_timeout_and_hedge():
+    async def sleepy(value: int) -> int:
+        await asyncio.sleep(1.0)
+        return value
+
+    flow = _chain(Node(sleepy, name="sleepy", timeout=0.05))
+    with pytest.raises(DeadlineExceeded):
+        asyncio.run(flow.arun(value=1))
+
+    flow = _chain(Node(_slow_first(), name="hedged", hedge_after=0.02))
+    start = time.monotonic()
+    assert asyncio.run(flow.arun(value=3))["hedged"] == 3
+    assert time.monotonic() - start < 0.5
+
+
+def test_invalid_policies():
+    with pytest.raises(ValueError):
+        Node(slow, timeout=0)
+    with pytest.raises(ValueError):
+        Node(slow, hedge_after=-1)
+    with pytest.raises(ValueError):
+        Node(slow, retry=3)
+    with pytest.raises(ValueError):
+        Retry(attempts=0)
+
+
+def test_policies_survive_serialization():
+    node = Node(
+        slow,
+        name="slow",
+        timeout=2.0,
+        hedge_after=0.5,
+        retry=Retry(attempts=4, on=(ConnectionError, TimeoutError)),
+    )
+    loaded = loads(dumps(_chain(node, timeout=3.0)))
+    restored = loaded.graph.find("slow")
+    assert loaded.timeout == 3.0
+    assert (restored.timeout, restored.hedge_after) == (2.0, 0.5)
+    assert restored.retry.attempts == 4
+    assert restored.retry.on == (ConnectionError, TimeoutError)
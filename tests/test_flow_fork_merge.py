@@ -0,0 +1,81 @@
+import asyncio
+import time
+from typing import Dict, Text
+
+from flowter import Flow, Fork, Merge, Node
+
+
+def build_enrichment_flow() -> Flow:
+    def load_user(user_id: int) -> Dict:
+        return {"id": user_id}
+
+    def fetch_profile(user: Dict) -> Text:
+        time.sleep(0.2)
+        return f"profile-{user['id']}"
+
+    def fetch_orders(user: Dict) -> int:
+        time.sleep(0.2)
+        return 3
+
+    def fetch_score(user: Dict) -> float:
+        time.sleep(0.2)
+        return 0.5
+
+    def is_vip(user: Dict) -> bool:
+        return user["id"] > 100
+
+    def fetch_vip_perks(user: Dict) -> Text:
+        return "lounge"
+
+    def combine(profile: Text, orders: int, score: float, **kwargs) -> Text:
+        return f"{profile}/{orders}/{score}/{kwargs.get('perks', '-')}"
+
+    flow = Flow()
+    fork = Fork(load_user, name="load_user", return_envelope="user", max_workers=4)
+    merge = Merge(combine, name="combine", return_envelope="report")
+    flow.add_node(fork, src=flow.start_node)
+    for func, envelope in [
+        (fetch_profile, "profile"),
+        (fetch_orders, "orders"),
+        (fetch_score, "score"),
+    ]:
+        flow.add_node(
+            Node(func, name=func.__name__, return_envelope=envelope),
+            src=fork,
+            dst=merge,
+        )
+    flow.add_node(
+        Node(fetch_vip_perks, name="fetch_vip_perks", return_envelope="perks"),
+        src=fork,
+        src_condition_node=is_vip,
+        dst=merge,
+    )
+    flow.add_node(merge, dst=flow.end_node)
+    return flow
+
+
+def test_fork_runs_branches_concurrently():
+    flow = build_enrichment_flow()
+
+    start = time.perf_counter()
+    result = flow.run(user_id=1)
+    elapsed = time.perf_counter() - start
+
+    assert elapsed < 0.5
+    assert result["report"] == "profile-1/3/0.5/-"
+    assert "perks" not in result
+    assert result["end"] is None
+
+    result = flow.run(user_id=101)
+    assert result["report"] == "profile-101/3/0.5/lounge"
+
+
+def test_fork_runs_branches_concurrently_async():
+    flow = build_enrichment_flow()
+
+    start = time.perf_counter()
+    result = asyncio.run(flow.arun(user_id=101))
+    elapsed = time.perf_counter() - start
+
+    assert elapsed < 0.5
+    assert result["report"] == "profile-101/3/0.5/lounge"
@@ -0,0 +1,115 @@
+import pytest
+
+from flowter import Flow, Node
+
+from .utils import func_add
+
+
+def _identity(value: int) -> int:
+    return value
+
+
+def _build_diamond():
+    flow = Flow(name="diamond")
+    a = flow.add_node(Node(_identity, name="a"), src=flow.start_node)
+    b = flow.add_node(Node(_identity, name="b"), src=a)
+    c = flow.add_node(Node(_identity, name="c"), src=a)
+    d = flow.add_node(Node(_identity, name="d"), src=b, dst=flow.end_node)
+    c.add_next(d)
+    return flow, (a, b, c, d)
+
+
+def test_add_next_deduplicates_edges():
+    a = Node(func_add, name="a")
+    b = Node(func_add, name="b")
+    a.add_next(b)
+    a.add_next([b, b])
+    assert a.next_ == [b]
+    assert len({a, b, Node(func_add, name="a")}) == 3
+
+
+def test_add_next_after_direct_assignment():
+    a = Node(func_add, name="a")
+    b = Node(func_add, name="b")
+    a.next_ = [b]
+    a.add_next(b)
+    assert a.next_ == [b]
+
+
+def test_graph_indexes():
+    flow, (a, b, c, d) = _build_diamond()
+    graph = flow.graph
+    assert len(graph) == 6
+    assert graph.edge_count == 6
+    assert graph.find("d") is d
+    assert set(graph.get_predecessors(d)) == {b, c}
+    assert graph.successors(a) == [b, c]
+    assert graph.reachable(c) == [c, d, flow.end_node]
+    with pytest.raises(KeyError):
+        graph.find("missing")
+
+
+def test_graph_find_ambiguous_name():
+    flow = Flow(name="ambiguous")
+    flow.add_node(Node(_identity, name="same"), src=flow.start_node)
+    flow.add_node(Node(_identity, name="same"), src=flow.start_node)
+    with pytest.raises(ValueError):
+        flow.graph.find("same")
+
+
+def test_graph_topological_order():
+    flow, (a, b, c, d) = _build_diamond()
+    order = flow.graph.topological_order()
+    position = {node.id: i for i, node in enumerate(order)}
+    for src, dst in flow.graph.edges():
+        assert position[src.id] < position[dst.id]
+    assert not flow.graph.has_cycle()
+
+
+def test_graph_is_cached_until_topology_changes():
+    flow, (a, b, c, d) = _build_diamond()
+    graph = flow.graph
+    assert flow.graph is graph
+    d.add_next(a)
+    assert flow.graph is not graph
+    assert flow.graph.has_cycle()
+    assert [n.name for n in flow.graph.find_cycle()][-1] in ("a", "d")
+    with pytest.raises(ValueError, match="cycle"):
+        flow.graph.topological_order()
+
+
+def test_graph_includes_nodes_linked_outside_the_pool():
+    flow = Flow(name="linked")
+    a = flow.add_node(Node(_identity, name="a"), src=flow.start_node)
+    extra = Node(_identity, name="extra", next_=flow.end_node)
+    a.add_next(extra)
+    assert extra in flow.graph
+    assert flow.run(value=1)["extra"] == 1
+
+
+def test_large_flow_builds_and_runs():
+    flow = Flow(name="large")
+    src = flow.start_node
+    for i in range(3000):
+        src = flow.add_node(
+            Node(_identity, name=f"step-{i}", return_envelope="value"), src=src
+        )
+    flow.add_node(flow.end_node, src=src)
+    assert len(flow.graph.topological_order()) == 3002
+    assert flow.run(value=3)["value"] == 3
+
+
+def test_graph_cache_ignores_other_flows():
+    flow, (a, b, c, d) = _build_diamond()
+    graph = flow.graph
+    order = graph.topological_order()
+    other, _ = _build_diamond()
+    other.add_node(Node(_identity, name="e"), src=other.start_node)
+    assert flow.graph is graph
+    assert graph.topological_order() is order
+
+    # Linking a node outside the pool still shows up in this flow's graph.
+    e = Node(_identity, name="e")
+    d.add_next(e)
+    assert flow.graph is not graph
+    assert e in flow.graph
@@ -0,0 +1,117 @@
+import asyncio
+import gc
+import weakref
+
+from flowter import Flow, Fork, Merge, Node
+
+
+class Blob:
+    def __init__(self, size: int):
+        self.data = bytearray(size)
+
+
+def _decode(size: int) -> Blob:
+    return Blob(size)
+
+
+def _summarize(blob: Blob) -> int:
+    return len(blob.data)
+
+
+def _build(**flow_kwargs):
+    refs = []
+
+    def observe(summary: int) -> int:
+        gc.collect()
+        refs.append(all(ref() is None for ref in blobs))
+        return summary
+
+    blobs = []
+
+    def decode(size: int) -> Blob:
+        blob = _decode(size)
+        blobs.append(weakref.ref(blob))
+        return blob
+
+    flow = Flow(name="liveness", **flow_kwargs)
+    src = flow.add_node(
+        Node(decode, name="decode", return_envelope="blob"), src=flow.start_node
+    )
+    src = flow.add_node(
+        Node(_summarize, name="summarize", return_envelope="summary"), src=src
+    )
+    flow.add_node(
+        Node(observe, name="observe", return_envelope="report"),
+        src=src,
+        dst=flow.end_node,
+    )
+    return flow, refs
+
+
+def test_liveness_disabled_keeps_everything():
+    flow, freed = _build()
+    result = flow.run(size=1024)
+    assert freed == [False]
+    assert {"blob", "summary", "report"} <= set(result)
+
+
+def test_liveness_frees_dead_results():
+    flow, freed = _build(liveness=True, keep_keys=["report"])
+    result = flow.run(size=1024)
+    assert freed == [True]
+    assert result == {"report": 1024}
+
+
+def test_liveness_arun():
+    flow, freed = _build(liveness=True, keep_keys=["summary", "report"])
+    result = asyncio.run(flow.arun(size=16))
+    assert freed == [True]
+    assert result == {"summary": 16, "report": 16}
+
+
+def test_liveness_keeps_keys_for_var_keyword_consumers():
+    def collect(**kwargs) -> int:
+        return len(kwargs)
+
+    flow = Flow(name="var-keyword", liveness=True)
+    src = flow.add_node(
+        Node(_decode, name="decode", return_envelope="blob"), src=flow.start_node
+    )
+    src = flow.add_node(Node(collect, name="collect", return_envelope="count"), src=src)
+    flow.add_node(flow.end_node, src=src)
+    plan = flow.compile()
+    assert plan.by_id[src.id].live is None
+    assert plan.by_id[flow.end_node.id].live == frozenset()
+
+
+def test_liveness_across_branches_and_forks():
+    def left(blob: Blob) -> int:
+        return len(blob.data)
+
+    def right(size: int) -> int:
+        return size * 2
+
+    def join(left: int, right: int) -> int:
+        return left + right
+
+    flow = Flow(name="fork-liveness", liveness=True, keep_keys=["total"])
+    fork = flow.add_node(
+        Fork(_decode, name="decode", return_envelope="blob"), src=flow.start_node
+    )
+    merge = Merge(join, name="join", return_envelope="total")
+    flow.add_node(Node(left, name="left", return_envelope="left"), src=fork, dst=merge)
+    flow.add_node(
+        Node(right, name="right", return_envelope="right"), src=fork, dst=merge
+    )
+    flow.add_node(flow.end_node, src=merge)
+
+    plan = flow.compile()
+    assert plan.by_id[merge.id].live == frozenset({"left", "right", "total"})
+    assert flow.run(size=8) == {"total": 24}
+
+
+def test_liveness_recompiles_when_toggled():
+    flow, _ = _build()
+    assert not flow.compile().liveness
+    flow.liveness = True
+    assert flow.compile().liveness
@@ -0,0 +1,125 @@
+import array
+import gc
+import os
+
+import pytest
+
+from flowter import Flow, Node
+from flowter.executors import shutdown_process_pool, warm_up_process_pool
+from flowter.payloads import (
+    MmapPayloadStore,
+    PayloadHandle,
+    SharedMemoryPayloadStore,
+    call_with_payloads,
+)
+
+from .utils import func_checksum
+
+
+def _make_blob(size: int) -> bytes:
+    return bytes(range(256)) * (size // 256)
+
+
+@pytest.fixture(params=["shm", "mmap"])
+def store(request, tmp_path):
+    if request.param == "shm":
+        store = SharedMemoryPayloadStore(threshold=1024)
+    else:
+        store = MmapPayloadStore(directory=str(tmp_path), threshold=1024)
+    yield store
+    store.close()
+
+
+def _build(store, **node_kwargs):
+    seen = {}
+
+    def inspect_blob(blob) -> int:
+        seen["type"] = type(blob)
+        return len(blob)
+
+    flow = Flow(name="payloads", payload_store=store)
+    make = flow.add_node(
+        Node(_make_blob, name="make", return_envelope="blob"), src=flow.start_node
+    )
+    size = flow.add_node(Node(inspect_blob, name="size", return_envelope="n"), src=make)
+    flow.add_node(
+        Node(func_checksum, name="checksum", return_envelope="checksum", **node_kwargs),
+        src=size,
+        dst=flow.end_node,
+    )
+    return flow, seen
+
+
+def test_large_results_are_offloaded_and_resolved_zero_copy(store):
+    flow, seen = _build(store)
+    result = flow.run(size=4096)
+    assert isinstance(result["blob"], PayloadHandle)
+    assert seen["type"] is memoryview
+    assert result["n"] == 4096
+    assert result["checksum"] == func_checksum(_make_blob(4096))
+    assert bytes(result["blob"].resolve()) == _make_blob(4096)
+
+
+def test_small_results_stay_inline(store):
+    flow, seen = _build(store)
+    result = flow.run(size=512)
+    assert isinstance(result["blob"], bytes)
+    assert seen["type"] is bytes
+
+
+def test_segments_are_released_at_run_end(store):
+    flow, _ = _build(store)
+    flow.keep_keys = frozenset({"checksum"})
+    flow.liveness = True
+    assert set(flow.run(size=4096)) == {"checksum"}
+    assert len(store) == 0
+
+    flow.liveness = False
+    result = flow.run(size=4096)
+    assert len(store) == 1
+    del result
+    gc.collect()
+    assert len(store) == 0
+
+
+def test_segments_are_released_on_error(store):
+    def fail(blob):
+        raise RuntimeError("boom")
+
+    flow = Flow(name="payload-error", payload_store=store)
+    make = flow.add_node(
+        Node(_make_blob, name="make", return_envelope="blob"), src=flow.start_node
+    )
+    flow.add_node(Node(fail, name="fail"), src=make)
+    with pytest.raises(RuntimeError):
+        flow.run(size=4096)
+    gc.collect()
+    assert len(store) == 0
+
+
+def test_buffer_format_is_preserved(store):
+    values = array.array("d", range(1024))
+    handle = store.put(memoryview(values), run_id="manual")
+    view = handle.resolve()
+    assert view.format == "d"
+    assert view.tolist() == values.tolist()
+    assert call_with_payloads(sum, (handle,), {}) == sum(values)
+    del view
+    store.end_run("manual", {})
+    assert len(store) == 0
+    with pytest.raises(LookupError):
+        handle.resolve()
+
+
+def test_process_nodes_attach_in_worker(store):
+    warm_up_process_pool(max_workers=1)
+    try:
+        flow, _ = _build(store, executor="process")
+        result = flow.run(size=8192)
+        assert result["checksum"] == func_checksum(_make_blob(8192))
+    finally:
+        shutdown_process_pool()
+    if isinstance(store, MmapPayloadStore):
+        del result
+        gc.collect()
+        assert os.listdir(store.directory) == []
@@ -0,0 +1,68 @@
+import pytest
+
+from flowter import Flow, Fork, Merge, Node
+from flowter.executors import (
+    get_process_pool,
+    shutdown_process_pool,
+    warm_up_process_pool,
+)
+
+from .utils import func_sum_of_squares
+
+
+@pytest.fixture(scope="module", autouse=True)
+def process_pool():
+    yield warm_up_process_pool(max_workers=2)
+    shutdown_process_pool()
+
+
+def test_process_node_runs_in_worker(process_pool):
+    flow = Flow()
+    fork = Fork(lambda: None, name="fork")
+    merge = Merge(
+        lambda left, right: left + right, name="merge", return_envelope="total"
+    )
+    flow.add_node(fork, src=flow.start_node)
+    for name in ("left", "right"):
+        flow.add_node(
+            Node(
+                func_sum_of_squares, name=name, return_envelope=name, executor="process"
+            ),
+            src=fork,
+            dst=merge,
+        )
+
+    result = flow.run(n=1000)
+    assert result["total"] == 2 * func_sum_of_squares(1000)
+    assert flow.run(n=10)["total"] == 2 * func_sum_of_squares(10)
+    assert get_process_pool() is process_pool
+
+
+def test_process_node_pickling_error():
+    def local_func(n: int) -> int:
+        return n
+
+    flow = Flow()
+    flow.add_node(
+        Node(local_func, name="local_func", executor="process"), src=flow.start_node
+    )
+    with pytest.raises(TypeError, match="function"):
+        flow.run(n=1)
+
+    flow = Flow()
+    flow.add_node(
+        Node(func_sum_of_squares, name="sum", executor="process"), src=flow.start_node
+    )
+    with pytest.raises(TypeError, match="positional argument 0"):
+        flow.run(n=(lambda: 1))
+
+
+def test_process_pool_size_is_fixed_once_created(process_pool):
+    assert get_process_pool(max_workers=2) is process_pool
+    with pytest.raises(ValueError, match="shutdown_process_pool"):
+        get_process_pool(max_workers=3)
+    with pytest.raises(ValueError, match="shutdown_process_pool"):
+        warm_up_process_pool(max_workers=1)
+    with pytest.raises(ValueError, match="positive"):
+        get_process_pool(max_workers=0)
+    assert get_process_pool() is process_pool
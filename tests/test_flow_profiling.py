@@ -0,0 +1,206 @@
+import asyncio
+import json
+import os
+import threading
+
+import pytest
+
+from flowter import Condition, Flow, Fork, Merge, Node, flow
+from flowter.profiling import ExecutionStats, MemoryProfiler, SpanRecorder, deep_sizeof
+
+
+def load(size: int) -> int:
+    return size
+
+
+def is_small(size: int) -> bool:
+    return size < 10
+
+
+def report(size: int) -> str:
+    return f"size={size}"
+
+
+def join(**kwargs) -> int:
+    return len(kwargs)
+
+
+def build_flow(recorder: SpanRecorder) -> Flow:
+    flow = Flow(name="sized", hooks=[recorder])
+    node_1 = flow.add_node(
+        Node(load, name="load", return_envelope="size"), src=flow.start_node
+    )
+    flow.add_node(
+        Node(report, name="report", return_envelope="report"),
+        src=node_1,
+        src_condition_node=Condition(is_small, name="is_small"),
+        dst=flow.end_node,
+    )
+    return flow
+
+
+def _kinds(recorder: SpanRecorder, name: str):
+    return {span.kind for span in recorder.spans if span.name == name}
+
+
+def test_spans_cover_nodes_conditions_and_binding():
+    recorder = SpanRecorder()
+    assert build_flow(recorder).run(size=3)["report"] == "size=3"
+
+    assert _kinds(recorder, "sized") == {"run"}
+    assert _kinds(recorder, "load") == {"node", "bind"}
+    assert "condition" in _kinds(recorder, "is_small")
+    assert len({span.run_id for span in recorder.spans}) == 1
+    for span in recorder.spans:
+        assert span.end_ns >= span.start_ns
+        assert (span.pid, span.tid) == (os.getpid(), threading.get_ident())
+    report_span = next(
+        s for s in recorder.spans if s.name == "report" and s.kind == "node"
+    )
+    assert report_span.stack == ("sized",)
+
+
+def test_chrome_trace_export():
+    recorder = SpanRecorder()
+    build_flow(recorder).run(size=3)
+    trace = json.loads(json.dumps(recorder.to_chrome_trace()))
+    events = trace["traceEvents"]
+    assert len(events) == len(recorder.spans)
+    assert all(event["ph"] == "X" and event["dur"] >= 0 for event in events)
+    run_event = next(e for e in events if e["cat"] == "run")
+    node_event = next(e for e in events if e["name"] == "report" and e["cat"] == "node")
+    # Node events nest inside the run event on the timeline.
+    assert run_event["ts"] <= node_event["ts"]
+    assert node_event["ts"] + node_event["dur"] <= run_event["ts"] + run_event["dur"]
+
+
+def test_collapsed_stacks_use_self_time():
+    recorder = SpanRecorder()
+    build_flow(recorder).run(size=3)
+    lines = recorder.to_collapsed().splitlines()
+    stacks = {line.rsplit(" ", 1)[0]: int(line.rsplit(" ", 1)[1]) for line in lines}
+    assert "sized;load" in stacks
+    assert "sized;condition:is_small" in stacks
+    total = sum(stacks.values())
+    run_span = next(s for s in recorder.spans if s.kind == "run")
+    assert total <= run_span.end_ns - run_span.start_ns
+
+
+def test_forked_branches_keep_their_own_stack():
+    recorder = SpanRecorder()
+    flow = Flow(name="forked", hooks=[recorder])
+    fork = flow.add_node(
+        Fork(load, name="fan", return_envelope="size"), src=flow.start_node
+    )
+    merge = Merge(join, name="join", return_envelope="joined")
+    for i in range(3):
+        flow.add_node(
+            Node(report, name=f"branch_{i}", return_envelope=f"b{i}"),
+            src=fork,
+            dst=merge,
+        )
+    flow.add_node(merge, dst=flow.end_node)
+    flow.run(size=1)
+    asyncio.run(flow.arun(size=1))
+    branches = [
+        s for s in recorder.spans if s.kind == "node" and s.name.startswith("branch_")
+    ]
+    assert len(branches) == 6
+    assert all(span.stack == ("forked",) for span in branches)
+
+
+def test_sampling():
+    recorder = SpanRecorder(sample_rate=0.0)
+    flow = build_flow(recorder)
+    for _ in range(20):
+        flow.run(size=3)
+    assert not recorder.spans
+    # Unsampled runs get no hooks at all and take the untraced path.
+    assert flow.compile().new_run((), {}).hooks == ()
+
+    recorder = SpanRecorder(sample_rate=0.5)
+    flow = build_flow(recorder)
+    for _ in range(200):
+        flow.run(size=3)
+    runs = {span.run_id for span in recorder.spans}
+    assert 40 < len(runs) < 160
+
+    for hook in (SpanRecorder, ExecutionStats, MemoryProfiler):
+        with pytest.raises(ValueError):
+            hook(sample_rate=1.5)
+        with pytest.raises(ValueError):
+            hook(sample_rate=-0.1)
+        assert not hook(sample_rate=0.0).sample()
+
+
+def test_flow_decorator_records_spans(capsys):
+    recorder = SpanRecorder(max_spans=2)
+
+    @flow(recorder=recorder)
+    def work(x: int) -> int:
+        return x * 2
+
+    assert work(2) == 4
+    assert capsys.readouterr().out == ""
+    assert [(span.name, span.kind) for span in recorder.spans] == [("work", "call")]
+    for _ in range(5):
+        work(1)
+    assert len(recorder.spans) == 2
+
+    @flow()
+    def quiet(x: int) -> int:
+        return x
+
+    quiet(1)
+    assert "quiet took" in capsys.readouterr().out
+
+
+def allocate(n: int) -> list:
+    scratch = [bytearray(1024) for _ in range(n)]
+    del scratch
+    return list(range(n))
+
+
+def summarize(numbers: list) -> int:
+    return sum(numbers)
+
+
+def test_memory_profiler_ranks_nodes():
+    profiler = MemoryProfiler()
+    flow = Flow(name="memory", hooks=[profiler])
+    flow.add_nodes(
+        [
+            Node(allocate, name="allocate", return_envelope="numbers"),
+            Node(summarize, name="summarize", return_envelope="total"),
+        ],
+        src=flow.start_node,
+        dst=flow.end_node,
+        chain=True,
+    )
+    try:
+        assert flow.run(n=2000)["total"] == sum(range(2000))
+    finally:
+        profiler.close()
+
+    allocate_stats = profiler.nodes["allocate"]
+    assert allocate_stats.calls == 1
+    # The scratch buffers were freed, but they still show up in the peak.
+    assert allocate_stats.peak > 2000 * 1024 > allocate_stats.retained
+    assert allocate_stats.result_size >= deep_sizeof(list(range(2000)))
+    assert profiler.value_sizes["total"] == deep_sizeof(sum(range(2000)))
+    assert profiler.run_peak >= allocate_stats.peak
+    assert profiler.ranking()[0].name == "allocate"
+    assert profiler.ranking("result_size")[0].name == "allocate"
+
+    report = profiler.report(limit=1).splitlines()
+    assert report[0].split() == ["node", "calls", "peak", "retained", "result"]
+    assert report[1].startswith("allocate") and "MiB" in report[1]
+    assert report[-1].startswith("run peak:")
+    with pytest.raises(ValueError):
+        profiler.ranking("name")
+
+
+def test_deep_sizeof_counts_shared_objects_once():
+    item = "x" * 1000
+    assert deep_sizeof([item, item]) < 2 * deep_sizeof(item)
+    assert deep_sizeof({"a": [1, 2, 3]}) > deep_sizeof({})
@@ -0,0 +1,187 @@
+import asyncio
+import itertools
+import threading
+import time
+
+import pytest
+
+from flowter import Flow, Node
+from flowter.resources import ResourcePool, ResourceTimeoutError
+
+
+class Session:
+    _ids = itertools.count(1)
+
+    def __init__(self):
+        self.id = next(self._ids)
+        self.closed = False
+        self.calls = 0
+
+    def get(self, user_id: int) -> str:
+        self.calls += 1
+        return f"user-{user_id}"
+
+
+def fetch(session: Session, user_id: int) -> str:
+    return session.get(user_id)
+
+
+def fetch_keyword(user_id: int, *, session: Session) -> int:
+    return session.id
+
+
+def _flow(func=fetch, **pool_options) -> Flow:
+    flow = Flow(name="resources")
+    flow.add_resource("session", Session, close=_close, **pool_options)
+    flow.add_node(
+        Node(func, name="fetch", return_envelope="user"),
+        src=flow.start_node,
+        dst=flow.end_node,
+    )
+    return flow
+
+
+def _close(session: Session):
+    session.closed = True
+
+
+def test_instances_are_injected_and_reused():
+    flow = _flow()
+    assert flow.run(user_id=1)["user"] == "user-1"
+    assert flow.run(user_id=2)["user"] == "user-2"
+    stats = flow.resources["session"].stats
+    assert (stats["created"], stats["reused"], stats["in_use"]) == (1, 1, 0)
+
+    flow = _flow(fetch_keyword)
+    first = flow.run(user_id=1)["user"]
+    assert flow.run(user_id=1)["user"] == first
+
+
+def test_concurrency_is_limited_per_resource():
+    active = []
+    peak = []
+    lock = threading.Lock()
+
+    def slow_fetch(session: Session, user_id: int) -> int:
+        with lock:
+            active.append(session)
+            peak.append(len(active))
+        time.sleep(0.02)
+        with lock:
+            active.remove(session)
+        return session.id
+
+    flow = _flow(slow_fetch, max_size=2)
+    threads = [
+        threading.Thread(target=flow.run, kwargs={"user_id": i}) for i in range(6)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    stats = flow.resources["session"].stats
+    assert max(peak) <= 2
+    assert stats["created"] <= 2 and stats["waits"] >= 1
+
+
+def test_lifecycle_hooks():
+    resets = []
+    flow = _flow(validate=lambda s: s.calls < 2, reset=resets.append)
+    pool = flow.resources["session"]
+    first = pool.acquire()
+    pool.release(first)
+    flow.run(user_id=1)
+    flow.run(user_id=1)
+    # The instance failed validation after two calls and was replaced.
+    assert flow.run(user_id=1)["user"] == "user-1"
+    assert first.closed
+    assert pool.stats["created"] == 2
+    assert len(resets) == 4
+
+    flow.close_resources()
+    assert pool.stats["size"] == 0
+    with pytest.raises(RuntimeError, match="closed"):
+        flow.run(user_id=1)
+
+
+def test_failed_calls_discard_the_instance():
+    def broken(session: Session, user_id: int) -> str:
+        raise ConnectionError("reset by peer")
+
+    flow = _flow(broken)
+    with pytest.raises(ConnectionError):
+        flow.run(user_id=1)
+    stats = flow.resources["session"].stats
+    assert (stats["discarded"], stats["size"]) == (1, 0)
+
+
+def test_waiting_for_an_instance_times_out():
+    flow = _flow(max_size=1, acquire_timeout=0.05)
+    held = flow.resources["session"].acquire()
+    with pytest.raises(ResourceTimeoutError):
+        flow.run(user_id=1)
+
+    flow.resources["session"].acquire_timeout = None
+    flow.timeout = 0.05
+    with pytest.raises(TimeoutError):
+        flow.run(user_id=1)
+    flow.resources["session"].release(held)
+    assert flow.run(user_id=1)["user"] == "user-1"
+
+
+def test_pools_are_shared_between_flows_and_modes():
+    pool = ResourcePool("session", Session)
+    first = Flow(name="first")
+    second = Flow(name="second", dataflow=True)
+    for flow in (first, second):
+        flow.add_resource(pool)
+        flow.add_node(
+            Node(fetch, name="fetch", return_envelope="user"),
+            src=flow.start_node,
+            dst=flow.end_node,
+        )
+    assert first.run(user_id=1)["user"] == "user-1"
+    assert second.run(user_id=2)["user"] == "user-2"
+    assert asyncio.run(first.arun(user_id=3))["user"] == "user-3"
+    assert asyncio.run(second.arun(user_id=4))["user"] == "user-4"
+    assert pool.stats["created"] == 1
+
+
+def test_resource_names_are_reserved():
+    flow = Flow(name="clash")
+    flow.add_resource("session", Session)
+    flow.add_node(
+        Node(fetch, name="fetch", return_envelope="session"),
+        src=flow.start_node,
+        dst=flow.end_node,
+    )
+    with pytest.raises(ValueError, match="resource"):
+        flow.run(user_id=1)
+    with pytest.raises(ValueError):
+        flow.add_resource("not-an-identifier", Session)
+    with pytest.raises(ValueError):
+        flow.add_resource("session")
+
+
+def test_cancelled_async_acquire_returns_the_instance():
+    pool = ResourcePool("session", Session, max_size=1)
+    held = pool.acquire()
+
+    async def cancel_waiter():
+        waiter = asyncio.ensure_future(pool.aacquire())
+        await asyncio.sleep(0.02)
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        pool.release(held)
+        # The blocking acquire still completes and must give its slot back.
+        for _ in range(100):
+            if pool.stats["in_use"] == 0:
+                break
+            await asyncio.sleep(0.01)
+
+    asyncio.run(cancel_waiter())
+    assert pool.stats["in_use"] == 0
+    instance = pool.try_acquire()
+    assert instance is not None
+    pool.release(instance)
@@ -0,0 +1,131 @@
+import threading
+import time
+
+import pytest
+
+from flowter import Flow, Fork, Merge, Node, Switch
+from flowter.cache import LRUCache
+from flowter.runner import FlowRunner, RunnerClosedError
+
+
+def _double(value: int) -> int:
+    return value * 2
+
+
+def _build():
+    flow = Flow(name="concurrent")
+    cache = LRUCache(maxsize=16)
+    fork = flow.add_node(
+        Fork(_double, name="double", return_envelope="doubled"), src=flow.start_node
+    )
+    merge = Merge(lambda left, right: left + right, name="merge", return_envelope="sum")
+    flow.add_node(
+        Node(lambda doubled: doubled + 1, name="left", return_envelope="left"),
+        src=fork,
+        dst=merge,
+    )
+    flow.add_node(
+        Node(
+            lambda value: value % 7, name="right", return_envelope="right", cache=cache
+        ),
+        src=fork,
+        dst=merge,
+    )
+    switch = flow.add_node(
+        Switch(lambda sum: sum % 2, name="parity", return_envelope="parity"), src=merge
+    )
+    switch.add_case(
+        0, flow.add_node(Node(lambda: "even", name="even"), dst=flow.end_node)
+    )
+    switch.add_case(
+        1, flow.add_node(Node(lambda: "odd", name="odd"), dst=flow.end_node)
+    )
+    return flow, cache
+
+
+def _expected_sum(value: int) -> int:
+    return value * 2 + 1 + value % 7
+
+
+def test_flow_is_safe_to_run_concurrently():
+    flow, cache = _build()
+    errors = []
+
+    def worker(offset: int):
+        for value in range(offset, offset + 200):
+            result = flow.run(value=value)
+            expected = _expected_sum(value)
+            if result["sum"] != expected or result["parity"] != expected % 2:
+                errors.append((value, result))
+
+    threads = [threading.Thread(target=worker, args=(i * 200,)) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+    assert cache.hits + cache.misses == 8 * 200
+
+
+def test_runner_futures_and_stats():
+    flow, _ = _build()
+    with FlowRunner(flow, max_workers=4, max_queue=8) as runner:
+        futures = [runner.submit(value=v) for v in range(50)]
+        assert [f.result()["sum"] for f in futures] == [
+            _expected_sum(v) for v in range(50)
+        ]
+        stats = runner.stats
+    assert stats["submitted"] == stats["completed"] == 50
+    assert stats["failed"] == 0
+    assert stats["in_flight"] == 0
+
+
+def test_runner_map_ordered_and_unordered():
+    flow, _ = _build()
+    inputs = [{"value": v} for v in range(100)]
+    with FlowRunner(flow, max_workers=4, max_queue=4) as runner:
+        ordered = [r["sum"] for r in runner.map(inputs)]
+        unordered = [r["sum"] for r in runner.map(iter(inputs), ordered=False)]
+    expected = [_expected_sum(v) for v in range(100)]
+    assert ordered == expected
+    assert sorted(unordered) == sorted(expected)
+
+
+def test_runner_queue_limit_and_depth():
+    release = threading.Event()
+    flow = Flow(name="blocked")
+    flow.add_node(Node(lambda: release.wait(5), name="wait"), src=flow.start_node)
+    runner = FlowRunner(flow, max_workers=1, max_queue=2)
+    try:
+        first = runner.submit()
+        deadline = time.monotonic() + 5
+        while runner.in_flight != 1 and time.monotonic() < deadline:
+            time.sleep(0.001)
+        assert runner.try_submit() is not None
+        assert runner.try_submit() is not None
+        assert runner.try_submit() is None
+        assert runner.queue_depth == 2
+        assert runner.in_flight == 1
+    finally:
+        release.set()
+        runner.shutdown()
+    assert first.result()["wait"] is True
+
+    for max_queue in (0, -1):
+        with pytest.raises(ValueError, match="max_queue"):
+            FlowRunner(flow, max_workers=1, max_queue=max_queue)
+
+
+def test_runner_propagates_errors_and_closes():
+    def fail(value: int):
+        raise ValueError(value)
+
+    flow = Flow(name="failing")
+    flow.add_node(Node(fail, name="fail"), src=flow.start_node)
+    runner = FlowRunner(flow, max_workers=2)
+    with pytest.raises(ValueError):
+        runner.submit(value=1).result()
+    runner.shutdown()
+    assert runner.stats["failed"] == 1
+    with pytest.raises(RunnerClosedError):
+        runner.submit(value=2)
@@ -0,0 +1,157 @@
+import json
+
+import pytest
+
+import flowter
+from flowter import BatchNode, Condition, Flow, Fork, Merge, Node, Switch
+from flowter.broker import load_flow
+from flowter.cache import LRUCache
+from flowter.serialize import dump, dumps, flow_to_dict, load, loads
+
+
+def parse(text: str, scale: int = 2) -> int:
+    return len(text) * scale
+
+
+def is_long(parsed: int) -> bool:
+    return parsed > 10
+
+
+def left(parsed: int) -> int:
+    return parsed + 1
+
+
+def right(parsed: int) -> int:
+    return parsed - 1
+
+
+def join(left: int, right: int) -> int:
+    return left + right
+
+
+def parity(joined: int) -> int:
+    return joined % 2
+
+
+def even(joined: int) -> str:
+    return f"even:{joined}"
+
+
+def odd(joined: int) -> str:
+    return f"odd:{joined}"
+
+
+def short(parsed: int) -> str:
+    return "short"
+
+
+def squares(items):
+    return [item * item for item in items]
+
+
+def build(**flow_kwargs) -> Flow:
+    flow = Flow(name="serializable", **flow_kwargs)
+    first = flow.add_node(
+        Node(parse, name="parse", return_envelope="parsed"), src=flow.start_node
+    )
+    fork = flow.add_node(
+        Fork(lambda_free_identity, name="fork", max_workers=2),
+        src=first,
+        src_condition_node=Condition(is_long, name="is_long"),
+    )
+    flow.add_node(
+        Node(short, name="short", return_envelope="label"),
+        src=first,
+        dst=flow.end_node,
+    )
+    merge = Merge(join, name="join", return_envelope="joined")
+    flow.add_node(Node(left, name="left", return_envelope="left"), src=fork, dst=merge)
+    flow.add_node(
+        Node(right, name="right", return_envelope="right", executor="thread"),
+        src=fork,
+        dst=merge,
+    )
+    switch = flow.add_node(Switch(parity, name="parity"), src=merge)
+    switch.add_case(0, flow.add_node(Node(even, name="even", return_envelope="label")))
+    switch.set_default(flow.add_node(Node(odd, name="odd", return_envelope="label")))
+    for node in switch.next_:
+        node.add_next(flow.end_node)
+    return flow
+
+
+def lambda_free_identity(parsed: int) -> int:
+    return parsed
+
+
+@pytest.mark.parametrize("binary", [False, True])
+@pytest.mark.parametrize("include_plan", [False, True])
+def test_round_trip(binary, include_plan):
+    flow = build()
+    loaded = loads(dumps(flow, binary=binary, include_plan=include_plan))
+    assert loaded.name == flow.name
+    assert len(loaded.graph) == len(flow.graph)
+    for text in ("hi", "hello world", "hello worlds!"):
+        expected = flow.run(text=text)
+        result = loaded.run(text=text)
+        assert result["label"] == expected["label"]
+
+
+def test_json_is_plain_data():
+    data = json.loads(dumps(build(), include_plan=True))
+    kinds = {node["name"]: node["kind"] for node in data["nodes"]}
+    assert kinds["fork"] == "fork"
+    assert kinds["parity"] == "switch"
+    assert kinds["is_long"] == "condition"
+    assert data["plan"]["steps"][0]["params"] is not None
+
+
+def test_plan_snapshot_skips_signature_inspection(monkeypatch):
+    payload = dumps(build(liveness=True, keep_keys=["label"]), include_plan=True)
+
+    def fail(func):
+        raise AssertionError(f"signature of {func} was inspected")
+
+    monkeypatch.setattr(flowter, "signature_of", fail)
+    loaded = loads(payload)
+    assert loaded.run(text="hello world") == {"label": "even:44"}
+
+
+def test_batch_node_round_trip():
+    flow = Flow(name="batched")
+    flow.add_node(
+        BatchNode(squares, name="squares", max_batch_size=4, return_envelope="sq"),
+        src=flow.start_node,
+        dst=flow.end_node,
+    )
+    loaded = loads(dumps(flow, binary=True))
+    node = loaded.graph.find("squares")
+    assert node.batcher.max_batch_size == 4
+    assert loaded.run(items=3)["sq"] == 9
+
+
+def test_unserializable_nodes():
+    flow = Flow(name="bad")
+    flow.add_node(Node(lambda: 1, name="anonymous"), src=flow.start_node)
+    with pytest.raises(ValueError, match="import path"):
+        dumps(flow)
+
+    flow = Flow(name="cached")
+    flow.add_node(Node(parse, name="parse", cache=LRUCache()), src=flow.start_node)
+    with pytest.raises(ValueError, match="cache"):
+        flow_to_dict(flow)
+
+    flow = Flow(name="tuple-keys")
+    switch = flow.add_node(Switch(parity, name="parity"), src=flow.start_node)
+    switch.add_case((1, 2), Node(even, name="even"))
+    with pytest.raises(ValueError, match="binary"):
+        dumps(flow)
+    assert (1, 2) in loads(dumps(flow, binary=True)).graph.find("parity").cases
+
+
+def test_dump_load_files(tmp_path):
+    flow = build()
+    for binary in (False, True):
+        path = str(tmp_path / f"flow-{binary}.flow")
+        dump(flow, path, binary=binary, include_plan=True)
+        assert load(path).run(text="hello world")["label"] == "even:44"
+        assert load_flow(path).name == flow.name
@@ -0,0 +1,137 @@
+import gc
+import time
+from typing import Iterator, Text
+
+import pytest
+
+from flowter import Flow, Node
+from flowter.payloads import SharedMemoryPayloadStore
+
+
+def build_stream_flow(produced: list) -> Flow:
+    def read_lines(count: int) -> Iterator[Text]:
+        for i in range(count):
+            produced.append(i)
+            yield f"line {i}"
+
+    def parse(line: Text) -> int:
+        return int(line.split()[1])
+
+    def square(number: int) -> int:
+        return number * number
+
+    def is_even(square: int) -> bool:
+        return square % 2 == 0
+
+    def label_even(square: int) -> Text:
+        return f"even:{square}"
+
+    def label_odd(square: int) -> Text:
+        return f"odd:{square}"
+
+    flow = Flow(stream_buffer_size=2)
+    node_1 = flow.add_node(
+        Node(read_lines, name="read_lines", return_envelope="line"),
+        src=flow.start_node,
+    )
+    node_2 = flow.add_node(
+        Node(parse, name="parse", return_envelope="number"), src=node_1
+    )
+    node_3 = flow.add_node(
+        Node(square, name="square", return_envelope="square"), src=node_2
+    )
+    flow.add_node(
+        Node(label_even, name="label_even", return_envelope="label"),
+        src=node_3,
+        src_condition_node=is_even,
+        dst=flow.end_node,
+    )
+    flow.add_node(
+        Node(label_odd, name="label_odd", return_envelope="label"),
+        src=node_3,
+        dst=flow.end_node,
+    )
+    return flow
+
+
+def test_flow_stream_item_by_item():
+    produced = []
+    flow = build_stream_flow(produced)
+
+    results = list(flow.stream(count=10))
+    assert [r["label"] for r in results] == [
+        f"even:{i * i}" if i % 2 == 0 else f"odd:{i * i}" for i in range(10)
+    ]
+    assert results[3]["line"] == "line 3"
+    assert "end" in results[3]
+
+
+def test_flow_stream_backpressure():
+    produced = []
+    flow = build_stream_flow(produced)
+
+    stream = flow.stream(count=10_000)
+    first = next(stream)
+    assert first["number"] == 0
+    time.sleep(0.2)
+    # Bounded queues between stages stop the source from running ahead.
+    assert len(produced) < 50
+    stream.close()
+
+
+def test_flow_stream_propagates_errors():
+    def numbers():
+        yield 1
+        yield 0
+
+    flow = Flow()
+    node_1 = flow.add_node(
+        Node(numbers, name="numbers", return_envelope="n"), src=flow.start_node
+    )
+    flow.add_node(Node(lambda n: 1 / n, name="invert"), src=node_1)
+
+    stream = flow.stream()
+    assert next(stream)["invert"] == 1
+    with pytest.raises(ZeroDivisionError):
+        next(stream)
+
+
+def test_flow_stream_resolves_and_frees_payloads():
+    seen = []
+
+    def make_header(size: int) -> bytes:
+        return b"h" * size
+
+    def read_chunks(header: bytes) -> Iterator[bytes]:
+        seen.append(type(header).__name__)
+        for i in range(3):
+            yield bytes([i]) * len(header)
+
+    def measure(chunk: bytes) -> int:
+        seen.append(type(chunk).__name__)
+        return len(chunk)
+
+    store = SharedMemoryPayloadStore(threshold=1024)
+    flow = Flow(payload_store=store)
+    node_1 = flow.add_node(
+        Node(make_header, name="make_header", return_envelope="header"),
+        src=flow.start_node,
+    )
+    node_2 = flow.add_node(
+        Node(read_chunks, name="read_chunks", return_envelope="chunk"), src=node_1
+    )
+    flow.add_node(
+        Node(measure, name="measure", return_envelope="n"),
+        src=node_2,
+        dst=flow.end_node,
+    )
+    try:
+        results = list(flow.stream(size=4096))
+        assert seen == ["memoryview"] * 4
+        assert [r["n"] for r in results] == [4096] * 3
+        assert bytes(results[2]["chunk"].resolve()) == b"\x02" * 4096
+        del results
+        gc.collect()
+        assert len(store) == 0
+    finally:
+        store.close()
@@ -0,0 +1,260 @@
+import asyncio
+
+import pytest
+
+from flowter import Flow, Node, Subflow, Switch
+from flowter.serialize import dumps, loads
+
+
+def authenticate(token: str) -> str:
+    return f"user-{token}"
+
+
+def enrich(user: str) -> str:
+    return f"{user}!"
+
+
+def is_admin(user: str) -> bool:
+    return user.endswith("admin")
+
+
+def grant(user: str) -> str:
+    return "all"
+
+
+def report(enriched: str, user: str) -> str:
+    return f"{enriched}|{user}"
+
+
+def _auth_flow() -> Flow:
+    flow = Flow(name="auth")
+    flow.add_nodes(
+        [
+            Node(authenticate, name="authenticate", return_envelope="user"),
+            Node(enrich, name="enrich", return_envelope="enriched"),
+        ],
+        src=flow.start_node,
+        dst=flow.end_node,
+        chain=True,
+    )
+    return flow
+
+
+def _parent(sub: Flow, **subflow_kwargs) -> Flow:
+    flow = Flow(name="parent")
+    node = flow.add_node(Subflow(sub, **subflow_kwargs), src=flow.start_node)
+    flow.add_node(
+        Node(report, name="report", return_envelope="report"),
+        src=node,
+        dst=flow.end_node,
+    )
+    return flow
+
+
+def _step_names(flow: Flow):
+    return {step.node.name for step in flow.compile().steps}
+
+
+def test_merged_subflow_is_inlined():
+    flow = _parent(_auth_flow(), return_envelope=False)
+    assert _step_names(flow) == {"start", "authenticate", "enrich", "report", "end"}
+    result = flow.run(token="t")
+    assert result["report"] == "user-t!|user-t"
+    nested = _parent(_auth_flow(), return_envelope=False, inline=False)
+    assert "auth" in _step_names(nested)
+    assert nested.run(token="t") == result
+
+
+def test_scoped_subflow_keeps_its_own_result():
+    flow = Flow(name="scoped")
+    flow.add_node(_auth_flow(), src=flow.start_node, dst=flow.end_node)
+    result = flow.run(token="t")
+    assert result["auth"] == {"user": "user-t", "enriched": "user-t!"}
+    assert "user" not in result
+
+
+def test_subflow_used_in_several_flows():
+    auth = _auth_flow()
+    first = _parent(auth, return_envelope=False)
+    second = _parent(auth, return_envelope=False)
+    assert first.run(token="a")["report"] == "user-a!|user-a"
+    assert second.run(token="b")["report"] == "user-b!|user-b"
+    assert auth.run(token="c")["enriched"] == "user-c!"
+
+
+def test_nested_subflows_are_inlined_recursively():
+    inner = _auth_flow()
+    middle = Flow(name="middle")
+    middle.add_node(
+        Subflow(inner, return_envelope=False),
+        src=middle.start_node,
+        dst=middle.end_node,
+    )
+    flow = _parent(middle, return_envelope=False)
+    assert "authenticate" in _step_names(flow)
+    assert flow.run(token="n")["report"] == "user-n!|user-n"
+
+
+def test_routing_inside_an_inlined_subflow():
+    sub = Flow(name="roles")
+    user = sub.add_node(
+        Node(authenticate, name="authenticate", return_envelope="user"),
+        src=sub.start_node,
+    )
+    sub.add_node(
+        Node(grant, name="grant", return_envelope="grants"),
+        src=user,
+        src_condition_node=is_admin,
+        dst=sub.end_node,
+    )
+    sub.add_node(Node(enrich, name="enrich", return_envelope="enriched"), src=user)
+    flow = Flow(name="parent")
+    flow.add_node(
+        Subflow(sub, return_envelope=False), src=flow.start_node, dst=flow.end_node
+    )
+    assert "authenticate" in _step_names(flow)
+    assert flow.run(token="admin")["grants"] == "all"
+    result = flow.run(token="bob")
+    assert "grants" not in result and result["enriched"] == "user-bob!"
+
+
+def test_switch_cases_can_target_subflows():
+    flow = Flow(name="switched")
+    switch = flow.add_node(
+        Switch(lambda token: token[0], name="kind", return_envelope="kind"),
+        src=flow.start_node,
+    )
+    sub = flow.add_node(Subflow(_auth_flow(), return_envelope=False), dst=flow.end_node)
+    switch.add_case("a", sub)
+    switch.set_default(flow.end_node)
+    assert flow.run(token="abc")["enriched"] == "user-abc!"
+    assert "enriched" not in flow.run(token="xyz")
+
+
+def test_async_and_liveness_with_subflows():
+    flow = _parent(_auth_flow(), return_envelope=False)
+    assert asyncio.run(flow.arun(token="x"))["report"] == "user-x!|user-x"
+
+    flow = Flow(name="scoped")
+    flow.add_node(_auth_flow(), src=flow.start_node, dst=flow.end_node)
+    assert asyncio.run(flow.arun(token="x"))["auth"]["user"] == "user-x"
+
+    flow = _parent(_auth_flow(), return_envelope=False)
+    flow.liveness = True
+    flow.keep_keys = frozenset({"report"})
+    assert flow.run(token="l") == {"report": "user-l!|user-l"}
+
+
+def test_subflow_needs_a_flow():
+    with pytest.raises(ValueError):
+        Subflow(authenticate)
+
+
+def test_subflows_survive_serialization():
+    flow = _parent(_auth_flow(), return_envelope=False)
+    loaded = loads(dumps(flow, include_plan=True))
+    assert loaded.run(token="s") == flow.run(token="s")
+    assert "authenticate" in _step_names(loaded)
+
+
+def double(x: int) -> int:
+    return x * 2
+
+
+def bump(doubled: int) -> int:
+    return doubled + 1
+
+
+def _open_ended_parent(inline: bool) -> Flow:
+    # The subflow never links its end node, as most flows in these tests.
+    sub = Flow(name="open")
+    sub.add_node(
+        Node(double, name="double", return_envelope="doubled"), src=sub.start_node
+    )
+    flow = Flow(name="parent")
+    node = flow.add_node(
+        Subflow(sub, return_envelope=False, inline=inline), src=flow.start_node
+    )
+    flow.add_node(
+        Node(bump, name="bump", return_envelope="bumped"),
+        src=node,
+        dst=flow.end_node,
+    )
+    return flow
+
+
+def test_subflow_without_a_linked_end():
+    flow = _open_ended_parent(inline=True)
+    assert "double" in _step_names(flow)
+    assert flow.run(x=1)["bumped"] == 3
+
+
+def test_inlined_and_nested_runs_agree():
+    inlined = _open_ended_parent(inline=True)
+    nested = _open_ended_parent(inline=False)
+    for args, kwargs in (((5,), {}), ((), {"x": 5})):
+        assert inlined.run(*args, **kwargs) == nested.run(*args, **kwargs)
+        assert asyncio.run(inlined.arun(*args, **kwargs)) == asyncio.run(
+            nested.arun(*args, **kwargs)
+        )
+
+    # A subflow branch whose condition fails ends the nested run only; the
+    # parent still runs its next node.
+    sub = Flow(name="gated")
+    user = sub.add_node(
+        Node(authenticate, name="authenticate", return_envelope="user"),
+        src=sub.start_node,
+    )
+    sub.add_node(
+        Node(grant, name="grant", return_envelope="grants"),
+        src=user,
+        src_condition_node=is_admin,
+    )
+    results = []
+    for inline in (True, False):
+        flow = Flow(name="parent")
+        node = flow.add_node(
+            Subflow(sub, return_envelope=False, inline=inline), src=flow.start_node
+        )
+        flow.add_node(
+            Node(enrich, name="enrich", return_envelope="enriched"),
+            src=node,
+            dst=flow.end_node,
+        )
+        results.append(flow.run(token="bob"))
+    assert results[0] == results[1]
+    assert results[0]["enriched"] == "user-bob!"
+
+
+def parent_start() -> str:
+    return "parent-start"
+
+
+def test_inlined_subflow_keeps_the_parent_start_key():
+    # Two routes out of the subflow's start keep its boundary step around.
+    sub = Flow(name="branches")
+    sub.add_node(
+        Node(authenticate, name="authenticate", return_envelope="user"),
+        src=sub.start_node,
+    )
+    sub.add_node(
+        Node(grant, name="grant", return_envelope="grants"), src=sub.start_node
+    )
+    results = []
+    for inline in (True, False):
+        flow = Flow(name="parent", start_node=parent_start)
+        node = flow.add_node(
+            Subflow(sub, return_envelope=False, inline=inline), src=flow.start_node
+        )
+        flow.add_node(
+            Node(enrich, name="enrich", return_envelope="enriched"),
+            src=node,
+            dst=flow.end_node,
+        )
+        if inline:
+            names = [step.node.name for step in flow.compile().steps]
+            assert names.count("start") == 2
+        results.append(flow.run(token="bob"))
+        assert asyncio.run(flow.arun(token="bob")) == results[-1]
+    assert results[0] == results[1]
+    assert results[0]["start"] == "parent-start"
@@ -0,0 +1,111 @@
+import asyncio
+
+import pytest
+
+from flowter import Flow, Node, Switch
+from flowter.helper import flow_to_mermaid
+from flowter.tracing import Hook
+
+
+def _intent(text: str) -> str:
+    return text.split()[0]
+
+
+def _build_router():
+    flow = Flow(name="router")
+    switch = flow.add_node(
+        Switch(_intent, name="intent", return_envelope="intent"), src=flow.start_node
+    )
+    greet = Node(lambda intent: "hello", name="greet", return_envelope="reply")
+    bye = Node(lambda intent: "goodbye", name="bye", return_envelope="reply")
+    fallback = Node(lambda intent: "what?", name="fallback", return_envelope="reply")
+    for node in (greet, bye, fallback):
+        flow.add_node(node, dst=flow.end_node)
+    switch.add_case("hi", greet)
+    switch.add_case("hello", greet)
+    switch.add_case("bye", bye)
+    switch.set_default(fallback)
+    return flow, switch
+
+
+@pytest.mark.parametrize(
+    "text, reply",
+    [("hi there", "hello"), ("hello you", "hello"), ("bye now", "goodbye")],
+)
+def test_switch_dispatches_by_key(text, reply):
+    flow, _ = _build_router()
+    result = flow.run(text=text)
+    assert result["reply"] == reply
+    assert result["intent"] == text.split()[0]
+
+
+def test_switch_default_and_no_default():
+    flow, switch = _build_router()
+    assert flow.run(text="unknown words")["reply"] == "what?"
+
+    plain = Flow(name="plain")
+    node = plain.add_node(Switch(_intent, name="intent"), src=plain.start_node)
+    node.add_case("hi", Node(lambda: "hello", name="greet"))
+    assert "greet" not in plain.run(text="nope")
+
+
+def test_switch_constructor_cases():
+    done = Node(lambda: "done", name="done")
+    switch = Switch(lambda value: value % 2, name="parity", cases={0: done})
+    assert switch.cases == {0: done}
+    assert switch.next_ == [done]
+
+
+def test_switch_arun():
+    flow, _ = _build_router()
+    assert asyncio.run(flow.arun(text="bye"))["reply"] == "goodbye"
+
+
+def test_switch_unhashable_key():
+    flow = Flow(name="unhashable")
+    flow.add_node(Switch(lambda: [1], name="bad"), src=flow.start_node)
+    with pytest.raises(TypeError, match="unhashable"):
+        flow.run()
+
+
+def test_switch_hook():
+    class Recorder(Hook):
+        def __init__(self):
+            self.events = []
+
+        def on_switch(self, run, node, key, target):
+            self.events.append((node.name, key, target.name if target else None))
+
+    flow, _ = _build_router()
+    recorder = Recorder()
+    flow.add_hook(recorder)
+    flow.run(text="hi")
+    flow.run(text="meh")
+    assert recorder.events == [("intent", "hi", "greet"), ("intent", "meh", "fallback")]
+
+
+def test_switch_in_mermaid():
+    flow, switch = _build_router()
+    mermaid = flow_to_mermaid(flow)
+    assert ": hi, hello\n" in mermaid
+    assert ": bye\n" in mermaid
+    assert ": default" in mermaid
+
+
+def test_switch_rejects_plain_edges():
+    flow, switch = _build_router()
+    flow.add_node(Node(lambda intent: "?", name="stray"), src=switch)
+    with pytest.raises(ValueError, match="neither one of its cases nor its default"):
+        flow.compile()
+
+
+def test_replacing_a_case_drops_the_old_edge():
+    flow, switch = _build_router()
+    shout = Node(lambda intent: "HELLO", name="shout", return_envelope="reply")
+    flow.add_node(shout, dst=flow.end_node)
+    switch.add_case("hi", shout)
+    assert flow.run(text="hi")["reply"] == "HELLO"
+    # greet is still the "hello" case, so its edge stays.
+    assert flow.run(text="hello")["reply"] == "hello"
+    switch.add_case("hello", shout)
+    assert [n.name for n in switch.next_] == ["bye", "fallback", "shout"]
@@ -1,8 +1,9 @@
 import random
 from typing import List, Text
 
-from flowter import Flow, Node
+from flowter import Condition, Flow, Node
 from flowter.helper import flow_to_mermaid
+from flowter.profiling import ExecutionStats
 
 
 def test_flow_run_basic_1():
@@ -49,3 +50,60 @@ def test_flow_run_basic_1():
     flow_mermaid = flow_to_mermaid(flow)
     assert flow_mermaid
     print(flow_mermaid)
+
+
+def test_flow_to_mermaid_heatmap():
+    def load(size: int) -> int:
+        return size
+
+    def is_small(size: int) -> bool:
+        return size < 10
+
+    def is_huge(size: int) -> bool:
+        return size > 1000
+
+    def small(size: int) -> Text:
+        return "small"
+
+    def huge(size: int) -> Text:
+        return "huge"
+
+    stats = ExecutionStats()
+    flow = Flow(name="heat", hooks=[stats])
+    loader = flow.add_node(
+        Node(load, name="load", return_envelope="size"), src=flow.start_node
+    )
+    flow.add_node(
+        Node(small, name="small"),
+        src=loader,
+        src_condition_node=Condition(is_small, name="is_small"),
+        dst=flow.end_node,
+    )
+    flow.add_node(
+        Node(huge, name="huge"),
+        src=loader,
+        src_condition_node=Condition(is_huge, name="is_huge"),
+        dst=flow.end_node,
+    )
+    for size in (1, 2, 3, 50):
+        flow.run(size=size)
+
+    assert stats.runs == 4
+    assert stats.nodes[loader.id].calls == 4
+    assert stats.nodes[loader.id].percentile_ns(0.95) > 0
+    lines = flow_to_mermaid(flow, stats=stats).splitlines()
+    ids = {node.name: node.id.replace("-", "_") for node in flow.graph.nodes.values()}
+    assert any(
+        line.startswith(f"{ids['load']} : load (4 calls, mean ") and "p95" in line
+        for line in lines
+    )
+    assert f"{ids['is_small']} : is_small (taken 3/4)" in lines
+    assert f"{ids['load']} --> {ids['is_small']} : 75%" in lines
+    assert f"{ids['load']} --> {ids['is_huge']} : 0%" in lines
+    assert f"{ids['huge']} : huge (never ran)" in lines
+    dead = next(line for line in lines if line.endswith(" dead") and "class " in line)
+    assert ids["huge"] in dead and ids["is_huge"] in dead
+    assert any(line.startswith("classDef heat4") for line in lines)
+
+    # Without stats the diagram is the plain structure.
+    assert "calls" not in flow_to_mermaid(flow)
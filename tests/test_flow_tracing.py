@@ -0,0 +1,104 @@
+import io
+import json
+import logging
+
+import pytest
+
+from flowter import Condition, Flow, Node
+from flowter.tracing import Hook, JSONLinesSink, LoggingSink, Tracer
+
+
+class ExpensiveRepr:
+    repr_calls = 0
+
+    def __repr__(self) -> str:
+        ExpensiveRepr.repr_calls += 1
+        return "<ExpensiveRepr>"
+
+
+def build_flow(hooks) -> Flow:
+    def load(payload: ExpensiveRepr) -> int:
+        return 3
+
+    def is_small(size: int) -> bool:
+        return size < 10
+
+    def report(size: int) -> str:
+        return f"size={size}"
+
+    flow = Flow(hooks=hooks)
+    node_1 = flow.add_node(
+        Node(load, name="load", return_envelope="size"), src=flow.start_node
+    )
+    flow.add_node(
+        Node(report, name="report", return_envelope="report"),
+        src=node_1,
+        src_condition_node=Condition(is_small, name="is_small"),
+        dst=flow.end_node,
+    )
+    return flow
+
+
+def test_tracer_emits_structured_events():
+    buffer = io.StringIO()
+    flow = build_flow([Tracer([JSONLinesSink(buffer)], level="debug")])
+
+    assert flow.run(payload=ExpensiveRepr())["report"] == "size=3"
+
+    events = [json.loads(line) for line in buffer.getvalue().splitlines()]
+    names = [event["event"] for event in events]
+    assert names[0] == "run_start" and names[-1] == "run_end"
+    assert {"node_start", "node_end", "condition", "envelope_write"} <= set(names)
+    condition = next(e for e in events if e["event"] == "condition")
+    assert condition["node"] == "load"
+    assert condition["condition"] == "is_small"
+    assert condition["taken"] is True
+    assert len({event["run_id"] for event in events}) == 1
+
+
+def test_tracer_level_skips_formatting():
+    ExpensiveRepr.repr_calls = 0
+    buffer = io.StringIO()
+    flow = build_flow([Tracer([JSONLinesSink(buffer)], level="info")])
+    flow.run(payload=ExpensiveRepr())
+    assert ExpensiveRepr.repr_calls == 0
+    assert [json.loads(line)["event"] for line in buffer.getvalue().splitlines()] == [
+        "run_start",
+        "run_end",
+    ]
+
+    flow = build_flow(
+        [Tracer([JSONLinesSink(buffer)], level="debug", include_payloads=True)]
+    )
+    flow.run(payload=ExpensiveRepr())
+    assert ExpensiveRepr.repr_calls > 0
+
+
+def test_tracer_logging_sink_reports_errors(caplog):
+    def explode() -> None:
+        raise RuntimeError("boom")
+
+    flow = Flow(hooks=[Tracer([LoggingSink()], level="warning")])
+    flow.add_node(Node(explode, name="explode"), src=flow.start_node)
+    with caplog.at_level(logging.DEBUG, logger="flowter"):
+        with pytest.raises(RuntimeError):
+            flow.run()
+    assert [r.getMessage().split()[0] for r in caplog.records] == [
+        "node_error",
+        "run_error",
+    ]
+
+
+def test_custom_hook():
+    class Counter(Hook):
+        def __init__(self):
+            self.nodes = []
+
+        def on_node_end(self, run, node, value, elapsed_ns, exc):
+            self.nodes.append(node.name)
+
+    counter = Counter()
+    flow = build_flow([])
+    flow.add_hook(counter)
+    flow.run(payload=None)
+    assert counter.nodes == ["start", "load", "is_small", "report", "end"]
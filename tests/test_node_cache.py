@@ -0,0 +1,120 @@
+import functools
+import os
+import threading
+import time
+from typing import Dict, List
+
+import pytest
+
+from flowter import Flow, Node
+from flowter.cache import DiskCache, LRUCache
+
+
+def test_lru_cache_memoizes_pure_node():
+    calls = []
+
+    def normalize(text: str, payload: List = None) -> str:
+        calls.append(text)
+        return text.strip().lower()
+
+    cache = LRUCache(maxsize=2)
+    flow = Flow()
+    flow.add_node(
+        Node(
+            normalize,
+            name="normalize",
+            return_envelope="normalized",
+            cache=cache,
+            cache_exclude=["payload"],
+        ),
+        src=flow.start_node,
+    )
+
+    assert flow.run(text=" A ", payload=[1])["normalized"] == "a"
+    assert flow.run(text=" A ", payload=[2])["normalized"] == "a"
+    assert calls == [" A "]
+    assert cache.stats == {"hits": 1, "misses": 1, "bypasses": 0}
+
+    flow.run(text="B")
+    flow.run(text="C")
+    flow.run(text=" A ")
+    assert len(cache) == 2
+    assert calls == [" A ", "B", "C", " A "]
+
+
+def test_lru_cache_ttl_and_unhashable_bypass():
+    calls = []
+
+    def lookup(key: Dict) -> int:
+        calls.append(key)
+        return len(key)
+
+    cache = LRUCache(ttl=0.05)
+    node = Node(lookup, name="lookup", cache=cache)
+    assert node.run({"a": 1}) == 1
+    assert node.run({"a": 1}) == 1
+    assert cache.bypasses == 2
+
+    node = Node(lambda key: key, name="identity", cache=cache)
+    node.run("x")
+    node.run("x")
+    assert cache.hits == 1
+    time.sleep(0.06)
+    node.run("x")
+    assert cache.misses == 2
+
+
+calls = []
+
+
+def score(a: int, b: int) -> int:
+    calls.append((a, b))
+    return a * b
+
+
+def make_multiplier(factor: int):
+    def multiply(x: int) -> int:
+        return x * factor
+
+    return multiply
+
+
+def test_disk_cache_persists_between_nodes(tmp_path):
+    calls.clear()
+    assert Node(score, name="score", cache=DiskCache(str(tmp_path))).run(3, 4) == 12
+    cache = DiskCache(str(tmp_path))
+    assert Node(score, name="score", cache=cache).run(3, 4) == 12
+    assert calls == [(3, 4)]
+    assert cache.hits == 1
+
+    cache.clear()
+    assert Node(score, name="score", cache=cache).run(3, 4) == 12
+    assert len(calls) == 2
+
+
+def test_functions_sharing_a_backend_get_their_own_entries(tmp_path):
+    cache = LRUCache()
+    assert Node(lambda x: x + 1, name="inc", cache=cache).run(3) == 4
+    assert Node(lambda x: x * 100, name="scale", cache=cache).run(3) == 300
+    assert Node(make_multiplier(2), cache=cache).run(5) == 10
+    assert Node(make_multiplier(3), cache=cache).run(5) == 15
+    assert Node(functools.partial(pow, 2), name="p2", cache=cache).run(3) == 8
+    assert Node(functools.partial(pow, 3), name="p3", cache=cache).run(3) == 27
+    assert cache.hits == 0
+
+    disk = DiskCache(str(tmp_path))
+    for func in (lambda x: x, make_multiplier(2), functools.partial(pow, 2)):
+        with pytest.raises(ValueError, match="persistent"):
+            Node(func, name="rejected", cache=disk)
+
+
+def test_disk_cache_skips_values_it_cannot_pickle(tmp_path):
+    cache = DiskCache(str(tmp_path))
+    node = Node(make_lock, name="make_lock", cache=cache)
+    assert node.run(1) is not None
+    assert cache.stats["write_errors"] == 1
+    assert not os.listdir(tmp_path)
+
+
+def make_lock(n: int):
+    return threading.Lock()
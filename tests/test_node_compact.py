@@ -0,0 +1,64 @@
+import pytest
+
+from flowter import BatchNode, Condition, Flow, Fork, Merge, Node
+
+from .utils import func_add
+
+
+def _increment(value: int) -> int:
+    return value + 1
+
+
+@pytest.mark.parametrize("cls", [Node, Condition, Fork, Merge])
+def test_nodes_are_slotted(cls):
+    node = cls(func_add)
+    assert not hasattr(node, "__dict__")
+    with pytest.raises(AttributeError):
+        node.unknown_attribute = 1
+
+
+def test_batch_node_is_slotted():
+    node = BatchNode(lambda items: items, name="batch")
+    assert not hasattr(node, "__dict__")
+
+
+def test_node_ids_and_default_names_are_unique():
+    nodes = [Node(func_add) for _ in range(100)]
+    assert len({node.id for node in nodes}) == 100
+    assert len({node.name for node in nodes}) == 100
+    assert all(node.name.startswith("func_add:") for node in nodes)
+
+
+def test_signature_is_lazy_and_shared():
+    a, b = Node(_increment), Node(_increment)
+    assert a._signature is None
+    assert a.func_signature is b.func_signature
+    assert list(a.func_params) == ["value"]
+
+
+def test_invalid_names_are_rejected():
+    with pytest.raises(ValueError):
+        Node(func_add, name="not valid")
+    with pytest.raises(ValueError):
+        Node(lambda: None)
+
+
+def test_add_nodes_chain():
+    flow = Flow(name="chain")
+    nodes = flow.add_nodes(
+        [Node(_increment, return_envelope="value") for _ in range(100)],
+        src=flow.start_node,
+        dst=flow.end_node,
+        chain=True,
+    )
+    assert len(nodes) == 100
+    assert nodes[-1].next_ == [flow.end_node]
+    assert flow.run(value=0)["value"] == 100
+
+
+def test_add_nodes_fan_out():
+    flow = Flow(name="fan")
+    nodes = flow.add_nodes([func_add, func_add], src=flow.start_node)
+    assert flow.start_node.next_ == nodes
+    assert all(node.id in flow.node_pool for node in nodes)
+    assert flow.graph.get_predecessors(nodes[0]) == [flow.start_node]
@@ -19,3 +19,23 @@ def func_key_value_table(title: typing.Text, /, **kwargs) -> typing.Text:
     for k, v in kwargs.items():
         content += f"{k}: {v}\n"
     return content
+
+
+def func_sum_of_squares(n: int) -> int:
+    return sum(i * i for i in range(n))
+
+
+def func_checksum(blob) -> int:
+    return sum(blob[:: max(1, len(blob) // 64)])
+
+
+def build_worker_flow():
+    from flowter import Flow, Node
+
+    flow = Flow(name="worker-flow")
+    flow.add_node(
+        Node(func_sum_of_squares, name="squares", return_envelope="total"),
+        src=flow.start_node,
+        dst=flow.end_node,
+    )
+    return flow